@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+
+from benchmarks.mock_telegram import MockTelegram, start_mock  # noqa: E402
+from benchmarks.updates import deadline_burst, generate_updates, synthetic_config  # noqa: E402
+from bot import storage  # noqa: E402
+from bot.app import create_bot  # noqa: E402
+from bot.config import Config  # noqa: E402
+from bot.filtering import PASSED, UpdateFilterMiddleware  # noqa: E402
+from bot.handlers import router  # noqa: E402
+from bot.metrics import UPDATES  # noqa: E402
+from bot.scheduler import (  # noqa: E402
+    SUMMARY,
+    WEEKDAYS,
+    build_slots,
+    rollover_day,
+    send_slot_summaries,
+)
+from bot.sender import Sender  # noqa: E402
+
+POLL_BATCH = 100
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def feed(
+    dp: Dispatcher, bot: Bot, updates: list[dict[str, Any]]
+) -> dict[str, float]:
+    engine = storage.get_engine()
+    reads, writes, commits = engine.stats.reads, engine.stats.writes, engine.stats.commits
+    passed = UPDATES.value(PASSED)
+    latencies: list[float] = []
+
+    async def handle(update: dict[str, Any]) -> None:
+        started = time.perf_counter()
+        await dp.feed_raw_update(bot, update)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for offset in range(0, len(updates), POLL_BATCH):
+        await asyncio.gather(*(handle(update) for update in updates[offset : offset + POLL_BATCH]))
+    await storage.flush()
+    elapsed = time.perf_counter() - started
+    count = len(updates) or 1
+    return {
+        "updates": len(updates),
+        "seconds": round(elapsed, 4),
+        "updates_per_s": round(len(updates) / elapsed, 1),
+        "dropped_early": len(updates) - int(UPDATES.value(PASSED) - passed),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "db_reads_per_update": round((engine.stats.reads - reads) / count, 4),
+        "db_writes_per_update": round((engine.stats.writes - writes) / count, 4),
+        "db_commits_per_update": round((engine.stats.commits - commits) / count, 4),
+    }
+
+
+async def fan_out(config: Config, sender: Sender, mock: MockTelegram) -> dict[str, float]:
+    sent_before = sender.stats.sent
+    slots = {
+        slot: entries
+        for slot, entries in build_slots(config).items()
+        if slot.day_of_week == WEEKDAYS and slot.kind == SUMMARY
+    }
+    started = time.perf_counter()
+    for slot, entries in slots.items():
+        await send_slot_summaries(sender, config, slot, entries)
+    enqueued = time.perf_counter() - started
+    expected = sum(len(entries) for entries in slots.values())
+    while sender.stats.sent - sent_before < expected:
+        await asyncio.sleep(0.01)
+    delivered = time.perf_counter() - started
+    return {
+        "messages": expected,
+        "enqueue_seconds": round(enqueued, 4),
+        "delivery_seconds": round(delivered, 4),
+        "retry_after_responses": mock.throttled,
+        "avg_queue_latency_s": round(sender.stats.avg_latency, 4),
+        "max_queue_latency_s": round(sender.stats.max_latency, 4),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    mock = MockTelegram(retry_after_every=args.retry_after_every, retry_after=1)
+    mock_runner, mock_url = await start_mock(mock)
+    base = synthetic_config(args.chats, args.users)
+    config = Config(
+        bot_token=base.bot_token,
+        timezone=base.timezone,
+        deadlines=base.deadlines,
+        chats=base.chats,
+        api_url=mock_url,
+    )
+    steady = generate_updates(config, args.updates, seed=args.seed)
+    burst = deadline_burst(
+        config, config.deadlines[0].key, seed=args.seed, start_update_id=len(steady) + 1
+    )
+
+    results: dict[str, Any] = {
+        "params": {
+            "chats": args.chats,
+            "users_per_chat": args.users,
+            "seed": args.seed,
+            "retry_after_every": args.retry_after_every,
+        }
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        await storage.init_db(Path(tmp) / "bench.db")
+        await rollover_day(config)
+        bot = create_bot(config)
+        sender = Sender(bot, global_rate=args.global_rate, chat_rate=args.chat_rate)
+        await sender.start()
+        dp = Dispatcher(config=config, sender=sender)
+        dp.update.outer_middleware(UpdateFilterMiddleware())
+        dp.include_router(router)
+
+        results["steady"] = await feed(dp, bot, steady)
+        results["burst"] = await feed(dp, bot, burst)
+        results["fan_out"] = await fan_out(config, sender, mock)
+
+        await sender.close()
+        await bot.session.close()
+        await storage.close_db()
+    await mock_runner.cleanup()
+    return results
+
+
+def print_results(results: dict[str, Any]) -> None:
+    print(json.dumps(results["params"], ensure_ascii=False))
+    for phase in ("steady", "burst"):
+        data = results[phase]
+        print(
+            f"{phase:>7}: {data['updates']} updates ({data['dropped_early']} dropped early), "
+            f"{data['updates_per_s']} updates/s, "
+            f"p50 {data['p50_ms']} ms, p99 {data['p99_ms']} ms, "
+            f"db reads/writes/commits per update "
+            f"{data['db_reads_per_update']}/{data['db_writes_per_update']}/"
+            f"{data['db_commits_per_update']}"
+        )
+    data = results["fan_out"]
+    print(
+        f"fan-out: {data['messages']} summaries, enqueued in {data['enqueue_seconds']}s, "
+        f"delivered in {data['delivery_seconds']}s, "
+        f"{data['retry_after_responses']} retry_after responses"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark with a mock API")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--retry-after-every", type=int, default=0)
+    parser.add_argument("--global-rate", type=float, default=30.0)
+    parser.add_argument("--chat-rate", type=float, default=20 / 60)
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
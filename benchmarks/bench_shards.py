@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.types import Update  # noqa: E402
+
+from benchmarks.mock_telegram import MockTelegram, start_mock  # noqa: E402
+from benchmarks.updates import generate_updates, synthetic_config, write_settings  # noqa: E402
+from bot.app import create_bot  # noqa: E402
+from bot.config import Config, load_config  # noqa: E402
+from bot.shard import Front  # noqa: E402
+
+
+def expected_reports(config: Config, updates: list[dict[str, Any]]) -> int:
+    topics = {(chat.chat_id, chat.report_thread_id): chat for chat in config.chats}
+    keys = set()
+    for raw in updates:
+        message = Update.model_validate(raw).message
+        chat = topics.get((message.chat.id, message.message_thread_id))
+        if chat is None:
+            continue
+        for deadline in config.tag_index.match(chat, message.text or "", message.entities):
+            keys.add((message.from_user.id, deadline.key, chat.chat_id, chat.report_thread_id))
+    return len(keys)
+
+
+def count_reports(config: Config) -> int:
+    total = 0
+    for shard in range(config.shards):
+        path = config.for_shard(shard).db_path
+        if not path.exists():
+            continue
+        try:
+            with sqlite3.connect(path) as db:
+                total += db.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        except sqlite3.OperationalError:
+            pass
+    return total
+
+
+async def run(args: argparse.Namespace, tmp: Path) -> float:
+    mock = MockTelegram()
+    mock_runner, mock_url = await start_mock(mock)
+    synthetic = synthetic_config(args.chats, args.users)
+    write_settings(synthetic, tmp / "settings.json")
+    os.environ.update(
+        {
+            "BOT_TOKEN": synthetic.bot_token,
+            "SETTINGS_PATH": str(tmp / "settings.json"),
+            "TELEGRAM_API_URL": mock_url,
+            "DB_PATH": str(tmp / "data.db"),
+            "SHARDS": str(args.shards),
+            "SHARD_PORT": str(args.port),
+            "UPDATE_MODE": "polling",
+        }
+    )
+    config = load_config()
+    updates = generate_updates(config, args.updates, seed=args.seed)
+    expected = expected_reports(config, updates)
+
+    front = Front(config)
+    front.start_workers()
+    bot = create_bot(config)
+    pumps = [asyncio.create_task(link.pump()) for link in front.links]
+    poller = asyncio.create_task(front.poll(bot))
+    try:
+        while not all(
+            config.for_shard(shard).db_path.exists() for shard in range(config.shards)
+        ):
+            await asyncio.sleep(0.2)
+        await asyncio.sleep(1.0)
+        started = time.perf_counter()
+        mock.push_updates(updates)
+        while count_reports(config) < expected:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    finally:
+        poller.cancel()
+        for pump in pumps:
+            pump.cancel()
+        await bot.session.close()
+        front.stop_workers()
+        await mock_runner.cleanup()
+    per_shard = [link.forwarded for link in front.links]
+    print(
+        f"shards={args.shards} updates={len(updates)} reports={expected} "
+        f"elapsed={elapsed:.2f}s {len(updates) / elapsed:.0f} updates/s "
+        f"forwarded per shard={per_shard}"
+    )
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sharded ingestion on one machine")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=9400)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(args, Path(tmp)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import timeit
+from datetime import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.config import ChatConfig, Deadline  # noqa: E402
+from bot.tags import TagIndex  # noqa: E402
+
+WORDS = ["отчет", "сделано", "задача", "план", "итоги", "встреча", "клиент", "релиз"]
+
+
+def build_deadlines(count: int) -> list[Deadline]:
+    return [
+        Deadline(
+            key=f"d{index}",
+            tag=f"#Отчет{index}",
+            title=f"Отчет {index}",
+            weekday_time=time(18, 0),
+            weekend_time=time(18, 0),
+            aliases=(f"#Report{index}", f"#Команда{index}Отчет"),
+        )
+        for index in range(count)
+    ]
+
+
+def build_messages(deadlines: list[Deadline], count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(20, 80))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(deadlines).tag)
+        messages.append(" ".join(words))
+    return messages
+
+
+def legacy_match(deadlines: list[Deadline], text: str) -> list[Deadline]:
+    return [deadline for deadline in deadlines if deadline.tag in text]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare tag matching strategies")
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    deadlines = build_deadlines(args.tags)
+    chat = ChatConfig(chat_id=-1, report_thread_id=1, required_users=[])
+    index = TagIndex(deadlines, [chat])
+    messages = build_messages(deadlines, args.messages, args.seed)
+
+    def run_legacy() -> None:
+        for text in messages:
+            legacy_match(deadlines, text)
+
+    def run_index() -> None:
+        for text in messages:
+            index.match(chat, text)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=args.repeat))
+    indexed = min(timeit.repeat(run_index, number=1, repeat=args.repeat))
+    per_message = 1_000_000 / args.messages
+    print(f"tags={args.tags} messages={args.messages}")
+    print(f"legacy loop: {legacy * per_message:.2f} us/message")
+    print(f"tag index:   {indexed * per_message:.2f} us/message")
+    print(f"speedup:     {legacy / indexed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.mock_telegram import MockHub, MockTelegram, start_mock  # noqa: E402
+from benchmarks.updates import deadline_burst, synthetic_config, write_settings  # noqa: E402
+from bot.config import Config, load_config  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CHAT_STRIDE = 10_000
+
+
+def tenant_config(index: int, chats: int, users: int) -> Config:
+    base = synthetic_config(chats, users, token=f"{700_000 + index}:TENANT{index}")
+    return replace(
+        base,
+        chats=[
+            replace(chat, chat_id=chat.chat_id - index * CHAT_STRIDE) for chat in base.chats
+        ],
+        tenant=f"t{index}",
+    )
+
+
+def peak_rss_mib() -> float:
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mib() -> float:
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mib()
+
+
+def sample() -> dict[str, float]:
+    return {
+        "rss_mib": round(rss_mib(), 1),
+        "peak_rss_mib": round(peak_rss_mib(), 1),
+        "cpu_s": round(time.process_time(), 3),
+    }
+
+
+def emit(phase: str) -> None:
+    print(json.dumps({"phase": phase, **sample()}), flush=True)
+
+
+async def worker() -> None:
+    from bot.app import create_host, start_runtime, stop_runtime
+    from bot.tenants import check_tenants, load_tenants
+
+    logging.basicConfig(level=logging.WARNING)
+    tenants_path = os.getenv("TENANTS_PATH")
+    if tenants_path:
+        specs = load_tenants(Path(tenants_path))
+        configs = [spec.load() for spec in specs]
+        loaders = [spec.load for spec in specs]
+        check_tenants(configs)
+    else:
+        configs = [load_config()]
+        loaders = [load_config]
+    host = create_host(configs[0])
+    runtimes = [
+        await start_runtime(config, loader, host=host) for config, loader in zip(configs, loaders)
+    ]
+    polling = asyncio.create_task(
+        host.dp.start_polling(
+            *(runtime.bot for runtime in runtimes),
+            handle_signals=False,
+            allowed_updates=host.dp.resolve_used_update_types(),
+        )
+    )
+    emit("ready")
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, sys.stdin.readline)
+    emit("done")
+    await host.dp.stop_polling()
+    await polling
+    for runtime in runtimes:
+        await stop_runtime(runtime)
+    await host.session.close()
+
+
+def count_reports(paths: list[Path]) -> int:
+    total = 0
+    for path in paths:
+        if not path.exists():
+            continue
+        try:
+            with sqlite3.connect(path) as db:
+                total += db.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        except sqlite3.OperationalError:
+            pass
+    return total
+
+
+async def read_phase(process: asyncio.subprocess.Process, phase: str) -> dict[str, Any]:
+    assert process.stdout is not None
+    while True:
+        line = await process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Worker exited before {phase}")
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        if data.get("phase") == phase:
+            return data
+
+
+async def run_mode(
+    args: argparse.Namespace, tmp: Path, configs: list[Config], hosted: bool
+) -> dict[str, Any]:
+    mocks = {config.bot_token: MockTelegram() for config in configs}
+    mock_runner, mock_url = await start_mock(MockHub(mocks))
+    env = {
+        **os.environ,
+        "TELEGRAM_API_URL": mock_url,
+        "UPDATE_MODE": "polling",
+        "TIMEZONE": configs[0].timezone,
+    }
+    env.pop("TENANTS_PATH", None)
+    for config in configs:
+        write_settings(config, tmp / f"{config.tenant}.json")
+    launches: list[dict[str, str]] = []
+    if hosted:
+        tenants = [
+            {
+                "name": config.tenant,
+                "bot_token": config.bot_token,
+                "settings_path": f"{config.tenant}.json",
+            }
+            for config in configs
+        ]
+        (tmp / "tenants.json").write_text(json.dumps({"tenants": tenants}), encoding="utf-8")
+        launches.append(
+            {**env, "TENANTS_PATH": str(tmp / "tenants.json"), "DB_PATH": str(tmp / "hosted.db")}
+        )
+    else:
+        for config in configs:
+            launches.append(
+                {
+                    **env,
+                    "BOT_TOKEN": config.bot_token,
+                    "SETTINGS_PATH": str(tmp / f"{config.tenant}.json"),
+                    "DB_PATH": str(tmp / f"{config.tenant}.db"),
+                }
+            )
+    processes = [
+        await asyncio.create_subprocess_exec(
+            sys.executable,
+            __file__,
+            "--worker",
+            env=launch,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        for launch in launches
+    ]
+    try:
+        ready = await asyncio.gather(*(read_phase(process, "ready") for process in processes))
+        expected = 0
+        started = time.perf_counter()
+        for config in configs:
+            burst = deadline_burst(config, config.deadlines[0].key, seed=args.seed)
+            burst.sort(key=lambda update: update["update_id"])
+            expected += len(burst)
+            mocks[config.bot_token].push_updates(burst)
+        db_paths = [Path(launch["DB_PATH"]) for launch in launches]
+        while count_reports(db_paths) < expected:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            assert process.stdin is not None
+            process.stdin.write(b"done\n")
+            await process.stdin.drain()
+        done = await asyncio.gather(*(read_phase(process, "done") for process in processes))
+        await asyncio.gather(*(process.wait() for process in processes))
+    finally:
+        for process in processes:
+            if process.returncode is None:
+                process.kill()
+        await mock_runner.cleanup()
+    return {
+        "processes": len(processes),
+        "tenants": len(configs),
+        "reports": expected,
+        "elapsed_s": round(elapsed, 2),
+        "idle_rss_mib": round(sum(item["rss_mib"] for item in ready), 1),
+        "peak_rss_mib": round(sum(item["peak_rss_mib"] for item in done), 1),
+        "startup_cpu_s": round(sum(item["cpu_s"] for item in ready), 3),
+        "total_cpu_s": round(sum(item["cpu_s"] for item in done), 3),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    configs = [tenant_config(index, args.chats, args.users) for index in range(args.tenants)]
+    results: dict[str, Any] = {
+        "params": {
+            "tenants": args.tenants,
+            "chats_per_tenant": args.chats,
+            "users_per_chat": args.users,
+            "seed": args.seed,
+        }
+    }
+    for name, hosted, mode_configs in (
+        ("separate", False, configs),
+        ("hosted_one", True, configs[:1]),
+        ("hosted", True, configs),
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            results[name] = await run_mode(args, Path(tmp), mode_configs, hosted)
+    return results
+
+
+def print_results(results: dict[str, Any]) -> None:
+    print(json.dumps(results["params"], ensure_ascii=False))
+    for name in ("separate", "hosted_one", "hosted"):
+        data = results[name]
+        print(
+            f"{name:>10}: {data['tenants']} tenants in {data['processes']} processes, "
+            f"idle RSS {data['idle_rss_mib']} MiB, peak RSS {data['peak_rss_mib']} MiB, "
+            f"CPU startup {data['startup_cpu_s']}s / total {data['total_cpu_s']}s, "
+            f"{data['reports']} reports in {data['elapsed_s']}s"
+        )
+    separate, one, hosted = results["separate"], results["hosted_one"], results["hosted"]
+    tenants = hosted["tenants"]
+    extra = max(tenants - 1, 1)
+    print(
+        f"per tenant, separate processes: "
+        f"{separate['idle_rss_mib'] / tenants:.1f} MiB idle, "
+        f"{separate['peak_rss_mib'] / tenants:.1f} MiB peak, "
+        f"{separate['total_cpu_s'] / tenants * 1000:.0f} ms CPU"
+    )
+    print(
+        f"per extra tenant, one process:  "
+        f"{(hosted['idle_rss_mib'] - one['idle_rss_mib']) / extra:.1f} MiB idle, "
+        f"{(hosted['peak_rss_mib'] - one['peak_rss_mib']) / extra:.1f} MiB peak, "
+        f"{(hosted['total_cpu_s'] - one['total_cpu_s']) / extra * 1000:.0f} ms CPU"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Per-tenant memory and CPU: one multi-bot process vs one process per bot"
+    )
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    args = parser.parse_args()
+    if args.worker:
+        asyncio.run(worker())
+        return
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
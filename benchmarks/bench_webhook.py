@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Dispatcher  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from benchmarks.mock_telegram import MockTelegram, start_mock  # noqa: E402
+from benchmarks.updates import generate_updates, load_updates, synthetic_config  # noqa: E402
+from bot.app import create_bot  # noqa: E402
+from bot.config import Config, WebhookConfig  # noqa: E402
+from bot.handlers import router  # noqa: E402
+from bot.sender import Sender  # noqa: E402
+from bot.storage import close_db, init_db  # noqa: E402
+from bot.webhook import build_webhook_app  # noqa: E402
+
+SECRET = "bench-secret"
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.expected = 0
+        self.processed = 0
+        self.done = asyncio.Event()
+
+    def reset(self, expected: int) -> None:
+        self.expected = expected
+        self.processed = 0
+        self.done.clear()
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            self.processed += 1
+            if self.processed >= self.expected:
+                self.done.set()
+
+
+def build_dispatcher(config: Config, counter: Counter) -> Dispatcher:
+    dp = Dispatcher(config=config)
+    dp.update.outer_middleware(counter)
+    dp.include_router(router)
+    return dp
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    counter: Counter,
+    config: Config,
+    updates: list[dict[str, Any]],
+    concurrency: int,
+) -> float:
+    bot = create_bot(config)
+    sender = Sender(bot)
+    await sender.start()
+    dp["sender"] = sender
+    counter.reset(len(updates))
+    webhook = WebhookConfig(path="/webhook", secret=SECRET, host="127.0.0.1", port=0)
+    runner = web.AppRunner(build_webhook_app(dp, bot, webhook))
+    await runner.setup()
+    site = web.TCPSite(runner, webhook.host, webhook.port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{webhook.path}"
+    queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async def post_all(session: aiohttp.ClientSession) -> None:
+        while not queue.empty():
+            update = queue.get_nowait()
+            async with session.post(
+                url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+            ) as response:
+                response.raise_for_status()
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(post_all(session) for _ in range(concurrency)))
+        await counter.done.wait()
+    elapsed = time.perf_counter() - started
+    await runner.cleanup()
+    await sender.close()
+    await bot.session.close()
+    return elapsed
+
+
+async def run_polling(
+    dp: Dispatcher,
+    counter: Counter,
+    config: Config,
+    mock: MockTelegram,
+    updates: list[dict[str, Any]],
+) -> float:
+    bot = create_bot(config)
+    sender = Sender(bot)
+    await sender.start()
+    dp["sender"] = sender
+    counter.reset(len(updates))
+    started = time.perf_counter()
+    mock.push_updates(updates)
+    polling = asyncio.create_task(
+        dp.start_polling(bot, handle_signals=False, close_bot_session=False, polling_timeout=1)
+    )
+    await counter.done.wait()
+    elapsed = time.perf_counter() - started
+    await dp.stop_polling()
+    await polling
+    await sender.close()
+    await bot.session.close()
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare webhook and polling ingestion")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--input", type=Path, help="JSON file with recorded updates")
+    args = parser.parse_args()
+
+    mock = MockTelegram()
+    mock_runner, mock_url = await start_mock(mock)
+    config = synthetic_config(args.chats, args.users)
+    config = Config(
+        bot_token=config.bot_token,
+        timezone=config.timezone,
+        deadlines=config.deadlines,
+        chats=config.chats,
+        api_url=mock_url,
+    )
+    if args.input:
+        updates = load_updates(args.input)
+    else:
+        updates = generate_updates(config, args.updates, seed=args.seed)
+
+    counter = Counter()
+    dp = build_dispatcher(config, counter)
+    with tempfile.TemporaryDirectory() as tmp:
+        await init_db(Path(tmp) / "webhook.db")
+        webhook_elapsed = await run_webhook(dp, counter, config, updates, args.concurrency)
+        await close_db()
+
+        await init_db(Path(tmp) / "polling.db")
+        polling_elapsed = await run_polling(dp, counter, config, mock, updates)
+        await close_db()
+
+    await mock_runner.cleanup()
+    print(f"updates={len(updates)} chats={args.chats}")
+    print(f"webhook: {webhook_elapsed:.2f}s, {len(updates) / webhook_elapsed:.0f} updates/s")
+    print(f"polling: {polling_elapsed:.2f}s, {len(updates) / polling_elapsed:.0f} updates/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
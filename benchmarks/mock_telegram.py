@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "ReportBot", "username": "report_bot"}
+
+
+@dataclass
+class RecordedCall:
+    method: str
+    payload: dict[str, Any]
+    at: float = field(default_factory=time.monotonic)
+
+
+class MockTelegram:
+    def __init__(
+        self,
+        updates: list[dict[str, Any]] | None = None,
+        retry_after_every: int = 0,
+        retry_after: int = 1,
+    ) -> None:
+        self.updates: list[dict[str, Any]] = list(updates or [])
+        self.retry_after_every = retry_after_every
+        self.retry_after = retry_after
+        self.calls: list[RecordedCall] = []
+        self.throttled = 0
+        self._sends = 0
+        self._message_ids = itertools.count(1_000_000)
+        self._new_updates = asyncio.Event()
+
+    def push_updates(self, updates: list[dict[str, Any]]) -> None:
+        self.updates.extend(updates)
+        self._new_updates.set()
+
+    def calls_of(self, method: str) -> list[RecordedCall]:
+        return [call for call in self.calls if call.method == method]
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def _payload(self, request: web.Request) -> dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        form = await request.post()
+        payload: dict[str, Any] = {}
+        for key, value in form.items():
+            if isinstance(value, str):
+                try:
+                    payload[key] = json.loads(value)
+                except ValueError:
+                    payload[key] = value
+        return payload
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        payload = await self._payload(request)
+        self.calls.append(RecordedCall(method, payload))
+        if method == "getupdates":
+            return await self._get_updates(payload)
+        if method == "getme":
+            return _ok(BOT_USER)
+        if method in {"sendmessage", "senddocument"}:
+            self._sends += 1
+            if self.retry_after_every and self._sends % self.retry_after_every == 0:
+                self.throttled += 1
+                return _retry_after(self.retry_after)
+            return _ok(self._message(payload))
+        return _ok(True)
+
+    async def _get_updates(self, payload: dict[str, Any]) -> web.Response:
+        offset = int(payload.get("offset") or 0)
+        limit = int(payload.get("limit") or 100)
+        timeout = float(payload.get("timeout") or 0)
+        pending = [update for update in self.updates if update["update_id"] >= offset]
+        if not pending and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), min(timeout, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            pending = [update for update in self.updates if update["update_id"] >= offset]
+        return _ok(pending[:limit])
+
+    def _message(self, payload: dict[str, Any]) -> dict[str, Any]:
+        message: dict[str, Any] = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(payload["chat_id"]), "type": "supergroup", "title": "Mock"},
+            "from": BOT_USER,
+            "text": str(payload.get("text", "")),
+        }
+        if payload.get("message_thread_id"):
+            message["message_thread_id"] = int(payload["message_thread_id"])
+            message["is_topic_message"] = True
+        return message
+
+
+class MockHub:
+    def __init__(self, mocks: dict[str, MockTelegram]) -> None:
+        self.mocks = mocks
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return await self.mocks[request.match_info["token"]]._handle(request)
+
+
+def _ok(result: Any) -> web.Response:
+    return web.json_response({"ok": True, "result": result})
+
+
+def _retry_after(seconds: int) -> web.Response:
+    return web.json_response(
+        {
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {seconds}",
+            "parameters": {"retry_after": seconds},
+        },
+        status=429,
+    )
+
+
+async def start_mock(
+    mock: MockTelegram | MockHub, host: str = "127.0.0.1", port: int = 0
+) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(mock.build_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import itertools
+import json
+import random
+import time
+from datetime import time as dt_time
+from pathlib import Path
+from typing import Any
+
+from bot.config import ChatConfig, Config, Deadline, UserRef
+
+WORDS = ["сделано", "задача", "план", "итоги", "встреча", "клиент", "релиз", "тесты"]
+
+
+def synthetic_config(chats: int, users_per_chat: int, token: str = "123456:TEST") -> Config:
+    deadlines = [
+        Deadline(
+            "morning", "#УтреннийОтчет", "Утренний отчет", dt_time(10, 0), dt_time(11, 0)
+        ),
+        Deadline(
+            "evening", "#ВечернийОтчет", "Вечерний отчет", dt_time(18, 0), dt_time(21, 0)
+        ),
+    ]
+    chat_configs = [
+        ChatConfig(
+            chat_id=-1_000_000_000_000 - index,
+            report_thread_id=10 + index,
+            required_users=[
+                UserRef(user_id=100_000 + index * users_per_chat + user, name=f"User {user}")
+                for user in range(users_per_chat)
+            ],
+        )
+        for index in range(chats)
+    ]
+    return Config(
+        bot_token=token, timezone="Europe/Moscow", deadlines=deadlines, chats=chat_configs
+    )
+
+
+def message_update(
+    update_id: int,
+    message_id: int,
+    chat_id: int,
+    thread_id: int | None,
+    user_id: int,
+    text: str,
+    date: int | None = None,
+) -> dict[str, Any]:
+    message: dict[str, Any] = {
+        "message_id": message_id,
+        "date": date or int(time.time()),
+        "chat": {
+            "id": chat_id,
+            "type": "supergroup",
+            "title": f"Chat {chat_id}",
+            "is_forum": True,
+        },
+        "from": {
+            "id": user_id,
+            "is_bot": False,
+            "first_name": f"User{user_id}",
+            "username": f"user{user_id}",
+        },
+        "text": text,
+    }
+    if thread_id is not None:
+        message["message_thread_id"] = thread_id
+        message["is_topic_message"] = True
+    return {"update_id": update_id, "message": message}
+
+
+def generate_updates(
+    config: Config,
+    count: int,
+    seed: int = 1,
+    tagged_ratio: float = 0.3,
+    offtopic_ratio: float = 0.3,
+    start_update_id: int = 1,
+) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    message_ids = itertools.count(1)
+    updates = []
+    for update_id in range(start_update_id, start_update_id + count):
+        chat = rng.choice(config.chats)
+        thread_id: int | None = chat.report_thread_id
+        if rng.random() < offtopic_ratio:
+            thread_id = rng.choice([None, chat.report_thread_id + 100_000])
+        user = rng.choice(chat.required_users)
+        words = rng.choices(WORDS, k=rng.randint(5, 40))
+        if rng.random() < tagged_ratio:
+            words.append(rng.choice(config.deadlines).tag)
+        updates.append(
+            message_update(
+                update_id,
+                next(message_ids),
+                chat.chat_id,
+                thread_id,
+                user.user_id,
+                " ".join(words),
+            )
+        )
+    return updates
+
+
+def load_updates(path: Path) -> list[dict[str, Any]]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def deadline_burst(
+    config: Config,
+    deadline_key: str,
+    seed: int = 1,
+    start_update_id: int = 1,
+) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    deadline = next(item for item in config.deadlines if item.key == deadline_key)
+    updates = []
+    update_id = start_update_id
+    for chat in config.chats:
+        for user in chat.required_users:
+            words = rng.choices(WORDS, k=rng.randint(5, 40))
+            words.insert(rng.randrange(len(words) + 1), deadline.tag)
+            updates.append(
+                message_update(
+                    update_id,
+                    500_000 + update_id,
+                    chat.chat_id,
+                    chat.report_thread_id,
+                    user.user_id,
+                    " ".join(words),
+                )
+            )
+            update_id += 1
+    rng.shuffle(updates)
+    return updates
+
+
+def write_settings(config: Config, path: Path) -> None:
+    settings = {
+        "chats": [
+            {
+                "chat_id": chat.chat_id,
+                "report_thread_id": chat.report_thread_id,
+                "required_users": [
+                    {"id": user.user_id, "name": user.name, "username": user.username}
+                    for user in chat.required_users
+                ],
+            }
+            for chat in config.chats
+        ],
+        "deadlines": [
+            {
+                "key": deadline.key,
+                "title": deadline.title,
+                "tag": deadline.tag,
+                "weekday_time": f"{deadline.weekday_time:%H:%M}",
+                "weekend_time": f"{deadline.weekend_time:%H:%M}",
+            }
+            for deadline in config.deadlines
+        ],
+    }
+    path.write_text(json.dumps(settings, ensure_ascii=False), encoding="utf-8")
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiohttp import web
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from bot.catchup import drain_updates, send_late_summaries
+from bot.config import Config, LiveConfig, load_config
+from bot.filtering import UpdateFilterMiddleware
+from bot.handlers import router
+from bot.metrics import (
+    SENDER_STATS,
+    STORAGE_STATS,
+    HandlerTimingMiddleware,
+    TelegramMetricsMiddleware,
+    instrument_scheduler,
+    register_stats,
+    start_metrics_server,
+)
+from bot.reload import ConfigReloader, install_signal_handler
+from bot.reshard import check_shards
+from bot.rollups import finalize_pending, prune_reports
+from bot.rosters import seed_rosters
+from bot.scheduler import MANAGED_PREFIXES, plan_jobs, rollover_day, sync_jobs
+from bot.sender import GLOBAL_RATE, Sender
+from bot.storage import close_db, init_db
+from bot.tenants import (
+    Tenant,
+    TenantMiddleware,
+    TenantScope,
+    TenantSpec,
+    check_tenants,
+    load_tenants,
+)
+from bot.webhook import run_webhook
+
+logger = logging.getLogger(__name__)
+
+
+def create_session(config: Config) -> AiohttpSession:
+    if config.api_url:
+        return AiohttpSession(api=TelegramAPIServer.from_base(config.api_url))
+    return AiohttpSession()
+
+
+def create_bot(config: Config, session: AiohttpSession | None = None) -> Bot:
+    if session is None and config.api_url:
+        session = create_session(config)
+    return Bot(token=config.bot_token, session=session, parse_mode=ParseMode.HTML)
+
+
+@dataclass
+class Host:
+    dp: Dispatcher
+    scheduler: AsyncIOScheduler
+    session: AiohttpSession
+    tenants: dict[int, Tenant] = field(default_factory=dict)
+    metrics: web.AppRunner | None = None
+
+
+def create_host(config: Config) -> Host:
+    session = create_session(config)
+    session.middleware(TelegramMetricsMiddleware())
+    scheduler = AsyncIOScheduler(timezone=config.timezone)
+    instrument_scheduler(scheduler, MANAGED_PREFIXES)
+    tenants: dict[int, Tenant] = {}
+    dp = Dispatcher()
+    dp.update.outer_middleware(UpdateFilterMiddleware(TenantScope(tenants)))
+    dp.update.outer_middleware(TenantMiddleware(tenants))
+    dp.message.middleware(HandlerTimingMiddleware())
+    dp.edited_message.middleware(HandlerTimingMiddleware())
+    dp.include_router(router)
+    return Host(dp, scheduler, session, tenants)
+
+
+@dataclass
+class Runtime:
+    bot: Bot
+    dp: Dispatcher
+    live: LiveConfig
+    sender: Sender
+    scheduler: AsyncIOScheduler
+    reloader: ConfigReloader
+    watcher: asyncio.Task[None]
+    host: Host
+
+
+async def start_runtime(
+    config: Config,
+    loader: Callable[[], Config] = load_config,
+    catch_up: bool = False,
+    host: Host | None = None,
+) -> Runtime:
+    timings: list[tuple[str, float]] = []
+    started = time.perf_counter()
+
+    def mark(phase: str) -> None:
+        nonlocal started
+        now = time.perf_counter()
+        timings.append((phase, now - started))
+        started = now
+
+    engine = await init_db(config.db_path)
+    await seed_rosters(config)
+    mark("db")
+    await rollover_day(config)
+    mark("warm-up")
+
+    host = host or create_host(config)
+    bot = create_bot(config, host.session)
+    sender = Sender(bot, global_rate=GLOBAL_RATE / config.shards, tenant=config.tenant)
+    await sender.start()
+    mark("outbox")
+
+    live = LiveConfig(config)
+    sync_jobs(host.scheduler, plan_jobs(sender, live), config.tenant)
+    reloader = ConfigReloader(live, host.scheduler, sender, loader)
+    host.tenants[bot.id] = Tenant(live, sender, reloader)
+    dp = host.dp
+
+    if catch_up:
+        stats = await drain_updates(bot, dp)
+        logger.info("Caught up on pending updates: %s", stats.line())
+        mark("catch-up")
+    await finalize_pending(live.current)
+    await prune_reports(live.current)
+    mark("rollups")
+    await send_late_summaries(sender, live.current)
+    if not host.scheduler.running:
+        host.scheduler.start()
+    install_signal_handler(lambda: [tenant.reloader for tenant in host.tenants.values()])
+    watcher = asyncio.create_task(reloader.watch())
+
+    if config.metrics is not None:
+        prefix = f"reportbot_sender_{config.tenant}" if config.tenant else "reportbot_sender"
+        register_stats(prefix, sender.stats, SENDER_STATS)
+        if host.metrics is None:
+            register_stats("reportbot_storage", engine.stats, STORAGE_STATS)
+            host.metrics = await start_metrics_server(
+                config.metrics.host, config.metrics.port, config.metrics.profiling
+            )
+    mark("runtime")
+    logger.info(
+        "Startup%s took %.3fs: %s",
+        f" of {config.tenant}" if config.tenant else "",
+        sum(seconds for _, seconds in timings),
+        ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in timings),
+    )
+    return Runtime(bot, dp, live, sender, host.scheduler, reloader, watcher, host)
+
+
+async def stop_runtime(runtime: Runtime) -> None:
+    host = runtime.host
+    runtime.watcher.cancel()
+    host.tenants.pop(runtime.bot.id, None)
+    if host.tenants:
+        sync_jobs(host.scheduler, {}, runtime.live.current.tenant)
+    else:
+        host.scheduler.shutdown(wait=False)
+    await runtime.sender.close()
+    if host.tenants:
+        return
+    await close_db()
+    if host.metrics is not None:
+        await host.metrics.cleanup()
+        host.metrics = None
+
+
+async def run_tenants(specs: list[TenantSpec]) -> None:
+    configs = [spec.load() for spec in specs]
+    check_tenants(configs)
+    await check_shards(configs[0])
+    host = create_host(configs[0])
+    runtimes: list[Runtime] = []
+    try:
+        for spec, config in zip(specs, configs):
+            runtimes.append(await start_runtime(config, spec.load, catch_up=True, host=host))
+        logger.info("Hosting %s bots: %s", len(runtimes), ", ".join(spec.name for spec in specs))
+        await host.dp.start_polling(
+            *(runtime.bot for runtime in runtimes),
+            allowed_updates=host.dp.resolve_used_update_types(),
+        )
+    finally:
+        for runtime in runtimes:
+            await stop_runtime(runtime)
+        await host.session.close()
+
+
+async def run() -> None:
+    logging.basicConfig(level=logging.INFO)
+    tenants_path = os.getenv("TENANTS_PATH")
+    if tenants_path:
+        await run_tenants(load_tenants(Path(tenants_path)))
+        return
+    config = load_config()
+    await check_shards(config)
+    if config.shards > 1:
+        from bot.shard import run_front
+
+        await run_front(config)
+        return
+
+    runtime = await start_runtime(config, catch_up=config.webhook is None)
+    try:
+        if config.webhook is not None:
+            await run_webhook(runtime.dp, runtime.bot, config.webhook)
+        else:
+            await runtime.dp.start_polling(
+                runtime.bot, allowed_updates=runtime.dp.resolve_used_update_types()
+            )
+    finally:
+        await stop_runtime(runtime)
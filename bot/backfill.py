@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+
+from aiogram.types import MessageEntity
+
+from bot.config import ChatConfig, Config, Deadline, load_config, shard_of
+from bot.rollups import finalize_pending, last_finalized, reset_topic
+from bot.rosters import seed_rosters
+from bot.storage import ReportRow, ReportUser, close_db, import_reports, init_db
+from bot.time_utils import get_zone
+
+READ_CHUNK = 1 << 20
+BATCH_SIZE = 5000
+PROGRESS_EVERY = 2.0
+MESSAGES_RE = re.compile(r'"messages"\s*:\s*\[')
+CHAT_ID_RE = re.compile(r'"id"\s*:\s*(-?\d+)')
+SUPERGROUP_PREFIX = -1_000_000_000_000
+
+
+def iter_export(stream: TextIO) -> tuple[dict[str, Any], Iterator[dict[str, Any]]]:
+    buffer = ""
+    while True:
+        match = MESSAGES_RE.search(buffer)
+        if match:
+            break
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            raise ValueError("No messages array in export")
+        buffer += chunk
+    header: dict[str, Any] = {}
+    chat_id = CHAT_ID_RE.search(buffer, 0, match.start())
+    if chat_id:
+        header["id"] = int(chat_id.group(1))
+    return header, _iter_messages(stream, buffer[match.end() :])
+
+
+def _iter_messages(stream: TextIO, buffer: str) -> Iterator[dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position >= len(buffer):
+            chunk = stream.read(READ_CHUNK)
+            if not chunk:
+                raise ValueError("Export ended before the messages array was closed")
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            message, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = stream.read(READ_CHUNK)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield message
+        position = end
+
+
+def message_text(message: dict[str, Any]) -> tuple[str, list[MessageEntity] | None]:
+    parts = message.get("text_entities")
+    if parts is None:
+        text = message.get("text", "")
+        if isinstance(text, list):
+            text = "".join(
+                part if isinstance(part, str) else part.get("text", "") for part in text
+            )
+        return text, None
+    text_parts: list[str] = []
+    entities: list[MessageEntity] = []
+    offset = 0
+    for part in parts:
+        chunk = part.get("text", "")
+        length = len(chunk.encode("utf-16-le")) // 2
+        if part.get("type") == "hashtag":
+            entities.append(MessageEntity(type="hashtag", offset=offset, length=length))
+        text_parts.append(chunk)
+        offset += length
+    return "".join(text_parts), entities
+
+
+def message_timestamp(message: dict[str, Any], timezone: str) -> float:
+    if "date_unixtime" in message:
+        return float(message["date_unixtime"])
+    local = datetime.fromisoformat(message["date"]).replace(tzinfo=get_zone(timezone))
+    return local.timestamp()
+
+
+def sender_id(message: dict[str, Any]) -> int | None:
+    from_id = message.get("from_id")
+    if not isinstance(from_id, str) or not from_id.startswith("user"):
+        return None
+    return int(from_id[len("user") :])
+
+
+@dataclass
+class BackfillStats:
+    messages: int = 0
+    matched: int = 0
+    reports: int = 0
+    inserted: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.messages / elapsed if elapsed else 0.0
+        return (
+            f"messages={self.messages} matched={self.matched} reports={self.reports} "
+            f"new_rows={self.inserted} {rate:.0f} msg/s"
+        )
+
+
+class Backfill:
+    def __init__(
+        self,
+        config: Config,
+        chat_id: int,
+        default_thread_id: int | None,
+        batch_size: int = BATCH_SIZE,
+    ) -> None:
+        self.config = config
+        self.chat_id = chat_id
+        self.default_thread_id = default_thread_id
+        self.batch_size = batch_size
+        self.stats = BackfillStats()
+        self.touched: dict[tuple[int, int], str] = {}
+        self._threads: dict[int, int] = {}
+        self._reports: list[ReportRow] = []
+        self._users: dict[int, ReportUser] = {}
+
+    def thread_of(self, message: dict[str, Any]) -> int | None:
+        if message.get("action") == "topic_created":
+            self._threads[message["id"]] = message["id"]
+            return message["id"]
+        reply_to = message.get("reply_to_message_id")
+        thread_id = self._threads.get(reply_to) if reply_to is not None else None
+        if thread_id is None:
+            thread_id = self.default_thread_id
+        if thread_id is not None:
+            self._threads[message["id"]] = thread_id
+        return thread_id
+
+    def route(self, message: dict[str, Any]) -> list[ReportRow]:
+        thread_id = self.thread_of(message)
+        if message.get("type") != "message" or thread_id is None:
+            return []
+        chat = self.config.topics.get((self.chat_id, thread_id))
+        user_id = sender_id(message)
+        if chat is None or user_id is None:
+            return []
+        text, entities = message_text(message)
+        if not text:
+            return []
+        matched = self.config.tag_index.match(chat, text, entities)
+        if not matched:
+            return []
+        self.stats.matched += 1
+        self._users.setdefault(
+            user_id, ReportUser(user_id=user_id, username=None, full_name=message.get("from"))
+        )
+        return self._rows(chat, user_id, matched, message)
+
+    def _rows(
+        self, chat: ChatConfig, user_id: int, matched: list[Deadline], message: dict[str, Any]
+    ) -> list[ReportRow]:
+        timezone = self.config.chat_timezone(chat)
+        timestamp = message_timestamp(message, timezone)
+        day = datetime.fromtimestamp(timestamp, get_zone(timezone)).date()
+        topic = (chat.chat_id, chat.report_thread_id)
+        self.touched[topic] = min(self.touched.get(topic, day.isoformat()), day.isoformat())
+        return [
+            ReportRow(
+                report_date=day,
+                user_id=user_id,
+                deadline_key=deadline.key,
+                chat_id=chat.chat_id,
+                report_thread_id=chat.report_thread_id,
+                reported_at=timestamp,
+                message_id=message["id"],
+            )
+            for deadline in matched
+        ]
+
+    async def feed(self, message: dict[str, Any]) -> None:
+        self.stats.messages += 1
+        rows = self.route(message)
+        self._reports.extend(rows)
+        self.stats.reports += len(rows)
+        if len(self._reports) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._reports:
+            return
+        self.stats.inserted += await import_reports(self._reports, list(self._users.values()))
+        self._reports = []
+        self._users = {}
+
+
+def _export_chat_id(header: dict[str, Any]) -> int | None:
+    raw = header.get("id")
+    if raw is None:
+        return None
+    return raw if raw < 0 else SUPERGROUP_PREFIX - raw
+
+
+async def run_backfill(args: argparse.Namespace) -> BackfillStats:
+    config = load_config()
+    with args.export.open(encoding="utf-8") as stream:
+        header, messages = iter_export(stream)
+        chat_id = args.chat_id if args.chat_id is not None else _export_chat_id(header)
+        if chat_id is None:
+            raise SystemExit("Cannot determine chat id, pass --chat-id")
+        if chat_id not in config.chat_ids:
+            raise SystemExit(f"Chat {chat_id} is not configured in settings")
+        if config.shards > 1:
+            config = config.for_shard(shard_of(chat_id, config.shards))
+        await init_db(config.db_path)
+        await seed_rosters(config)
+        backfill = Backfill(config, chat_id, args.thread_id, args.batch_size)
+        last_progress = time.perf_counter()
+        try:
+            for message in messages:
+                await backfill.feed(message)
+                if time.perf_counter() - last_progress >= PROGRESS_EVERY:
+                    print(backfill.stats.line(), file=sys.stderr)
+                    last_progress = time.perf_counter()
+            await backfill.flush()
+            await _after_import(config, backfill, args.rebuild_rollups)
+        finally:
+            await close_db()
+    return backfill.stats
+
+
+async def _after_import(config: Config, backfill: Backfill, rebuild: bool) -> None:
+    stale = []
+    for (chat_id, thread_id), first_day in sorted(backfill.touched.items()):
+        last = await last_finalized(chat_id, thread_id)
+        if last is not None and first_day <= last.isoformat():
+            stale.append((chat_id, thread_id))
+    if not stale:
+        return
+    if not rebuild:
+        print(
+            f"{len(stale)} topic(s) got reports for days that are already rolled up; "
+            "rerun with --rebuild-rollups to recompute /reportstats",
+            file=sys.stderr,
+        )
+        return
+    for chat_id, thread_id in stale:
+        await reset_topic(chat_id, thread_id)
+    await finalize_pending(config)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Import reports from a Telegram Desktop chat export (result.json)"
+    )
+    parser.add_argument("export", type=Path)
+    parser.add_argument("--chat-id", type=int, help="Bot API chat id, default from the export")
+    parser.add_argument(
+        "--thread-id",
+        type=int,
+        help="Topic for messages whose thread cannot be resolved from replies",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--rebuild-rollups",
+        action="store_true",
+        help="Recompute rollups for topics that got reports for already finalized days",
+    )
+    args = parser.parse_args()
+    stats = asyncio.run(run_backfill(args))
+    print(stats.line())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from bot.config import Config
+from bot.rollups import deadline_cutoff
+from bot.scheduler import SlotEntry, send_summaries
+from bot.sender import Sender
+from bot.storage import last_summary_days, logged_summaries
+from bot.time_utils import today_in_timezone
+
+CATCHUP_LIMIT = 100
+CATCHUP_CONCURRENCY = 64
+LATE_SUMMARY_DAYS = 1
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CatchUpStats:
+    updates: int = 0
+    batches: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.updates / elapsed if elapsed else 0.0
+        return (
+            f"{self.updates} updates in {self.batches} batches, {self.failed} failed, "
+            f"{rate:.0f} updates/s"
+        )
+
+
+def _ordering_key(update: Update) -> tuple[int, int]:
+    message = update.message or update.edited_message
+    if message is None:
+        return (0, update.update_id)
+    return (message.chat.id, message.message_id)
+
+
+async def drain_updates(
+    bot: Bot, dp: Dispatcher, concurrency: int = CATCHUP_CONCURRENCY
+) -> CatchUpStats:
+    stats = CatchUpStats()
+    allowed_updates = dp.resolve_used_update_types()
+    semaphore = asyncio.Semaphore(concurrency)
+    offset: int | None = None
+    while True:
+        updates = await bot.get_updates(
+            offset=offset, limit=CATCHUP_LIMIT, timeout=0, allowed_updates=allowed_updates
+        )
+        if not updates:
+            return stats
+        chains: dict[tuple[int, int], list[Update]] = {}
+        for update in updates:
+            chains.setdefault(_ordering_key(update), []).append(update)
+        await asyncio.gather(
+            *(_feed_chain(bot, dp, chain, semaphore, stats) for chain in chains.values())
+        )
+        offset = updates[-1].update_id + 1
+        stats.updates += len(updates)
+        stats.batches += 1
+
+
+async def _feed_chain(
+    bot: Bot,
+    dp: Dispatcher,
+    chain: list[Update],
+    semaphore: asyncio.Semaphore,
+    stats: CatchUpStats,
+) -> None:
+    async with semaphore:
+        for update in chain:
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                stats.failed += 1
+                logger.exception("Update %s failed during catch-up", update.update_id)
+
+
+async def send_late_summaries(sender: Sender, config: Config) -> int:
+    last_days = await last_summary_days()
+    if not last_days:
+        return 0
+    now = time.time()
+    oldest = min(today_in_timezone(tz) for tz in config.timezones())
+    logged = await logged_summaries(oldest - timedelta(days=LATE_SUMMARY_DAYS))
+    pending: dict[date, list[SlotEntry]] = {}
+    for chat in config.chats:
+        last = last_days.get((chat.chat_id, chat.report_thread_id))
+        if last is None:
+            continue
+        today = today_in_timezone(config.chat_timezone(chat))
+        day = max(last, today - timedelta(days=LATE_SUMMARY_DAYS))
+        while day <= today:
+            for deadline in config.deadlines:
+                if (day, deadline.key, chat.chat_id, chat.report_thread_id) in logged:
+                    continue
+                if deadline_cutoff(config, chat, deadline, day) <= now:
+                    pending.setdefault(day, []).append((deadline.key, chat))
+            day += timedelta(days=1)
+    for day, entries in sorted(pending.items()):
+        await send_summaries(sender, config, day, entries, late=True)
+    sent = sum(len(entries) for entries in pending.values())
+    if sent:
+        logger.info("Posted %s late deadline summaries", sent)
+    return sent
@@ -2,13 +2,17 @@ from __future__ import annotations
 
 import json
 import os
-from dataclasses import dataclass
+import zlib
+from dataclasses import dataclass, field, replace
 from datetime import time
+from functools import cached_property
 from pathlib import Path
-from typing import Iterable
 
 from dotenv import load_dotenv
 
+from bot.tags import TagIndex
+from bot.time_utils import get_zone
+
 load_dotenv()
 
 
@@ -44,6 +48,8 @@ class Deadline:
     title: str
     weekday_time: time
     weekend_time: time
+    aliases: tuple[str, ...] = ()
+    reminders: tuple[int, ...] = ()
 
     def time_for_weekday(self, is_weekend: bool) -> time:
         return self.weekend_time if is_weekend else self.weekday_time
@@ -54,6 +60,31 @@ class ChatConfig:
     chat_id: int
     report_thread_id: int
     required_users: list[UserRef]
+    tag_aliases: dict[str, tuple[str, ...]] = field(default_factory=dict)
+    timezone: str | None = None
+    deadline_times: dict[str, tuple[time, time]] = field(default_factory=dict)
+
+    def deadline_time(self, deadline: Deadline, is_weekend: bool) -> time:
+        override = self.deadline_times.get(deadline.key)
+        if override is None:
+            return deadline.time_for_weekday(is_weekend)
+        return override[1] if is_weekend else override[0]
+
+
+@dataclass(frozen=True)
+class WebhookConfig:
+    path: str
+    secret: str
+    host: str
+    port: int
+    url: str | None = None
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    host: str
+    port: int
+    profiling: bool = False
 
 
 @dataclass(frozen=True)
@@ -62,6 +93,76 @@ class Config:
     timezone: str
     deadlines: list[Deadline]
     chats: list[ChatConfig]
+    webhook: WebhookConfig | None = None
+    api_url: str | None = None
+    admin_ids: frozenset[int] = frozenset()
+    settings_path: Path = Path("settings.json")
+    db_path: Path = Path("data.db")
+    shards: int = 1
+    shard_port: int = 9300
+    retention_days: int | None = None
+    metrics: MetricsConfig | None = None
+    tenant: str = ""
+    base_db_path: Path | None = None
+
+    @cached_property
+    def tag_index(self) -> TagIndex:
+        return TagIndex(self.deadlines, self.chats)
+
+    @cached_property
+    def topics(self) -> dict[tuple[int, int], ChatConfig]:
+        return {(chat.chat_id, chat.report_thread_id): chat for chat in self.chats}
+
+    @cached_property
+    def chat_ids(self) -> frozenset[int]:
+        return frozenset(chat.chat_id for chat in self.chats)
+
+    def chat_timezone(self, chat: ChatConfig) -> str:
+        return chat.timezone or self.timezone
+
+    def timezones(self) -> list[str]:
+        return sorted({self.timezone, *(self.chat_timezone(chat) for chat in self.chats)})
+
+    def for_shard(self, shard: int) -> Config:
+        base = self.base_db_path or self.db_path
+        return replace(
+            self,
+            chats=[chat for chat in self.chats if shard_of(chat.chat_id, self.shards) == shard],
+            db_path=base.with_name(f"{base.stem}.shard{shard}{base.suffix}"),
+            base_db_path=base,
+            metrics=(
+                replace(self.metrics, port=self.metrics.port + shard)
+                if self.metrics is not None
+                else None
+            ),
+        )
+
+    def db_paths(self, chat_id: int | None = None) -> list[Path]:
+        if self.shards <= 1:
+            return [self.db_path]
+        if chat_id is not None:
+            return [self.for_shard(shard_of(chat_id, self.shards)).db_path]
+        return [self.for_shard(shard).db_path for shard in range(self.shards)]
+
+
+def shard_of(chat_id: int, shards: int) -> int:
+    if shards <= 1:
+        return 0
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+
+class LiveConfig:
+    def __init__(self, config: Config) -> None:
+        self._config = config
+
+    @property
+    def current(self) -> Config:
+        return self._config
+
+    def swap(self, config: Config) -> Config:
+        previous = self._config
+        self._config = config
+        return previous
 
 
 def _load_settings(path: Path) -> dict:
@@ -106,6 +207,8 @@ def _load_deadlines(settings: dict) -> list[Deadline]:
                 title=raw.get("title", raw["key"]),
                 weekday_time=_parse_time(raw.get("weekday_time"), time(hour=18, minute=0)),
                 weekend_time=_parse_time(raw.get("weekend_time"), time(hour=18, minute=0)),
+                aliases=tuple(raw.get("aliases", [])),
+                reminders=_parse_reminders(raw.get("reminders", [])),
             )
         )
     if deadlines:
@@ -121,7 +224,46 @@ def _load_deadlines(settings: dict) -> list[Deadline]:
     ]
 
 
-def _load_chats(settings: dict, fallback_ids: list[int]) -> list[ChatConfig]:
+def _parse_reminders(raw: list) -> tuple[int, ...]:
+    minutes = {int(value) for value in raw}
+    if any(value <= 0 for value in minutes):
+        raise ValueError("Reminder offsets must be positive minutes")
+    return tuple(sorted(minutes, reverse=True))
+
+
+def _check_reminders(deadlines: list[Deadline], chats: list[ChatConfig]) -> None:
+    for deadline in deadlines:
+        if not deadline.reminders:
+            continue
+        for chat in chats:
+            for weekend in (False, True):
+                at = chat.deadline_time(deadline, weekend)
+                if deadline.reminders[0] > at.hour * 60 + at.minute:
+                    raise ValueError(
+                        f"Reminder {deadline.reminders[0]} min before {deadline.key} "
+                        f"at {at:%H:%M} in chat {chat.chat_id} falls on the previous day"
+                    )
+
+
+def _load_deadline_times(
+    raw_chat: dict, deadlines: list[Deadline]
+) -> dict[str, tuple[time, time]]:
+    by_key = {deadline.key: deadline for deadline in deadlines}
+    overrides: dict[str, tuple[time, time]] = {}
+    for key, raw in raw_chat.get("deadline_times", {}).items():
+        deadline = by_key.get(key)
+        if deadline is None:
+            raise ValueError(f"Unknown deadline in deadline_times: {key}")
+        overrides[key] = (
+            _parse_time(raw.get("weekday_time"), deadline.weekday_time),
+            _parse_time(raw.get("weekend_time"), deadline.weekend_time),
+        )
+    return overrides
+
+
+def _load_chats(
+    settings: dict, fallback_ids: list[int], deadlines: list[Deadline]
+) -> list[ChatConfig]:
     chats: list[ChatConfig] = []
     raw_chats = settings.get("chats", [])
     for raw_chat in raw_chats:
@@ -134,6 +276,12 @@ def _load_chats(settings: dict, fallback_ids: list[int]) -> list[ChatConfig]:
                 chat_id=int(raw_chat["chat_id"]),
                 report_thread_id=int(raw_chat["report_thread_id"]),
                 required_users=chat_required,
+                tag_aliases={
+                    key: tuple(aliases)
+                    for key, aliases in raw_chat.get("tag_aliases", {}).items()
+                },
+                timezone=raw_chat.get("timezone"),
+                deadline_times=_load_deadline_times(raw_chat, deadlines),
             )
         )
     if chats:
@@ -153,29 +301,73 @@ def _load_chats(settings: dict, fallback_ids: list[int]) -> list[ChatConfig]:
     ]
 
 
-def load_config() -> Config:
-    bot_token = os.getenv("BOT_TOKEN")
+def _load_webhook() -> WebhookConfig | None:
+    mode = os.getenv("UPDATE_MODE", "polling").lower()
+    if mode == "polling":
+        return None
+    if mode != "webhook":
+        raise ValueError("UPDATE_MODE must be polling or webhook")
+    secret = os.getenv("WEBHOOK_SECRET")
+    if not secret:
+        raise ValueError("WEBHOOK_SECRET is required in webhook mode")
+    return WebhookConfig(
+        path=os.getenv("WEBHOOK_PATH", "/telegram/webhook"),
+        secret=secret,
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        url=os.getenv("WEBHOOK_URL") or None,
+    )
+
+
+def _load_metrics() -> MetricsConfig | None:
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    return MetricsConfig(
+        host=os.getenv("METRICS_HOST", "127.0.0.1"),
+        port=int(port),
+        profiling=os.getenv("METRICS_PROFILING", "").lower() in {"1", "true", "yes"},
+    )
+
+
+def load_config(
+    settings_path: Path | None = None, bot_token: str | None = None, tenant: str = ""
+) -> Config:
+    bot_token = bot_token or os.getenv("BOT_TOKEN")
     if not bot_token:
         raise ValueError("BOT_TOKEN is required")
 
     timezone = os.getenv("TIMEZONE", "Europe/Moscow")
     required_user_ids = _parse_user_ids(os.getenv("REQUIRED_USER_IDS"))
-    settings_path = Path(os.getenv("SETTINGS_PATH", "settings.json"))
+    settings_path = settings_path or Path(os.getenv("SETTINGS_PATH", "settings.json"))
     settings = _load_settings(settings_path)
 
-    return Config(
+    deadlines = _load_deadlines(settings)
+    chats = _load_chats(settings, required_user_ids, deadlines)
+    _check_reminders(deadlines, chats)
+    config = Config(
         bot_token=bot_token,
         timezone=timezone,
-        deadlines=_load_deadlines(settings),
-        chats=_load_chats(settings, required_user_ids),
+        deadlines=deadlines,
+        chats=chats,
+        webhook=_load_webhook(),
+        api_url=os.getenv("TELEGRAM_API_URL") or None,
+        admin_ids=frozenset(
+            _parse_user_ids(os.getenv("ADMIN_USER_IDS"))
+            + [int(user_id) for user_id in settings.get("admins", [])]
+        ),
+        settings_path=settings_path,
+        db_path=Path(os.getenv("DB_PATH", "data.db")),
+        shards=max(1, int(os.getenv("SHARDS", "1"))),
+        shard_port=int(os.getenv("SHARD_PORT", "9300")),
+        retention_days=settings.get("retention_days"),
+        metrics=_load_metrics(),
+        tenant=tenant,
     )
+    for zone in config.timezones():
+        get_zone(zone)
+    config.tag_index
+    config.topics
+    config.chat_ids
+    return config
 
-
-def format_user_list(users: Iterable[UserRef], marker: str | None = None) -> str:
-    items = list(users)
-    if not items:
-        return "—"
-    prefix = f"{marker} " if marker else ""
-    return "\n".join(
-        f"• {prefix}{user.display()} (<code>{user.user_id}</code>)" for user in items
-    )
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+MESSAGE_LOG_SIZE = 100_000
+MESSAGE_LOG_TTL = 48 * 3600.0
+
+MessageKey = tuple[int, int]
+
+
+@dataclass(frozen=True)
+class SeenMessage:
+    edit_date: int
+    deadline_keys: frozenset[str]
+    expires: float
+
+
+class MessageLog:
+    def __init__(
+        self,
+        size: int = MESSAGE_LOG_SIZE,
+        ttl: float = MESSAGE_LOG_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[MessageKey, SeenMessage] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: int, message_id: int) -> SeenMessage | None:
+        key = (chat_id, message_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= self.clock():
+            del self._entries[key]
+            return None
+        return entry
+
+    def put(
+        self, chat_id: int, message_id: int, edit_date: int, deadline_keys: frozenset[str]
+    ) -> None:
+        key = (chat_id, message_id)
+        now = self.clock()
+        self._entries[key] = SeenMessage(edit_date, deadline_keys, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        while self._entries and next(iter(self._entries.values())).expires <= now:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+message_log = MessageLog()
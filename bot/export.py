@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterable
+
+import aiosqlite
+
+from bot.config import load_config
+
+FETCH_CHUNK = 1000
+FORMATS = ("csv", "jsonl")
+COLUMNS = (
+    "report_date",
+    "chat_id",
+    "report_thread_id",
+    "deadline_key",
+    "user_id",
+    "username",
+    "full_name",
+    "reported_at",
+)
+
+
+@dataclass(frozen=True)
+class ExportFilter:
+    date_from: date
+    date_to: date
+    chat_id: int | None = None
+    thread_id: int | None = None
+    deadline_key: str | None = None
+    chat_ids: frozenset[int] | None = None
+
+    def where(self) -> tuple[str, list[Any]]:
+        clauses = ["r.report_date BETWEEN ? AND ?"]
+        params: list[Any] = [self.date_from.isoformat(), self.date_to.isoformat()]
+        for column, value in (
+            ("r.chat_id", self.chat_id),
+            ("r.report_thread_id", self.thread_id),
+            ("r.deadline_key", self.deadline_key),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if self.chat_ids is not None:
+            clauses.append(f"+r.chat_id IN ({', '.join('?' * len(self.chat_ids))})")
+            params.extend(sorted(self.chat_ids))
+        return " AND ".join(clauses), params
+
+    def order(self) -> str:
+        if self.chat_id is not None:
+            return "r.chat_id, r.report_thread_id, r.report_date, r.deadline_key"
+        return "r.report_date, r.user_id, r.deadline_key, r.chat_id, r.report_thread_id"
+
+
+async def iter_reports(
+    db_path: Path, export_filter: ExportFilter, chunk: int = FETCH_CHUNK
+) -> AsyncIterator[list[tuple[Any, ...]]]:
+    where, params = export_filter.where()
+    async with aiosqlite.connect(f"file:{db_path}?mode=ro", uri=True) as db:
+        cursor = await db.execute(
+            f"""
+            SELECT r.report_date, r.chat_id, r.report_thread_id, r.deadline_key, r.user_id,
+                u.username, u.full_name, r.reported_at
+            FROM reports AS r
+            LEFT JOIN users AS u ON u.user_id = r.user_id
+            WHERE {where}
+            ORDER BY {export_filter.order()}
+            """,
+            params,
+        )
+        while True:
+            rows = await cursor.fetchmany(chunk)
+            if not rows:
+                break
+            yield rows
+
+
+def _row(row: tuple[Any, ...]) -> tuple[Any, ...]:
+    reported_at = row[7]
+    if reported_at is not None:
+        reported_at = datetime.fromtimestamp(reported_at, timezone.utc).isoformat()
+    return (*row[:7], reported_at)
+
+
+class _Writer:
+    def __init__(self, path: Path, fmt: str) -> None:
+        self.format = fmt
+        self.stream = gzip.open(path, "wt", encoding="utf-8", newline="")
+        self.csv = csv.writer(self.stream) if fmt == "csv" else None
+        if self.csv is not None:
+            self.csv.writerow(COLUMNS)
+
+    def write(self, rows: Iterable[tuple[Any, ...]]) -> None:
+        if self.csv is not None:
+            self.csv.writerows(_row(row) for row in rows)
+            return
+        for row in rows:
+            self.stream.write(json.dumps(dict(zip(COLUMNS, _row(row))), ensure_ascii=False))
+            self.stream.write("\n")
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+async def export_reports(
+    db_paths: Iterable[Path], export_filter: ExportFilter, path: Path, fmt: str = "csv"
+) -> int:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    writer = await asyncio.to_thread(_Writer, path, fmt)
+    count = 0
+    try:
+        for db_path in db_paths:
+            if not db_path.exists():
+                continue
+            async for rows in iter_reports(db_path, export_filter):
+                await asyncio.to_thread(writer.write, rows)
+                count += len(rows)
+    finally:
+        await asyncio.to_thread(writer.close)
+    return count
+
+
+def export_filename(export_filter: ExportFilter, fmt: str) -> str:
+    return f"reports_{export_filter.date_from}_{export_filter.date_to}.{fmt}.gz"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export reports to a gzip CSV/JSONL file")
+    parser.add_argument("date_from", type=date.fromisoformat)
+    parser.add_argument("date_to", type=date.fromisoformat)
+    parser.add_argument("--chat-id", type=int)
+    parser.add_argument("--thread-id", type=int)
+    parser.add_argument("--deadline")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("-o", "--output", type=Path)
+    args = parser.parse_args()
+
+    config = load_config()
+    export_filter = ExportFilter(
+        args.date_from, args.date_to, args.chat_id, args.thread_id, args.deadline
+    )
+    output = args.output or Path(export_filename(export_filter, args.format))
+    count = asyncio.run(
+        export_reports(config.db_paths(args.chat_id), export_filter, output, args.format)
+    )
+    print(f"Exported {count} rows to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+
+from bot.config import Config
+from bot.metrics import UPDATES
+
+PASSED = "passed"
+DROPPED_CHAT = "dropped_chat"
+DROPPED_TOPIC = "dropped_topic"
+
+
+@dataclass(frozen=True)
+class TopicScope:
+    chat_ids: frozenset[int]
+    topics: frozenset[tuple[int, int]]
+
+    @classmethod
+    def of(cls, configs: Iterable[Config]) -> TopicScope:
+        configs = list(configs)
+        return cls(
+            frozenset(chat_id for config in configs for chat_id in config.chat_ids),
+            frozenset(topic for config in configs for topic in config.topics),
+        )
+
+
+def topic_filter(
+    scope: Config | TopicScope,
+    chat_id: int,
+    thread_id: int | None,
+    text: str | None,
+    chat_type: str = "supergroup",
+) -> str:
+    if chat_type == "private" or (text and text.startswith("/")):
+        return PASSED
+    if chat_id not in scope.chat_ids:
+        return DROPPED_CHAT
+    if thread_id is None or (chat_id, thread_id) not in scope.topics:
+        return DROPPED_TOPIC
+    return PASSED
+
+
+def filter_update(scope: Config | TopicScope, update: Update) -> str:
+    message = update.message or update.edited_message
+    if message is None:
+        return PASSED
+    return topic_filter(
+        scope,
+        message.chat.id,
+        message.message_thread_id,
+        message.text or message.caption,
+        message.chat.type,
+    )
+
+
+def filter_raw_update(config: Config, update: dict[str, Any]) -> str:
+    message = update.get("message") or update.get("edited_message")
+    if message is None:
+        return PASSED
+    chat = message["chat"]
+    return topic_filter(
+        config,
+        chat["id"],
+        message.get("message_thread_id"),
+        message.get("text") or message.get("caption"),
+        chat.get("type", "supergroup"),
+    )
+
+
+class UpdateFilterMiddleware(BaseMiddleware):
+    def __init__(self, scope: Callable[[], TopicScope] | None = None) -> None:
+        self.scope = scope
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        assert isinstance(event, Update)
+        scope = self.scope() if self.scope is not None else data["config"]
+        result = filter_update(scope, event)
+        UPDATES.inc(result)
+        if result != PASSED:
+            return UNHANDLED
+        return await handler(event, data)
@@ -1,81 +1,356 @@
 from __future__ import annotations
 
+import tempfile
+from datetime import date
+from html import escape
+from pathlib import Path
+
 from aiogram import Router, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.utils.markdown import hbold
 
-from bot.config import ChatConfig, Config, UserRef, format_user_list
-from bot.storage import add_report, get_reporters
-from bot.time_utils import today_in_timezone
+from bot.config import ChatConfig, Config, UserRef
+from bot.dedup import message_log
+from bot.export import FORMATS, ExportFilter, export_filename, export_reports
+from bot.metrics import INGEST
+from bot.reload import ConfigReloader
+from bot.render import (
+    format_reporters,
+    format_user_list,
+    split_message,
+    status_cache,
+)
+from bot.rollups import get_stats
+from bot.rosters import (
+    add_to_roster,
+    get_missing_many,
+    get_roster,
+    remove_from_roster,
+    roster_version,
+)
+from bot.sender import Sender
+from bot.storage import (
+    add_report,
+    flush,
+    get_reporters_many,
+    known_user,
+    remove_message_reports,
+    topic_version,
+)
+from bot.time_utils import local_date, today_in_timezone
+
+DEFAULT_STATS_WEEKS = 4
+MAX_STATS_WEEKS = 52
+EXPORT_USAGE = (
+    "Использование: /reportexport ГГГГ-ММ-ДД ГГГГ-ММ-ДД "
+    "[deadline=ключ] [chat=id] [format=csv|jsonl]"
+)
+ROSTER_ADD_USAGE = (
+    "Использование: ответьте /rosteradd на сообщение участника "
+    "или укажите /rosteradd id [имя]"
+)
+ROSTER_REMOVE_USAGE = (
+    "Использование: ответьте /rosterremove на сообщение участника "
+    "или укажите /rosterremove id [id ...]"
+)
+NOT_CONFIGURED = "Этот топик не настроен для отчетов. Запустите команду в нужной теме."
 
 router = Router()
 
 
 @router.message(Command("start"))
-async def start(message: types.Message, config: Config) -> None:
-    await message.answer(
+async def start(message: types.Message, config: Config, sender: Sender) -> None:
+    await sender.reply(
+        message,
         "Я слежу за отчетами в теме. "
         "Отправляйте отчеты в тему, а в дедлайн я покажу список."
     )
 
 
 @router.message(Command("reportstatus"))
-async def report_status(message: types.Message, config: Config) -> None:
-    today = today_in_timezone(config.timezone)
+async def report_status(
+    message: types.Message, config: Config, sender: Sender
+) -> None:
     if message.chat is None:
         return
     chat_config = _find_chat_config(
         config, message.chat.id, message.message_thread_id
     )
     if chat_config is None:
-        await message.answer(
-            "Этот топик не настроен для отчетов. "
-            "Запустите команду в нужной теме."
-        )
+        await sender.reply(message, NOT_CONFIGURED)
         return
-    required_by_id = {user.user_id: user for user in chat_config.required_users}
-    parts: list[str] = [hbold("Сегодняшний статус")]
+    today = today_in_timezone(config.chat_timezone(chat_config))
+    topic = (today, chat_config.chat_id, chat_config.report_thread_id)
+    version = (
+        topic_version(*topic),
+        roster_version(chat_config.chat_id, chat_config.report_thread_id),
+    )
+    chunks = status_cache.get(config, *topic, version)
+    if chunks is None:
+        chunks = split_message(await _render_status(config, chat_config, today))
+        status_cache.put(config, *topic, version, chunks)
+    await sender.send_many(
+        message.chat.id,
+        chunks,
+        message.message_thread_id if message.is_topic_message else None,
+    )
 
-    for deadline in config.deadlines:
-        reporters = await get_reporters(
-            today,
-            deadline.key,
-            chat_config.chat_id,
-            chat_config.report_thread_id,
-        )
-        reporters_list = sorted(
-            reporters.values(), key=lambda user: user.user_id
-        )
-        missing_ids = set(required_by_id) - set(reporters)
-        missing_list = [required_by_id[user_id] for user_id in sorted(missing_ids)]
 
+async def _render_status(config: Config, chat_config: ChatConfig, today: date) -> str:
+    keys = [
+        (deadline.key, chat_config.chat_id, chat_config.report_thread_id)
+        for deadline in config.deadlines
+    ]
+    reporters = await get_reporters_many(today, keys)
+    missing = await get_missing_many(today, keys)
+    parts: list[str] = [hbold("Сегодняшний статус")]
+
+    for deadline, key in zip(config.deadlines, keys):
         parts.append(
             "\n".join(
                 [
                     f"\n{hbold(deadline.title)} ({deadline.tag})",
                     f"{hbold('Отчитались')}:",
-                    format_user_list(
-                        [
-                            UserRef(
-                                user_id=report.user_id,
-                                username=report.username,
-                                name=report.full_name,
-                            )
-                            for report in reporters_list
-                        ],
-                        marker="✅",
-                    ),
+                    format_reporters(reporters[key].values(), marker="✅"),
                     f"{hbold('Не отчитались')}:",
-                    format_user_list(missing_list, marker="❌"),
+                    format_user_list(missing[key], marker="❌"),
                 ]
             )
         )
+    return "\n\n".join(parts)
+
+
+@router.message(Command("reloadconfig"))
+async def reload_config(
+    message: types.Message, config: Config, sender: Sender, reloader: ConfigReloader
+) -> None:
+    if not _is_admin(config, message):
+        return
+    try:
+        result = await reloader.reload()
+    except Exception as exc:
+        await sender.reply(message, f"Не удалось перечитать настройки: {escape(str(exc))}")
+        return
+    await sender.reply(message, result.describe())
+
+
+@router.message(Command("reportstats"))
+async def report_stats(
+    message: types.Message, command: CommandObject, config: Config, sender: Sender
+) -> None:
+    if message.chat is None:
+        return
+    chat_config = _find_chat_config(
+        config, message.chat.id, message.message_thread_id
+    )
+    if chat_config is None:
+        await sender.reply(message, NOT_CONFIGURED)
+        return
+    weeks = DEFAULT_STATS_WEEKS
+    if command.args and command.args.strip().isdigit():
+        weeks = min(max(int(command.args.strip()), 1), MAX_STATS_WEEKS)
+    stats = await get_stats(config, chat_config, weeks)
+    users = {
+        user.user_id: user
+        for user in get_roster(chat_config.chat_id, chat_config.report_thread_id)
+    }
+    parts: list[str] = [
+        hbold(f"Статистика за {weeks} нед. (по вчерашний день)")
+    ]
+    for deadline in config.deadlines:
+        rows = sorted(
+            (
+                item
+                for item in stats
+                if item.deadline_key == deadline.key and item.user_id in users
+            ),
+            key=lambda item: (-item.completion, item.late, item.user_id),
+        )
+        lines = [f"{hbold(deadline.title)} ({deadline.tag})"]
+        if not rows:
+            lines.append("Пока нет данных")
+        for item in rows:
+            lines.append(
+                f"• {escape(users[item.user_id].display())}: "
+                f"{item.completion:.0%}, опозданий {item.late}, "
+                f"серия {item.streak} (лучшая {item.best_streak})"
+            )
+        late = [users[item.user_id] for item in rows if item.chronic_late]
+        if late:
+            lines.append(f"{hbold('Часто опаздывают')}:")
+            lines.append(format_user_list(late, marker="⏰"))
+        parts.append("\n".join(lines))
+
+    await sender.send_many(
+        message.chat.id,
+        split_message("\n\n".join(parts)),
+        message.message_thread_id if message.is_topic_message else None,
+    )
+
+
+@router.message(Command("rosteradd"))
+async def roster_add(
+    message: types.Message, command: CommandObject, config: Config, sender: Sender
+) -> None:
+    chat_config = await _roster_topic(config, message, sender)
+    if chat_config is None:
+        return
+    try:
+        users = _parse_roster_add(message, command.args or "")
+    except ValueError:
+        await sender.reply(message, ROSTER_ADD_USAGE)
+        return
+    added = await add_to_roster(chat_config.chat_id, chat_config.report_thread_id, users)
+    if not added:
+        await sender.reply(message, "Уже в списке.")
+        return
+    await sender.reply(message, f"{hbold('Добавлены в список')}:\n{format_user_list(added)}")
+
+
+@router.message(Command("rosterremove"))
+async def roster_remove(
+    message: types.Message, command: CommandObject, config: Config, sender: Sender
+) -> None:
+    chat_config = await _roster_topic(config, message, sender)
+    if chat_config is None:
+        return
+    try:
+        user_ids = [int(token) for token in (command.args or "").split()]
+    except ValueError:
+        await sender.reply(message, ROSTER_REMOVE_USAGE)
+        return
+    replied = _replied_user(message)
+    if replied is not None:
+        user_ids.append(replied.user_id)
+    if not user_ids:
+        await sender.reply(message, ROSTER_REMOVE_USAGE)
+        return
+    removed = await remove_from_roster(
+        chat_config.chat_id, chat_config.report_thread_id, user_ids
+    )
+    if not removed:
+        await sender.reply(message, "Таких участников нет в списке.")
+        return
+    await sender.reply(message, f"{hbold('Удалены из списка')}:\n{format_user_list(removed)}")
+
+
+async def _roster_topic(
+    config: Config, message: types.Message, sender: Sender
+) -> ChatConfig | None:
+    if not _is_admin(config, message):
+        return None
+    chat_config = _find_chat_config(config, message.chat.id, message.message_thread_id)
+    if chat_config is None:
+        await sender.reply(message, NOT_CONFIGURED)
+    return chat_config
+
+
+def _replied_user(message: types.Message) -> UserRef | None:
+    reply = message.reply_to_message
+    if reply is None or reply.forum_topic_created is not None:
+        return None
+    if reply.from_user is None or reply.from_user.is_bot:
+        return None
+    return UserRef(
+        user_id=reply.from_user.id,
+        name=reply.from_user.full_name,
+        username=reply.from_user.username,
+    )
+
+
+def _parse_roster_add(message: types.Message, args: str) -> list[UserRef]:
+    users: list[UserRef] = []
+    replied = _replied_user(message)
+    if replied is not None:
+        users.append(replied)
+    tokens = args.split()
+    if tokens:
+        user_id = int(tokens[0])
+        name = " ".join(tokens[1:]) or None
+        known = known_user(user_id)
+        if name is None and known is not None:
+            users.append(UserRef(user_id=user_id, name=known.full_name, username=known.username))
+        else:
+            users.append(UserRef(user_id=user_id, name=name))
+    if not users:
+        raise ValueError("No user to add")
+    return users
+
+
+@router.message(Command("reportexport"))
+async def report_export(
+    message: types.Message,
+    command: CommandObject,
+    config: Config,
+    sender: Sender,
+) -> None:
+    if not _is_admin(config, message):
+        return
+    try:
+        export_filter, fmt = _parse_export_args(config, message, command.args or "")
+    except ValueError:
+        await sender.reply(message, EXPORT_USAGE)
+        return
+    await flush()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / export_filename(export_filter, fmt)
+        count = await export_reports(
+            config.db_paths(export_filter.chat_id), export_filter, path, fmt
+        )
+        await sender.send_document(
+            message.chat.id,
+            types.FSInputFile(path),
+            message_thread_id=message.message_thread_id if message.is_topic_message else None,
+            caption=f"Строк: {count}",
+        )
 
-    await message.answer("\n\n".join(parts))
+
+def _parse_export_args(
+    config: Config, message: types.Message, args: str
+) -> tuple[ExportFilter, str]:
+    positional: list[str] = []
+    options: dict[str, str] = {}
+    for token in args.split():
+        if "=" in token:
+            key, value = token.split("=", 1)
+            options[key] = value
+        else:
+            positional.append(token)
+    if len(positional) != 2:
+        raise ValueError("Expected two dates")
+    date_from, date_to = (date.fromisoformat(value) for value in positional)
+    fmt = options.get("format", "csv")
+    if fmt not in FORMATS or date_from > date_to:
+        raise ValueError("Bad export arguments")
+    chat_id = int(options["chat"]) if "chat" in options else None
+    thread_id = None
+    if message.chat.type != "private":
+        chat_id = message.chat.id
+        chat_config = _find_chat_config(config, message.chat.id, message.message_thread_id)
+        if chat_config is not None:
+            thread_id = chat_config.report_thread_id
+    chat_ids = None
+    if config.tenant:
+        if chat_id is not None and chat_id not in config.chat_ids:
+            raise ValueError("Chat belongs to another tenant")
+        chat_ids = config.chat_ids
+    export_filter = ExportFilter(
+        date_from, date_to, chat_id, thread_id, options.get("deadline"), chat_ids
+    )
+    return export_filter, fmt
 
 
 @router.message()
 async def capture_reports(message: types.Message, config: Config) -> None:
+    await _ingest(message, config)
+
+
+@router.edited_message()
+async def capture_edits(message: types.Message, config: Config) -> None:
+    await _ingest(message, config)
+
+
+async def _ingest(message: types.Message, config: Config) -> None:
     if message.chat is None:
         return
     chat_config = _find_chat_config(
@@ -83,28 +358,54 @@ async def capture_reports(message: types.Message, config: Config) -> None:
     )
     if chat_config is None:
         return
-    if message.message_thread_id != chat_config.report_thread_id:
-        return
     if not message.from_user or message.from_user.is_bot:
         return
-    text = message.text or message.caption or ""
-    if not text:
-        return
-    matched = [deadline for deadline in config.deadlines if deadline.tag in text]
-    if not matched:
-        return
-    full_name = message.from_user.full_name
-    username = message.from_user.username
-    for deadline in matched:
-        await add_report(
-            today_in_timezone(config.timezone),
-            message.from_user.id,
-            deadline.key,
-            chat_config.chat_id,
-            chat_config.report_thread_id,
-            username,
-            full_name,
-        )
+    edit_date = message.edit_date or 0
+    seen = message_log.get(message.chat.id, message.message_id)
+    if seen is not None and seen.edit_date >= edit_date:
+        INGEST.inc("duplicate")
+        return
+    if message.text:
+        text, entities = message.text, message.entities
+    else:
+        text, entities = message.caption or "", message.caption_entities
+    matched = config.tag_index.match(chat_config, text, entities) if text else []
+    keys = frozenset(deadline.key for deadline in matched)
+    previous: frozenset[str] | None
+    if seen is not None:
+        previous = seen.deadline_keys
+    elif edit_date:
+        previous = None
+    else:
+        previous = frozenset()
+    if keys == previous:
+        message_log.put(message.chat.id, message.message_id, edit_date, keys)
+        INGEST.inc("unchanged" if keys else "ignored")
+        return
+    if previous is None:
+        stale = frozenset(deadline.key for deadline in config.deadlines) - keys
+    else:
+        stale = previous - keys
+    if stale and await remove_message_reports(message.chat.id, message.message_id, stale):
+        INGEST.inc("removed")
+    added = [deadline for deadline in matched if previous is None or deadline.key not in previous]
+    if added:
+        reported_at = float(edit_date) if edit_date else message.date.timestamp()
+        day = local_date(message.date, config.chat_timezone(chat_config))
+        for deadline in added:
+            await add_report(
+                day,
+                message.from_user.id,
+                deadline.key,
+                chat_config.chat_id,
+                chat_config.report_thread_id,
+                message.from_user.username,
+                message.from_user.full_name,
+                reported_at,
+                message.message_id,
+            )
+        INGEST.inc("added")
+    message_log.put(message.chat.id, message.message_id, edit_date, keys)
 
 
 def _find_chat_config(
@@ -112,7 +413,8 @@ def _find_chat_config(
 ) -> ChatConfig | None:
     if thread_id is None:
         return None
-    for chat in config.chats:
-        if chat.chat_id == chat_id and chat.report_thread_id == thread_id:
-            return chat
-    return None
+    return config.topics.get((chat_id, thread_id))
+
+
+def _is_admin(config: Config, message: types.Message) -> bool:
+    return message.from_user is not None and message.from_user.id in config.admin_ids
@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import functools
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as StackCounter
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+from aiohttp import web
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+    JobEvent,
+    JobExecutionEvent,
+    JobSubmissionEvent,
+)
+from apscheduler.schedulers.base import BaseScheduler
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)
+PROFILE_INTERVAL = 0.005
+PROFILE_SECONDS = 10.0
+PROFILE_MAX_SECONDS = 120.0
+PROFILE_TOP = 30
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        self._values[values] = self._values.get(values, 0.0) + amount
+
+    def value(self, *values: str) -> float:
+        return self._values.get(values, 0.0)
+
+    def render(self) -> Iterable[str]:
+        for values, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *values: str) -> None:
+        counts = self._counts.get(values)
+        if counts is None:
+            counts = self._counts[values] = [0] * (len(self.buckets) + 1)
+            self._sums[values] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[values] += value
+
+    def count(self, *values: str) -> int:
+        return sum(self._counts.get(values, ()))
+
+    def render(self) -> Iterable[str]:
+        for values, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {_format_value(self._sums[values])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge:
+    def __init__(
+        self, name: str, help_text: str, read: Callable[[], float], kind: str = "gauge"
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> Iterable[str]:
+        try:
+            value = self.read()
+        except Exception:
+            logger.exception("Gauge %s failed", self.name)
+            return
+        yield f"{self.name} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def register(self, metric: Counter | Histogram | Gauge) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(
+        self, name: str, help_text: str, read: Callable[[], float], kind: str = "gauge"
+    ) -> Gauge:
+        return self.register(Gauge(name, help_text, read, kind))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.histogram(
+    "reportbot_handler_seconds", "Handler execution time", ("handler",)
+)
+HANDLER_ERRORS = registry.counter(
+    "reportbot_handler_errors_total", "Handler exceptions", ("handler",)
+)
+STORAGE_SECONDS = registry.histogram(
+    "reportbot_storage_seconds", "Storage call time", ("operation",)
+)
+STORAGE_COMMIT_SECONDS = registry.histogram(
+    "reportbot_storage_commit_seconds", "Time to execute and commit one write batch"
+)
+STORAGE_BATCH_SIZE = registry.histogram(
+    "reportbot_storage_batch_size",
+    "Statements per commit",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+TELEGRAM_SECONDS = registry.histogram(
+    "reportbot_telegram_request_seconds", "Bot API call latency", ("method",)
+)
+TELEGRAM_ERRORS = registry.counter(
+    "reportbot_telegram_errors_total", "Bot API call failures", ("method", "error")
+)
+UPDATES = registry.counter(
+    "reportbot_updates_total", "Incoming updates by early-filter result", ("result",)
+)
+INGEST = registry.counter(
+    "reportbot_ingest_total", "Messages in report topics by ingestion outcome", ("result",)
+)
+JOB_LAG = registry.histogram(
+    "reportbot_job_lag_seconds",
+    "Delay between the scheduled and actual start of a job",
+    ("job",),
+    LAG_BUCKETS,
+)
+JOB_RUNS = registry.counter("reportbot_job_runs_total", "Finished jobs", ("job", "outcome"))
+
+SENDER_STATS = (
+    ("queue_depth", "gauge", "Messages waiting to be sent"),
+    ("in_flight", "gauge", "Bot API sends in progress"),
+    ("sent", "counter", "Delivered messages"),
+    ("failed", "counter", "Messages dropped after a permanent error"),
+    ("retry_after", "counter", "RetryAfter responses from Telegram"),
+    ("retries", "counter", "Send retries after transient errors"),
+    ("avg_latency", "gauge", "Mean seconds from enqueue to delivery"),
+    ("max_latency", "gauge", "Max seconds from enqueue to delivery"),
+)
+STORAGE_STATS = (
+    ("reads", "counter", "SQLite read queries"),
+    ("writes", "counter", "SQLite write statements"),
+    ("commits", "counter", "SQLite commits"),
+)
+
+
+def register_stats(prefix: str, stats: object, fields: Iterable[tuple[str, str, str]]) -> None:
+    for field, kind, help_text in fields:
+        name = f"{prefix}_{field}_total" if kind == "counter" else f"{prefix}_{field}"
+        registry.gauge(name, help_text, functools.partial(getattr, stats, field), kind)
+
+
+def timed_storage(func: F) -> F:
+    operation = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            STORAGE_SECONDS.observe(time.perf_counter() - started, operation)
+
+    return wrapper  # type: ignore[return-value]
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            TELEGRAM_ERRORS.inc(name, "retry_after")
+            raise
+        except Exception as exc:
+            TELEGRAM_ERRORS.inc(name, type(exc).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, name)
+
+
+def _job_kind(job_id: str, prefixes: tuple[str, ...]) -> str:
+    for prefix in prefixes:
+        if job_id.startswith(prefix):
+            return prefix.rstrip("_")
+    return "other"
+
+
+def _on_job_event(event: JobEvent, prefixes: tuple[str, ...]) -> None:
+    kind = _job_kind(event.job_id, prefixes)
+    if isinstance(event, JobSubmissionEvent):
+        if event.scheduled_run_times:
+            lag = datetime.now(timezone.utc) - max(event.scheduled_run_times)
+            JOB_LAG.observe(max(lag.total_seconds(), 0.0), kind)
+    elif isinstance(event, JobExecutionEvent):
+        if event.code == EVENT_JOB_MISSED:
+            JOB_RUNS.inc(kind, "missed")
+            logger.warning("Job %s misfired (scheduled %s)", event.job_id, event.scheduled_run_time)
+        elif event.code == EVENT_JOB_ERROR:
+            JOB_RUNS.inc(kind, "error")
+        else:
+            JOB_RUNS.inc(kind, "ok")
+
+
+def instrument_scheduler(scheduler: BaseScheduler, prefixes: tuple[str, ...]) -> None:
+    scheduler.add_listener(
+        functools.partial(_on_job_event, prefixes=prefixes),
+        EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED,
+    )
+
+
+class Profiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL) -> None:
+        self.interval = interval
+        self._stacks: StackCounter[tuple[str, ...]] = StackCounter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stacks.clear()
+        self._samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        if self._thread is None:
+            return "Profiler is not running\n"
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return self.dump()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = tuple(
+                    f"{entry.name} ({entry.filename}:{entry.lineno})"
+                    for entry in traceback.extract_stack(frame)
+                )
+                self._stacks[stack] += 1
+            self._samples += 1
+
+    def dump(self, top: int = PROFILE_TOP) -> str:
+        lines = [f"samples: {self._samples}, interval: {self.interval}s"]
+        for stack, count in self._stacks.most_common(top):
+            lines.append(f"\n{count} ({count / max(self._samples, 1):.1%})")
+            lines.extend(f"  {frame}" for frame in stack[-12:])
+        return "\n".join(lines) + "\n"
+
+
+def build_metrics_app(profiling: bool = False) -> web.Application:
+    profiler = Profiler()
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def profile(request: web.Request) -> web.Response:
+        action = request.query.get("action")
+        if action == "start":
+            profiler.start()
+            return web.Response(text="Profiler started\n")
+        if action == "stop":
+            return web.Response(text=profiler.stop())
+        if profiler.running:
+            return web.Response(text="Profiler is already running\n", status=409)
+        seconds = min(float(request.query.get("seconds", PROFILE_SECONDS)), PROFILE_MAX_SECONDS)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            dump = profiler.stop()
+        return web.Response(text=dump)
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    if profiling:
+        app.router.add_get("/debug/profile", profile)
+    return app
+
+
+async def start_metrics_server(host: str, port: int, profiling: bool = False) -> web.AppRunner:
+    runner = web.AppRunner(build_metrics_app(profiling))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics on http://%s:%s/metrics", host, port)
+    return runner
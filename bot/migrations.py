@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Awaitable, Callable
+
+import aiosqlite
+
+COPY_CHUNK = 50_000
+REPORT_KEY = ("report_date", "user_id", "deadline_key", "chat_id", "report_thread_id")
+
+logger = logging.getLogger(__name__)
+
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+async def _baseline(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reports (
+            report_date TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            deadline_key TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            reported_at REAL,
+            PRIMARY KEY (report_date, user_id, deadline_key, chat_id, report_thread_id)
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            full_name TEXT
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id TEXT PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            message_thread_id INTEGER,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_weekly (
+            week_start TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            deadline_key TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            on_time INTEGER NOT NULL DEFAULT 0,
+            late INTEGER NOT NULL DEFAULT 0,
+            missed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chat_id, report_thread_id, deadline_key, user_id, week_start)
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_streaks (
+            chat_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            deadline_key TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            current INTEGER NOT NULL DEFAULT 0,
+            best INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chat_id, report_thread_id, deadline_key, user_id)
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollup_log (
+            chat_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            report_date TEXT NOT NULL,
+            PRIMARY KEY (chat_id, report_thread_id, report_date)
+        )
+        """
+    )
+    await _upgrade_reports(db)
+
+
+async def _report_indexes(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS reports_topic_idx
+        ON reports (chat_id, report_thread_id, report_date, deadline_key)
+        """
+    )
+
+
+async def _rosters(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rosters (
+            chat_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            name TEXT,
+            username TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            source TEXT NOT NULL,
+            PRIMARY KEY (chat_id, report_thread_id, user_id)
+        )
+        """
+    )
+
+
+async def _report_message_ids(db: aiosqlite.Connection) -> None:
+    columns, _ = await _columns(db, "reports")
+    if "message_id" not in columns:
+        await db.execute("ALTER TABLE reports ADD COLUMN message_id INTEGER")
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS reports_message_idx
+        ON reports (chat_id, message_id) WHERE message_id IS NOT NULL
+        """
+    )
+
+
+async def _summary_log(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS summary_log (
+            chat_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            report_date TEXT NOT NULL,
+            deadline_key TEXT NOT NULL,
+            sent_at REAL NOT NULL,
+            PRIMARY KEY (chat_id, report_thread_id, report_date, deadline_key)
+        )
+        """
+    )
+
+
+async def _outbox_tenants(db: aiosqlite.Connection) -> None:
+    columns, _ = await _columns(db, "outbox")
+    if "tenant" not in columns:
+        await db.execute("ALTER TABLE outbox ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+
+
+async def _report_messages(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_messages (
+            chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            deadline_key TEXT NOT NULL,
+            report_date TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, message_id, deadline_key)
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS report_messages_report_idx
+        ON report_messages (chat_id, report_thread_id, report_date, deadline_key, user_id)
+        """
+    )
+    await db.execute(
+        """
+        INSERT OR IGNORE INTO report_messages (
+            chat_id, message_id, deadline_key, report_date, user_id, report_thread_id
+        )
+        SELECT chat_id, message_id, deadline_key, report_date, user_id, report_thread_id
+        FROM reports
+        WHERE message_id IS NOT NULL
+        """
+    )
+
+
+async def _meta(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+
+
+MIGRATIONS: list[Migration] = [
+    _baseline,
+    _report_indexes,
+    _rosters,
+    _report_message_ids,
+    _summary_log,
+    _outbox_tenants,
+    _report_messages,
+    _meta,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+async def migrate(db: aiosqlite.Connection) -> None:
+    cursor = await db.execute("PRAGMA user_version")
+    (version,) = await cursor.fetchone()
+    if version == SCHEMA_VERSION:
+        return
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than supported {SCHEMA_VERSION}"
+        )
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        migration = MIGRATIONS[number - 1]
+        started = time.perf_counter()
+        await migration(db)
+        await db.execute(f"PRAGMA user_version = {number}")
+        await db.commit()
+        logger.info(
+            "Applied migration %s (%s) in %.3fs",
+            number,
+            migration.__name__.lstrip("_"),
+            time.perf_counter() - started,
+        )
+
+
+async def _columns(db: aiosqlite.Connection, table: str) -> tuple[set[str], set[str]]:
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    rows = await cursor.fetchall()
+    return {row[1] for row in rows}, {row[1] for row in rows if row[5]}
+
+
+async def _upgrade_reports(db: aiosqlite.Connection) -> None:
+    existing, pk_cols = await _columns(db, "reports")
+    resuming = bool((await _columns(db, "reports_new"))[0])
+    if not resuming and pk_cols == set(REPORT_KEY) and existing == pk_cols | {"reported_at"}:
+        return
+    if not resuming and ("username" in existing or "full_name" in existing):
+        await _copy_users(db, existing)
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reports_new (
+            report_date TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            deadline_key TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            report_thread_id INTEGER NOT NULL,
+            reported_at REAL,
+            PRIMARY KEY (report_date, user_id, deadline_key, chat_id, report_thread_id)
+        )
+        """
+    )
+    await db.commit()
+    await _move_rows(db, existing)
+    await db.execute("DROP TABLE reports")
+    await db.execute("ALTER TABLE reports_new RENAME TO reports")
+
+
+async def _copy_users(db: aiosqlite.Connection, existing: set[str]) -> None:
+    username_expr = "username" if "username" in existing else "NULL"
+    full_name_expr = "full_name" if "full_name" in existing else "NULL"
+    order = "report_date, reported_at" if "reported_at" in existing else "report_date"
+    await db.execute(
+        f"""
+        INSERT OR REPLACE INTO users (user_id, username, full_name)
+        SELECT user_id, {username_expr}, {full_name_expr}
+        FROM reports
+        WHERE {username_expr} IS NOT NULL OR {full_name_expr} IS NOT NULL
+        ORDER BY {order}
+        """
+    )
+
+
+async def _move_rows(db: aiosqlite.Connection, existing: set[str]) -> None:
+    deadline_expr = "deadline_key" if "deadline_key" in existing else "''"
+    chat_expr = "chat_id" if "chat_id" in existing else "0"
+    thread_expr = "report_thread_id" if "report_thread_id" in existing else "0"
+    reported_at_expr = "reported_at" if "reported_at" in existing else "NULL"
+    moved = 0
+    while True:
+        cursor = await db.execute(
+            "SELECT MAX(rowid) FROM (SELECT rowid FROM reports ORDER BY rowid LIMIT ?)",
+            (COPY_CHUNK,),
+        )
+        (upper,) = await cursor.fetchone()
+        if upper is None:
+            break
+        cursor = await db.execute(
+            f"""
+            INSERT OR IGNORE INTO reports_new (
+                report_date, user_id, deadline_key, chat_id, report_thread_id, reported_at
+            )
+            SELECT report_date, user_id, {deadline_expr}, {chat_expr}, {thread_expr},
+                {reported_at_expr}
+            FROM reports
+            WHERE rowid <= ?
+            """,
+            (upper,),
+        )
+        await db.execute("DELETE FROM reports WHERE rowid <= ?", (upper,))
+        await db.commit()
+        moved += cursor.rowcount
+        logger.info("Migrated %s report rows", moved)
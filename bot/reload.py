@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from bot.config import Config, LiveConfig, load_config
+from bot.rosters import seed_rosters
+from bot.scheduler import plan_jobs, rollover_day, sync_jobs
+from bot.sender import Sender
+
+WATCH_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReloadResult:
+    added_jobs: list[str] = field(default_factory=list)
+    removed_jobs: list[str] = field(default_factory=list)
+    added_topics: list[tuple[int, int]] = field(default_factory=list)
+    removed_topics: list[tuple[int, int]] = field(default_factory=list)
+    changed_topics: list[tuple[int, int]] = field(default_factory=list)
+    deadlines_changed: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(
+            self.added_jobs
+            or self.removed_jobs
+            or self.added_topics
+            or self.removed_topics
+            or self.changed_topics
+            or self.deadlines_changed
+        )
+
+    def describe(self) -> str:
+        if not self.changed:
+            return "Настройки не изменились."
+        lines = []
+        if self.added_topics:
+            lines.append(f"Новые топики: {len(self.added_topics)}")
+        if self.removed_topics:
+            lines.append(f"Удалены топики: {len(self.removed_topics)}")
+        if self.changed_topics:
+            lines.append(f"Изменены топики: {len(self.changed_topics)}")
+        if self.deadlines_changed:
+            lines.append("Изменены дедлайны")
+        lines.append(
+            f"Задачи планировщика: +{len(self.added_jobs)} / -{len(self.removed_jobs)}"
+        )
+        return "\n".join(lines)
+
+
+def diff_configs(old: Config, new: Config) -> ReloadResult:
+    old_topics = {(chat.chat_id, chat.report_thread_id): chat for chat in old.chats}
+    new_topics = {(chat.chat_id, chat.report_thread_id): chat for chat in new.chats}
+    return ReloadResult(
+        added_topics=sorted(set(new_topics) - set(old_topics)),
+        removed_topics=sorted(set(old_topics) - set(new_topics)),
+        changed_topics=sorted(
+            topic
+            for topic in set(old_topics) & set(new_topics)
+            if old_topics[topic] != new_topics[topic]
+        ),
+        deadlines_changed=old.deadlines != new.deadlines or old.timezone != new.timezone,
+    )
+
+
+class ConfigReloader:
+    def __init__(
+        self,
+        live: LiveConfig,
+        scheduler: AsyncIOScheduler,
+        sender: Sender,
+        loader: Callable[[], Config] = load_config,
+    ) -> None:
+        self.live = live
+        self.scheduler = scheduler
+        self.sender = sender
+        self.loader = loader
+        self._lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._mtime = self._settings_mtime()
+
+    def _settings_mtime(self) -> float | None:
+        path = self.live.current.settings_path
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    async def reload(self) -> ReloadResult:
+        async with self._lock:
+            mtime = self._settings_mtime()
+            new = self.loader()
+            old = self.live.current
+            if new.bot_token != old.bot_token:
+                logger.warning("BOT_TOKEN changes require a restart, keeping the old token")
+            result = diff_configs(old, new)
+            await seed_rosters(new)
+            await rollover_day(new)
+            self.live.swap(new)
+            result.added_jobs, result.removed_jobs = sync_jobs(
+                self.scheduler, plan_jobs(self.sender, self.live), new.tenant
+            )
+            self._mtime = mtime
+            logger.info("Settings reloaded: %s", result.describe().replace("\n", "; "))
+            return result
+
+    async def try_reload(self) -> None:
+        try:
+            await self.reload()
+        except Exception:
+            logger.exception("Settings reload failed, keeping the previous config")
+
+    async def watch(self, interval: float = WATCH_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            mtime = self._settings_mtime()
+            if mtime != self._mtime:
+                await self.try_reload()
+
+    def reload_soon(self) -> None:
+        task = asyncio.create_task(self.try_reload())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def install_signal_handler(reloaders: Callable[[], Iterable[ConfigReloader]]) -> None:
+    if not hasattr(signal, "SIGHUP"):
+        return
+    loop = asyncio.get_running_loop()
+
+    def on_sighup() -> None:
+        for reloader in reloaders():
+            reloader.reload_soon()
+
+    try:
+        loop.add_signal_handler(signal.SIGHUP, on_sighup)
+    except NotImplementedError:
+        pass
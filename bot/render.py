@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from html import escape
+from typing import Iterable, Iterator
+
+from bot.config import Config, UserRef
+from bot.storage import ReportUser
+
+MESSAGE_LIMIT = 4096
+FRAGMENT_CACHE_SIZE = 16384
+STATUS_CACHE_SIZE = 1024
+MENTIONS_PER_LINE = 10
+ENTITY_MAX = 10
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def user_line(user: UserRef, marker: str | None = None) -> str:
+    prefix = f"{marker} " if marker else ""
+    return f"• {prefix}{escape(user.display())} (<code>{user.user_id}</code>)"
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def reporter_ref(user: ReportUser) -> UserRef:
+    return UserRef(user_id=user.user_id, username=user.username, name=user.full_name)
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def mention(user: UserRef) -> str:
+    if user.username:
+        return f"@{escape(user.username.lstrip('@'))}"
+    name = escape(user.name or str(user.user_id))
+    return f'<a href="tg://user?id={user.user_id}">{name}</a>'
+
+
+def format_mentions(users: Iterable[UserRef], per_line: int = MENTIONS_PER_LINE) -> str:
+    names = [mention(user) for user in users]
+    return "\n".join(
+        ", ".join(names[start : start + per_line]) for start in range(0, len(names), per_line)
+    )
+
+
+def format_user_list(users: Iterable[UserRef], marker: str | None = None) -> str:
+    lines = [user_line(user, marker) for user in users]
+    return "\n".join(lines) if lines else "—"
+
+
+def format_reporters(reporters: Iterable[ReportUser], marker: str | None = None) -> str:
+    return format_user_list(
+        (reporter_ref(user) for user in sorted(reporters, key=lambda user: user.user_id)),
+        marker,
+    )
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    if len(text) <= limit:
+        return [text]
+    chunks: list[str] = []
+    lines: list[str] = []
+    size = 0
+    for line in _split_lines(text, limit):
+        if lines and size + 1 + len(line) > limit:
+            chunks.append("\n".join(lines).strip("\n"))
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line) + (1 if size else 0)
+    if lines:
+        chunks.append("\n".join(lines).strip("\n"))
+    return [chunk for chunk in chunks if chunk]
+
+
+def _split_lines(text: str, limit: int) -> Iterator[str]:
+    for line in text.split("\n"):
+        while len(line) > limit:
+            cut = _cut_position(line, limit)
+            yield line[:cut].rstrip(" ")
+            line = line[cut:].lstrip(" ")
+        yield line
+
+
+def _cut_position(line: str, limit: int) -> int:
+    depth = 0
+    outside = closed = space = 0
+    index = 0
+    while index < len(line):
+        if line[index] == "<":
+            end = line.find(">", index)
+            depth += -1 if line.startswith("</", index) else 1
+            index = len(line) if end < 0 else end + 1
+        elif line[index] == "&" and 0 < line.find(";", index) - index <= ENTITY_MAX:
+            index = line.find(";", index) + 1
+        else:
+            index += 1
+        if index > limit:
+            break
+        outside = index
+        if depth <= 0:
+            closed = index
+            if line[index - 1] == " ":
+                space = index
+    return space or closed or outside or limit
+
+
+@dataclass(frozen=True)
+class _CachedStatus:
+    config: Config
+    version: tuple[int, int]
+    chunks: list[str]
+
+
+class StatusCache:
+    def __init__(self, size: int = STATUS_CACHE_SIZE) -> None:
+        self.size = size
+        self._entries: OrderedDict[tuple[date, int, int], _CachedStatus] = OrderedDict()
+
+    def get(
+        self,
+        config: Config,
+        day: date,
+        chat_id: int,
+        thread_id: int,
+        version: tuple[int, int],
+    ) -> list[str] | None:
+        key = (day, chat_id, thread_id)
+        entry = self._entries.get(key)
+        if entry is None or entry.config is not config or entry.version != version:
+            return None
+        self._entries.move_to_end(key)
+        return entry.chunks
+
+    def put(
+        self,
+        config: Config,
+        day: date,
+        chat_id: int,
+        thread_id: int,
+        version: tuple[int, int],
+        chunks: list[str],
+    ) -> None:
+        key = (day, chat_id, thread_id)
+        self._entries[key] = _CachedStatus(config, version, chunks)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+status_cache = StatusCache()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import sys
+from pathlib import Path
+
+import aiosqlite
+
+from bot.config import Config, load_config, shard_of
+from bot.migrations import migrate
+
+SHARDS_KEY = "shards"
+STAGED_SUFFIX = ".reshard"
+BACKUP_SUFFIX = ".bak"
+
+
+def shard_paths(config: Config) -> list[Path]:
+    return config.db_paths()
+
+
+def existing_paths(config: Config) -> dict[Path, int | None]:
+    base = config.db_path
+    found: dict[Path, int | None] = {}
+    if base.exists():
+        found[base] = None
+    pattern = re.compile(rf"^{re.escape(base.stem)}\.shard(\d+){re.escape(base.suffix)}$")
+    for path in sorted(base.parent.glob(f"{base.stem}.shard*{base.suffix}")):
+        match = pattern.match(path.name)
+        if match:
+            found[path] = int(match.group(1))
+    return found
+
+
+async def _tables(db: aiosqlite.Connection) -> dict[str, list[str]]:
+    cursor = await db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )
+    tables: dict[str, list[str]] = {}
+    for (name,) in await cursor.fetchall():
+        if name == "meta":
+            continue
+        cursor = await db.execute(f"PRAGMA table_info({name})")
+        tables[name] = [row[1] for row in await cursor.fetchall()]
+    return tables
+
+
+async def _read_layout(path: Path) -> tuple[int | None, bool]:
+    async with aiosqlite.connect(path) as db:
+        tables = await _tables(db)
+        cursor = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta'"
+        )
+        shards: int | None = None
+        if await cursor.fetchone():
+            cursor = await db.execute("SELECT value FROM meta WHERE key = ?", (SHARDS_KEY,))
+            row = await cursor.fetchone()
+            shards = int(row[0]) if row else None
+        for table, columns in tables.items():
+            if "chat_id" not in columns:
+                continue
+            cursor = await db.execute(f"SELECT 1 FROM {table} LIMIT 1")
+            if await cursor.fetchone():
+                return shards, True
+    return shards, False
+
+
+async def _record_layout(path: Path, shards: int) -> None:
+    async with aiosqlite.connect(path) as db:
+        await migrate(db)
+        await db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (SHARDS_KEY, str(shards))
+        )
+        await db.commit()
+
+
+async def check_shards(config: Config) -> None:
+    expected = shard_paths(config)
+    stale: list[Path] = []
+    for path, shard in existing_paths(config).items():
+        recorded, has_data = await _read_layout(path)
+        if recorded is None:
+            recorded = 1 if shard is None else config.shards
+        if has_data and (path not in expected or recorded != config.shards):
+            stale.append(path)
+    if stale:
+        raise RuntimeError(
+            f"{', '.join(str(path) for path in stale)} hold data for another SHARDS value "
+            f"than {config.shards}; restore SHARDS or run python -m bot.reshard"
+        )
+    for path in expected:
+        await _record_layout(path, config.shards)
+
+
+async def reshard(config: Config) -> dict[Path, int]:
+    sources = list(existing_paths(config))
+    targets = shard_paths(config)
+    for source in sources:
+        backup = source.with_name(source.name + BACKUP_SUFFIX)
+        if backup.exists():
+            raise RuntimeError(f"{backup} already exists, move it away first")
+        async with aiosqlite.connect(source) as db:
+            await migrate(db)
+            await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    counts: dict[Path, int] = {}
+    for shard, target in enumerate(targets):
+        staged = target.with_name(target.name + STAGED_SUFFIX)
+        staged.unlink(missing_ok=True)
+        async with aiosqlite.connect(staged) as db:
+            await migrate(db)
+            await db.create_function(
+                "shard_of",
+                1,
+                lambda chat_id: shard_of(chat_id, config.shards),
+                deterministic=True,
+            )
+            tables = await _tables(db)
+            for source in sources:
+                await db.execute("ATTACH DATABASE ? AS source", (str(source),))
+                for table, columns in tables.items():
+                    names = ", ".join(columns)
+                    sql = (
+                        f"INSERT OR IGNORE INTO main.{table} ({names}) "
+                        f"SELECT {names} FROM source.{table}"
+                    )
+                    if "chat_id" in columns:
+                        await db.execute(f"{sql} WHERE shard_of(chat_id) = ?", (shard,))
+                    else:
+                        await db.execute(sql)
+                await db.commit()
+                await db.execute("DETACH DATABASE source")
+            await db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (SHARDS_KEY, str(config.shards)),
+            )
+            await db.commit()
+            cursor = await db.execute("SELECT COUNT(*) FROM reports")
+            (counts[target],) = await cursor.fetchone()
+    for source in sources:
+        source.rename(source.with_name(source.name + BACKUP_SUFFIX))
+    for target in targets:
+        target.with_name(target.name + STAGED_SUFFIX).rename(target)
+    return counts
+
+
+def main() -> None:
+    argparse.ArgumentParser(
+        description="Redistribute per-shard databases for the current SHARDS value. "
+        "Stop the bot first; old files are kept with a .bak suffix."
+    ).parse_args()
+    config = load_config()
+    counts = asyncio.run(reshard(config))
+    for path, count in counts.items():
+        print(f"{path}: {count} reports", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from bot.config import ChatConfig, Config, Deadline
+from bot.rosters import get_roster, load_rosters
+from bot.storage import Statement, get_engine
+from bot.time_utils import get_zone, is_weekend, today_in_timezone
+
+ON_TIME = "on_time"
+LATE = "late"
+MISSED = "missed"
+CHRONIC_LATE_SHARE = 0.3
+CHRONIC_LATE_MIN = 2
+
+logger = logging.getLogger(__name__)
+_finalize_lock = asyncio.Lock()
+
+
+@dataclass(frozen=True)
+class UserStats:
+    deadline_key: str
+    user_id: int
+    on_time: int
+    late: int
+    missed: int
+    streak: int
+    best_streak: int
+
+    @property
+    def reported(self) -> int:
+        return self.on_time + self.late
+
+    @property
+    def total(self) -> int:
+        return self.reported + self.missed
+
+    @property
+    def completion(self) -> float:
+        return self.reported / self.total if self.total else 0.0
+
+    @property
+    def chronic_late(self) -> bool:
+        return self.late >= CHRONIC_LATE_MIN and self.late >= self.reported * CHRONIC_LATE_SHARE
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def deadline_cutoff(config: Config, chat: ChatConfig, deadline: Deadline, day: date) -> float:
+    at = chat.deadline_time(deadline, is_weekend(day))
+    zone = get_zone(config.chat_timezone(chat))
+    return datetime.combine(day, at, tzinfo=zone).timestamp()
+
+
+async def finalize_day(config: Config, chat: ChatConfig, day: date) -> bool:
+    engine = get_engine()
+    await engine.flush()
+    claimed = await engine.fetchall(
+        """
+        SELECT 1
+        FROM rollup_log
+        WHERE chat_id = ? AND report_thread_id = ? AND report_date = ?
+        """,
+        (chat.chat_id, chat.report_thread_id, day.isoformat()),
+    )
+    if claimed:
+        return False
+    rows = await engine.fetchall(
+        """
+        SELECT deadline_key, user_id, reported_at
+        FROM reports
+        WHERE report_date = ? AND chat_id = ? AND report_thread_id = ?
+        """,
+        (day.isoformat(), chat.chat_id, chat.report_thread_id),
+    )
+    reported = {(row[0], row[1]): row[2] for row in rows}
+    streak_rows = await engine.fetchall(
+        """
+        SELECT deadline_key, user_id, current, best
+        FROM report_streaks
+        WHERE chat_id = ? AND report_thread_id = ?
+        """,
+        (chat.chat_id, chat.report_thread_id),
+    )
+    streaks = {(row[0], row[1]): (row[2], row[3]) for row in streak_rows}
+    week = week_start(day).isoformat()
+    roster = get_roster(chat.chat_id, chat.report_thread_id)
+    weekly: list[Statement] = [
+        (
+            "INSERT INTO rollup_log (chat_id, report_thread_id, report_date) VALUES (?, ?, ?)",
+            (chat.chat_id, chat.report_thread_id, day.isoformat()),
+        )
+    ]
+    streak_updates: list[Statement] = []
+    for deadline in config.deadlines:
+        cutoff = deadline_cutoff(config, chat, deadline, day)
+        for user in roster:
+            key = (deadline.key, user.user_id)
+            if key not in reported:
+                status = MISSED
+            elif reported[key] is None or reported[key] <= cutoff:
+                status = ON_TIME
+            else:
+                status = LATE
+            counts = (int(status == ON_TIME), int(status == LATE), int(status == MISSED))
+            weekly.append(
+                (
+                    """
+                    INSERT INTO report_weekly (
+                        week_start, chat_id, report_thread_id, deadline_key, user_id,
+                        on_time, late, missed
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (chat_id, report_thread_id, deadline_key, user_id, week_start)
+                    DO UPDATE SET
+                        on_time = on_time + excluded.on_time,
+                        late = late + excluded.late,
+                        missed = missed + excluded.missed
+                    """,
+                    (
+                        week,
+                        chat.chat_id,
+                        chat.report_thread_id,
+                        deadline.key,
+                        user.user_id,
+                        *counts,
+                    ),
+                )
+            )
+            current, best = streaks.get(key, (0, 0))
+            current = current + 1 if status == ON_TIME else 0
+            streak_updates.append(
+                (
+                    """
+                    INSERT OR REPLACE INTO report_streaks (
+                        chat_id, report_thread_id, deadline_key, user_id, current, best
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        chat.chat_id,
+                        chat.report_thread_id,
+                        deadline.key,
+                        user.user_id,
+                        current,
+                        max(best, current),
+                    ),
+                )
+            )
+    await engine.write_many(weekly + streak_updates)
+    return True
+
+
+async def _first_pending_day(chat: ChatConfig, yesterday: date) -> date | None:
+    engine = get_engine()
+    last = await last_finalized(chat.chat_id, chat.report_thread_id)
+    if last is not None:
+        return last + timedelta(days=1)
+    rows = await engine.fetchall(
+        """
+        SELECT MIN(report_date)
+        FROM reports
+        WHERE chat_id = ? AND report_thread_id = ?
+        """,
+        (chat.chat_id, chat.report_thread_id),
+    )
+    if rows[0][0] is not None:
+        return date.fromisoformat(rows[0][0])
+    await engine.write(
+        "INSERT OR IGNORE INTO rollup_log (chat_id, report_thread_id, report_date) "
+        "VALUES (?, ?, ?)",
+        (chat.chat_id, chat.report_thread_id, yesterday.isoformat()),
+    )
+    return None
+
+
+async def finalize_pending(config: Config) -> int:
+    async with _finalize_lock:
+        await load_rosters()
+        finalized = 0
+        for chat in config.chats:
+            yesterday = today_in_timezone(config.chat_timezone(chat)) - timedelta(days=1)
+            day = await _first_pending_day(chat, yesterday)
+            while day is not None and day <= yesterday:
+                if await finalize_day(config, chat, day):
+                    finalized += 1
+                day += timedelta(days=1)
+    if finalized:
+        logger.info("Rolled up %s topic-days", finalized)
+    return finalized
+
+
+async def reset_topic(chat_id: int, report_thread_id: int) -> None:
+    await get_engine().write_many(
+        [
+            (
+                f"DELETE FROM {table} WHERE chat_id = ? AND report_thread_id = ?",
+                (chat_id, report_thread_id),
+            )
+            for table in ("report_weekly", "report_streaks", "rollup_log")
+        ]
+    )
+
+
+async def last_finalized(chat_id: int, report_thread_id: int) -> date | None:
+    rows = await get_engine().fetchall(
+        """
+        SELECT MAX(report_date)
+        FROM rollup_log
+        WHERE chat_id = ? AND report_thread_id = ?
+        """,
+        (chat_id, report_thread_id),
+    )
+    return date.fromisoformat(rows[0][0]) if rows[0][0] is not None else None
+
+
+async def prune_reports(config: Config) -> None:
+    if not config.retention_days:
+        return
+    cutoff = today_in_timezone(config.timezone) - timedelta(days=config.retention_days)
+    scope = ""
+    params: list[object] = [cutoff.isoformat()]
+    if config.tenant:
+        if not config.topics:
+            return
+        scope = (
+            "AND (chat_id, report_thread_id) IN (VALUES "
+            + ", ".join("(?, ?)" for _ in config.topics)
+            + ")"
+        )
+        params.extend(value for topic in config.topics for value in topic)
+    await get_engine().write_many(
+        [
+            (
+                f"""
+                DELETE FROM {table}
+                WHERE report_date < ?
+                    AND EXISTS (
+                        SELECT 1
+                        FROM rollup_log AS l
+                        WHERE l.chat_id = {table}.chat_id
+                            AND l.report_thread_id = {table}.report_thread_id
+                            AND l.report_date = {table}.report_date
+                    )
+                    {scope}
+                """,
+                tuple(params),
+            )
+            for table in ("reports", "report_messages")
+        ]
+    )
+
+
+async def get_stats(config: Config, chat: ChatConfig, weeks: int) -> list[UserStats]:
+    today = today_in_timezone(config.chat_timezone(chat))
+    since = week_start(today) - timedelta(weeks=weeks - 1)
+    engine = get_engine()
+    rows = await engine.fetchall(
+        """
+        SELECT deadline_key, user_id, SUM(on_time), SUM(late), SUM(missed)
+        FROM report_weekly
+        WHERE chat_id = ? AND report_thread_id = ? AND week_start >= ?
+        GROUP BY deadline_key, user_id
+        """,
+        (chat.chat_id, chat.report_thread_id, since.isoformat()),
+    )
+    streak_rows = await engine.fetchall(
+        """
+        SELECT deadline_key, user_id, current, best
+        FROM report_streaks
+        WHERE chat_id = ? AND report_thread_id = ?
+        """,
+        (chat.chat_id, chat.report_thread_id),
+    )
+    streaks = {(row[0], row[1]): (row[2], row[3]) for row in streak_rows}
+    return [
+        UserStats(
+            deadline_key=row[0],
+            user_id=row[1],
+            on_time=row[2],
+            late=row[3],
+            missed=row[4],
+            streak=streaks.get((row[0], row[1]), (0, 0))[0],
+            best_streak=streaks.get((row[0], row[1]), (0, 0))[1],
+        )
+        for row in rows
+    ]
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable
+
+from bot.config import Config, UserRef
+from bot.metrics import timed_storage
+from bot.storage import Statement, StorageEngine, get_engine, state
+
+SETTINGS = "settings"
+COMMAND = "command"
+
+TopicKey = tuple[int, int]
+MissingKey = tuple[str, int, int]
+
+
+@dataclass(frozen=True)
+class RosterEntry:
+    user: UserRef
+    active: bool
+    source: str
+
+
+class RosterCache:
+    def __init__(self) -> None:
+        self.engine: StorageEngine | None = None
+        self._entries: dict[TopicKey, dict[int, RosterEntry]] = {}
+        self._users: dict[TopicKey, dict[int, UserRef]] = {}
+        self._ids: dict[TopicKey, tuple[int, ...]] = {}
+        self._versions: dict[TopicKey, int] = {}
+        self._clock = 0
+
+    def load(self, engine: StorageEngine, rows: Iterable[tuple[TopicKey, RosterEntry]]) -> None:
+        self._entries.clear()
+        self._users.clear()
+        self._ids.clear()
+        for topic, entry in rows:
+            self._entries.setdefault(topic, {})[entry.user.user_id] = entry
+        for topic in self._entries:
+            self._refresh(topic)
+        self.engine = engine
+
+    def entries(self, topic: TopicKey) -> dict[int, RosterEntry]:
+        return self._entries.get(topic, {})
+
+    def put(self, topic: TopicKey, entries: Iterable[RosterEntry]) -> None:
+        current = self._entries.setdefault(topic, {})
+        for entry in entries:
+            current[entry.user.user_id] = entry
+        self._refresh(topic)
+
+    def delete(self, topic: TopicKey, user_ids: Iterable[int]) -> None:
+        current = self._entries.get(topic, {})
+        for user_id in user_ids:
+            current.pop(user_id, None)
+        self._refresh(topic)
+
+    def users(self, topic: TopicKey) -> dict[int, UserRef]:
+        return self._users.get(topic, {})
+
+    def user_ids(self, topic: TopicKey) -> tuple[int, ...]:
+        return self._ids.get(topic, ())
+
+    def version(self, topic: TopicKey) -> int:
+        return self._versions.get(topic, 0)
+
+    def _refresh(self, topic: TopicKey) -> None:
+        active = sorted(
+            (entry.user for entry in self._entries.get(topic, {}).values() if entry.active),
+            key=lambda user: user.user_id,
+        )
+        self._users[topic] = {user.user_id: user for user in active}
+        self._ids[topic] = tuple(user.user_id for user in active)
+        self._clock += 1
+        self._versions[topic] = self._clock
+
+
+rosters = RosterCache()
+
+
+async def load_rosters() -> None:
+    engine = get_engine()
+    if rosters.engine is engine:
+        return
+    rows = await engine.fetchall(
+        "SELECT chat_id, report_thread_id, user_id, name, username, active, source FROM rosters"
+    )
+    rosters.load(
+        engine,
+        (
+            (
+                (row[0], row[1]),
+                RosterEntry(
+                    UserRef(user_id=row[2], name=row[3], username=row[4]), bool(row[5]), row[6]
+                ),
+            )
+            for row in rows
+        ),
+    )
+
+
+def _upsert(topic: TopicKey, entry: RosterEntry) -> Statement:
+    return (
+        """
+        INSERT INTO rosters (chat_id, report_thread_id, user_id, name, username, active, source)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (chat_id, report_thread_id, user_id) DO UPDATE SET
+            name = excluded.name,
+            username = excluded.username,
+            active = excluded.active,
+            source = excluded.source
+        """,
+        (
+            *topic,
+            entry.user.user_id,
+            entry.user.name,
+            entry.user.username,
+            int(entry.active),
+            entry.source,
+        ),
+    )
+
+
+@timed_storage
+async def seed_rosters(config: Config) -> int:
+    await load_rosters()
+    engine = get_engine()
+    changes = 0
+    for chat in config.chats:
+        topic = (chat.chat_id, chat.report_thread_id)
+        current = rosters.entries(topic)
+        seeded = {user.user_id: user for user in chat.required_users}
+        updated: list[RosterEntry] = []
+        for user in seeded.values():
+            entry = current.get(user.user_id)
+            if entry is None:
+                updated.append(RosterEntry(user, True, SETTINGS))
+            elif entry.source == SETTINGS and entry.user != user:
+                updated.append(RosterEntry(user, entry.active, SETTINGS))
+        dropped = [
+            user_id
+            for user_id, entry in current.items()
+            if entry.source == SETTINGS and user_id not in seeded
+        ]
+        if not updated and not dropped:
+            continue
+        statements = [_upsert(topic, entry) for entry in updated]
+        statements.extend(
+            (
+                "DELETE FROM rosters WHERE chat_id = ? AND report_thread_id = ? AND user_id = ?",
+                (*topic, user_id),
+            )
+            for user_id in dropped
+        )
+        await engine.write_many(statements)
+        rosters.put(topic, updated)
+        rosters.delete(topic, dropped)
+        changes += len(statements)
+    return changes
+
+
+@timed_storage
+async def add_to_roster(
+    chat_id: int, report_thread_id: int, users: list[UserRef]
+) -> list[UserRef]:
+    await load_rosters()
+    topic = (chat_id, report_thread_id)
+    current = rosters.entries(topic)
+    updated: list[RosterEntry] = []
+    for user in users:
+        entry = current.get(user.user_id)
+        if entry is not None and entry.active:
+            continue
+        if entry is None:
+            updated.append(RosterEntry(user, True, COMMAND))
+        else:
+            known = user if user.name or user.username else entry.user
+            updated.append(RosterEntry(known, True, entry.source))
+    if updated:
+        await get_engine().write_many([_upsert(topic, entry) for entry in updated])
+        rosters.put(topic, updated)
+    return [entry.user for entry in updated]
+
+
+@timed_storage
+async def remove_from_roster(
+    chat_id: int, report_thread_id: int, user_ids: list[int]
+) -> list[UserRef]:
+    await load_rosters()
+    topic = (chat_id, report_thread_id)
+    current = rosters.entries(topic)
+    updated = [
+        RosterEntry(current[user_id].user, False, current[user_id].source)
+        for user_id in dict.fromkeys(user_ids)
+        if user_id in current and current[user_id].active
+    ]
+    if updated:
+        await get_engine().write_many(
+            [
+                (
+                    "UPDATE rosters SET active = 0 "
+                    "WHERE chat_id = ? AND report_thread_id = ? AND user_id = ?",
+                    (*topic, entry.user.user_id),
+                )
+                for entry in updated
+            ]
+        )
+        rosters.put(topic, updated)
+    return [entry.user for entry in updated]
+
+
+def get_roster(chat_id: int, report_thread_id: int) -> list[UserRef]:
+    return list(rosters.users((chat_id, report_thread_id)).values())
+
+
+def roster_version(chat_id: int, report_thread_id: int) -> int:
+    return rosters.version((chat_id, report_thread_id))
+
+
+@timed_storage
+async def get_missing_many(
+    report_date: date, keys: list[MissingKey]
+) -> dict[MissingKey, list[UserRef]]:
+    await load_rosters()
+    result: dict[MissingKey, list[UserRef]] = {}
+    if state.is_loaded(report_date):
+        for deadline_key, chat_id, thread_id in keys:
+            topic = (chat_id, thread_id)
+            users = rosters.users(topic)
+            missing = state.missing(
+                report_date, deadline_key, chat_id, thread_id, rosters.user_ids(topic)
+            ) or []
+            result[(deadline_key, chat_id, thread_id)] = [users[user_id] for user_id in missing]
+        return result
+    if not keys:
+        return result
+    for key in keys:
+        result[key] = []
+    placeholders = ", ".join("(?, ?, ?)" for _ in keys)
+    params: list[object] = [value for key in keys for value in key]
+    params.append(report_date.isoformat())
+    rows = await get_engine().fetchall(
+        f"""
+        WITH wanted(deadline_key, chat_id, report_thread_id) AS (VALUES {placeholders})
+        SELECT w.deadline_key, w.chat_id, w.report_thread_id, r.user_id, r.name, r.username
+        FROM wanted AS w
+        JOIN rosters AS r
+            ON r.chat_id = w.chat_id AND r.report_thread_id = w.report_thread_id
+        WHERE r.active = 1
+            AND NOT EXISTS (
+                SELECT 1
+                FROM reports AS p
+                WHERE p.report_date = ?
+                    AND p.user_id = r.user_id
+                    AND p.deadline_key = w.deadline_key
+                    AND p.chat_id = w.chat_id
+                    AND p.report_thread_id = w.report_thread_id
+            )
+        ORDER BY r.user_id
+        """,
+        params,
+    )
+    for row in rows:
+        cached = rosters.users((row[1], row[2])).get(row[3])
+        result[(row[0], row[1], row[2])].append(
+            cached or UserRef(user_id=row[3], name=row[4], username=row[5])
+        )
+    return result
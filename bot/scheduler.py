@@ -1,65 +1,271 @@
 from __future__ import annotations
 
-from aiogram import Bot
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from html import escape
+from typing import Any, Awaitable, Callable
+
 from aiogram.utils.markdown import hbold
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from bot.config import ChatConfig, Config, UserRef, format_user_list
-from bot.storage import get_reporters
-from bot.time_utils import today_in_timezone
+from bot.config import ChatConfig, Config, Deadline, LiveConfig, UserRef
+from bot.render import format_mentions, format_reporters, format_user_list, split_message
+from bot.rollups import finalize_pending, prune_reports
+from bot.rosters import get_missing_many
+from bot.sender import Sender
+from bot.storage import (
+    ReportUser,
+    Statement,
+    flush,
+    get_reporters_many,
+    rollover,
+    summary_log_statement,
+)
+from bot.time_utils import get_zone, today_in_timezone
 
+WEEKDAYS = "mon-fri"
+WEEKEND = "sat,sun"
+SUMMARY = "summary"
+REMINDER = "reminder"
+SUMMARY_PREFIX = "summary_"
+REMINDER_PREFIX = "reminder_"
+ROLLOVER_PREFIX = "state_rollover_"
+MANAGED_PREFIXES = (SUMMARY_PREFIX, REMINDER_PREFIX, ROLLOVER_PREFIX)
+TENANT_SEPARATOR = "@"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Slot:
+    timezone: str
+    day_of_week: str
+    at: time
+    kind: str = SUMMARY
+
+    @property
+    def job_id(self) -> str:
+        prefix = REMINDER_PREFIX if self.kind == REMINDER else SUMMARY_PREFIX
+        return f"{prefix}{self.timezone}_{self.day_of_week}_{self.at:%H%M}"
+
+
+SlotEntry = tuple[str, ChatConfig]
+
+
+def build_slots(config: Config) -> dict[Slot, list[SlotEntry]]:
+    slots: dict[Slot, list[SlotEntry]] = {}
+    for deadline in config.deadlines:
+        for chat in config.chats:
+            timezone = config.chat_timezone(chat)
+            for day_of_week, weekend in ((WEEKDAYS, False), (WEEKEND, True)):
+                at = chat.deadline_time(deadline, weekend)
+                slots.setdefault(Slot(timezone, day_of_week, at), []).append((deadline.key, chat))
+                for minutes in deadline.reminders:
+                    remind_at = _minutes_before(at, minutes)
+                    if remind_at is None:
+                        logger.warning(
+                            "Skipping reminder %s min before %s at %s in chat %s: "
+                            "it falls on the previous day",
+                            minutes,
+                            deadline.key,
+                            at.strftime("%H:%M"),
+                            chat.chat_id,
+                        )
+                        continue
+                    slot = Slot(timezone, day_of_week, remind_at, REMINDER)
+                    slots.setdefault(slot, []).append((deadline.key, chat))
+    return slots
+
+
+def _minutes_before(at: time, minutes: int) -> time | None:
+    total = at.hour * 60 + at.minute - minutes
+    if total < 0:
+        return None
+    return time(hour=total // 60, minute=total % 60)
 
-async def send_deadline_summary(
-    bot: Bot, config: Config, deadline_key: str, chat: ChatConfig
-) -> None:
-    today = today_in_timezone(config.timezone)
-    required_by_id = {user.user_id: user for user in chat.required_users}
-    reporters = await get_reporters(
-        today,
-        deadline_key,
-        chat.chat_id,
-        chat.report_thread_id,
-    )
-    missing_ids = set(required_by_id) - set(reporters)
-    missing_list = [required_by_id[user_id] for user_id in sorted(missing_ids)]
 
-    deadline = next(d for d in config.deadlines if d.key == deadline_key)
+def _minutes_between(start: time, end: time) -> int:
+    return (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
 
+
+async def send_deadline_summary(
+    sender: Sender,
+    deadline: Deadline,
+    chat: ChatConfig,
+    reporters: dict[int, ReportUser],
+    missing: list[UserRef],
+    late_day: date | None = None,
+    statements: list[Statement] | None = None,
+) -> None:
+    late = f" ({late_day:%d.%m}, с опозданием)" if late_day is not None else ""
     text = (
-        f"{hbold('Дедлайн пройден')}: {deadline.title}\n\n"
+        f"{hbold('Дедлайн пройден')}: {escape(deadline.title)}{late}\n\n"
         f"{hbold('Отчитались')}:\n"
-        f"{format_user_list([UserRef(user_id=r.user_id, username=r.username, name=r.full_name) for r in reporters.values()], marker='✅')}\n\n"
-        f"{hbold('Не отчитались')}:\n{format_user_list(missing_list, marker='❌')}"
+        f"{format_reporters(reporters.values(), marker='✅')}\n\n"
+        f"{hbold('Не отчитались')}:\n{format_user_list(missing, marker='❌')}"
     )
-    await bot.send_message(
-        chat_id=chat.chat_id,
-        text=text,
+    await sender.send_many(
+        chat.chat_id,
+        split_message(text),
         message_thread_id=chat.report_thread_id,
+        durable=True,
+        statements=statements,
     )
 
 
-def setup_scheduler(bot: Bot, config: Config) -> AsyncIOScheduler:
-    scheduler = AsyncIOScheduler(timezone=config.timezone)
-    for deadline in config.deadlines:
-        for chat in config.chats:
-            scheduler.add_job(
-                send_deadline_summary,
-                trigger="cron",
-                day_of_week="mon-fri",
-                hour=deadline.weekday_time.hour,
-                minute=deadline.weekday_time.minute,
-                args=[bot, config, deadline.key, chat],
-                id=f"{deadline.key}_weekday_{chat.chat_id}_{chat.report_thread_id}",
-                replace_existing=True,
+async def send_slot_summaries(
+    sender: Sender, config: Config, slot: Slot, entries: list[SlotEntry]
+) -> None:
+    await send_summaries(sender, config, today_in_timezone(slot.timezone), entries)
+
+
+async def send_summaries(
+    sender: Sender, config: Config, day: date, entries: list[SlotEntry], late: bool = False
+) -> None:
+    deadlines = {deadline.key: deadline for deadline in config.deadlines}
+    keys = [(key, chat.chat_id, chat.report_thread_id) for key, chat in entries]
+    await flush()
+    reporters = await get_reporters_many(day, keys)
+    missing = await get_missing_many(day, keys)
+    sent_at = datetime.now().timestamp()
+    await asyncio.gather(
+        *(
+            send_deadline_summary(
+                sender,
+                deadlines[key[0]],
+                chat,
+                reporters[key],
+                missing[key],
+                day if late else None,
+                [summary_log_statement(day, *key, sent_at)],
             )
-            scheduler.add_job(
-                send_deadline_summary,
-                trigger="cron",
-                day_of_week="sat,sun",
-                hour=deadline.weekend_time.hour,
-                minute=deadline.weekend_time.minute,
-                args=[bot, config, deadline.key, chat],
-                id=f"{deadline.key}_weekend_{chat.chat_id}_{chat.report_thread_id}",
-                replace_existing=True,
+            for key, (_, chat) in zip(keys, entries)
+        )
+    )
+
+
+def format_reminder(deadline: Deadline, at: time, minutes: int, missing: list[UserRef]) -> str:
+    return (
+        f"⏰ {hbold(deadline.title)} в {at:%H:%M}, осталось {minutes} мин. "
+        f"Ждем отчет с {escape(deadline.tag)}:\n{format_mentions(missing)}"
+    )
+
+
+async def send_slot_reminders(
+    sender: Sender, config: Config, slot: Slot, entries: list[SlotEntry]
+) -> None:
+    today = today_in_timezone(slot.timezone)
+    deadlines = {deadline.key: deadline for deadline in config.deadlines}
+    keys = [(key, chat.chat_id, chat.report_thread_id) for key, chat in entries]
+    await flush()
+    missing = await get_missing_many(today, keys)
+    topics: dict[tuple[int, int], list[str]] = {}
+    for key, (_, chat) in zip(keys, entries):
+        if not missing[key]:
+            continue
+        deadline = deadlines[key[0]]
+        at = chat.deadline_time(deadline, slot.day_of_week == WEEKEND)
+        topics.setdefault((chat.chat_id, chat.report_thread_id), []).append(
+            format_reminder(deadline, at, _minutes_between(slot.at, at), missing[key])
+        )
+    await asyncio.gather(
+        *(
+            sender.send_many(
+                chat_id, split_message("\n\n".join(parts)), message_thread_id=thread_id
             )
-    return scheduler
+            for (chat_id, thread_id), parts in topics.items()
+        )
+    )
+
+
+async def rollover_day(config: Config) -> None:
+    await rollover({today_in_timezone(timezone) for timezone in config.timezones()})
+
+
+async def run_slot(sender: Sender, live: LiveConfig, slot: Slot) -> None:
+    config = live.current
+    entries = build_slots(config).get(slot)
+    if not entries:
+        return
+    if slot.kind == REMINDER:
+        await send_slot_reminders(sender, config, slot, entries)
+    else:
+        await send_slot_summaries(sender, config, slot, entries)
+
+
+async def run_rollover(live: LiveConfig) -> None:
+    config = live.current
+    await rollover_day(config)
+    await finalize_pending(config)
+    await prune_reports(config)
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    job_id: str
+    func: Callable[..., Awaitable[None]]
+    args: tuple[Any, ...]
+    timezone: str
+    hour: int
+    minute: int
+    day_of_week: str | None = None
+
+
+def tenant_job_id(job_id: str, tenant: str) -> str:
+    return f"{job_id}{TENANT_SEPARATOR}{tenant}" if tenant else job_id
+
+
+def job_tenant(job_id: str) -> str:
+    return job_id.partition(TENANT_SEPARATOR)[2]
+
+
+def plan_jobs(sender: Sender, live: LiveConfig) -> dict[str, JobSpec]:
+    config = live.current
+    jobs: dict[str, JobSpec] = {}
+    for timezone in config.timezones():
+        job_id = tenant_job_id(f"{ROLLOVER_PREFIX}{timezone}", config.tenant)
+        jobs[job_id] = JobSpec(job_id, run_rollover, (live,), timezone, 0, 0)
+    for slot in build_slots(config):
+        job_id = tenant_job_id(slot.job_id, config.tenant)
+        jobs[job_id] = JobSpec(
+            job_id,
+            run_slot,
+            (sender, live, slot),
+            slot.timezone,
+            slot.at.hour,
+            slot.at.minute,
+            slot.day_of_week,
+        )
+    return jobs
+
+
+def sync_jobs(
+    scheduler: AsyncIOScheduler, jobs: dict[str, JobSpec], tenant: str = ""
+) -> tuple[list[str], list[str]]:
+    existing = {
+        job.id
+        for job in scheduler.get_jobs()
+        if job.id.startswith(MANAGED_PREFIXES) and job_tenant(job.id) == tenant
+    }
+    removed = sorted(existing - set(jobs))
+    added = sorted(set(jobs) - existing)
+    for job_id in removed:
+        scheduler.remove_job(job_id)
+    for job_id in added:
+        spec = jobs[job_id]
+        trigger: dict[str, Any] = {"hour": spec.hour, "minute": spec.minute}
+        if spec.day_of_week is not None:
+            trigger["day_of_week"] = spec.day_of_week
+        scheduler.add_job(
+            spec.func,
+            trigger="cron",
+            timezone=get_zone(spec.timezone),
+            args=list(spec.args),
+            id=spec.job_id,
+            replace_existing=True,
+            **trigger,
+        )
+    return added, removed
+
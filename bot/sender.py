@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+
+from aiogram import Bot, types
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from bot.storage import (
+    OutboxMessage,
+    Statement,
+    add_outbox,
+    add_outbox_many,
+    delete_outbox,
+    load_outbox,
+)
+
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30.0
+CHAT_RATE = 20 / 60
+CHAT_BURST = 3.0
+MAX_BACKOFF = 60.0
+MAX_ATTEMPTS = 8
+MAX_IN_FLIGHT = 30
+STATS_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass
+class _Pending:
+    message: OutboxMessage
+    durable: bool
+    future: asyncio.Future[types.Message | None] | None
+    attempts: int = 0
+    document: types.InputFile | None = None
+
+
+@dataclass
+class _ChatQueue:
+    bucket: TokenBucket
+    items: deque[_Pending] = field(default_factory=deque)
+    blocked_until: float = 0.0
+    in_flight: bool = False
+
+
+@dataclass
+class SenderStats:
+    queue_depth: int = 0
+    in_flight: int = 0
+    sent: int = 0
+    failed: int = 0
+    retry_after: int = 0
+    retries: int = 0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.sent if self.sent else 0.0
+
+
+class Sender:
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        chat_burst: float = CHAT_BURST,
+        tenant: str = "",
+    ) -> None:
+        self.bot = bot
+        self.tenant = tenant
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.stats = SenderStats()
+        self._global = TokenBucket(global_rate, min(GLOBAL_BURST, global_rate))
+        self._chats: dict[int, _ChatQueue] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._deliveries: set[asyncio.Task[None]] = set()
+
+    async def start(self) -> None:
+        for message in await load_outbox(self.tenant):
+            self._enqueue(_Pending(message=message, durable=True, future=None))
+        if self.stats.queue_depth:
+            logger.info("Restored %s pending messages from outbox", self.stats.queue_depth)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    async def send(
+        self,
+        chat_id: int,
+        text: str,
+        message_thread_id: int | None = None,
+        durable: bool = False,
+    ) -> None:
+        await self._submit(chat_id, text, message_thread_id, durable, None)
+
+    async def send_many(
+        self,
+        chat_id: int,
+        texts: list[str],
+        message_thread_id: int | None = None,
+        durable: bool = False,
+        statements: list[Statement] | None = None,
+    ) -> None:
+        messages = [self._message(chat_id, text, message_thread_id) for text in texts]
+        if durable or statements:
+            await add_outbox_many(messages if durable else [], statements or [])
+        for message in messages:
+            self._enqueue(_Pending(message=message, durable=durable, future=None))
+
+    async def send_message(
+        self,
+        chat_id: int,
+        text: str,
+        message_thread_id: int | None = None,
+        durable: bool = False,
+    ) -> types.Message | None:
+        future: asyncio.Future[types.Message | None] = (
+            asyncio.get_running_loop().create_future()
+        )
+        await self._submit(chat_id, text, message_thread_id, durable, future)
+        return await future
+
+    async def send_document(
+        self,
+        chat_id: int,
+        document: types.InputFile,
+        message_thread_id: int | None = None,
+        caption: str = "",
+    ) -> types.Message | None:
+        future: asyncio.Future[types.Message | None] = (
+            asyncio.get_running_loop().create_future()
+        )
+        await self._submit(chat_id, caption, message_thread_id, False, future, document)
+        return await future
+
+    async def reply(self, message: types.Message, text: str) -> types.Message | None:
+        return await self.send_message(
+            message.chat.id,
+            text,
+            message.message_thread_id if message.is_topic_message else None,
+        )
+
+    async def _submit(
+        self,
+        chat_id: int,
+        text: str,
+        message_thread_id: int | None,
+        durable: bool,
+        future: asyncio.Future[types.Message | None] | None,
+        document: types.InputFile | None = None,
+    ) -> None:
+        message = self._message(chat_id, text, message_thread_id)
+        if durable:
+            await add_outbox(message)
+        self._enqueue(
+            _Pending(message=message, durable=durable, future=future, document=document)
+        )
+
+    def _message(self, chat_id: int, text: str, message_thread_id: int | None) -> OutboxMessage:
+        return OutboxMessage(
+            id=uuid.uuid4().hex,
+            chat_id=chat_id,
+            message_thread_id=message_thread_id,
+            text=text,
+            created_at=time.time(),
+            tenant=self.tenant,
+        )
+
+    def _enqueue(self, pending: _Pending) -> None:
+        chat_id = pending.message.chat_id
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = _ChatQueue(bucket=TokenBucket(self.chat_rate, self.chat_burst))
+            self._chats[chat_id] = queue
+        queue.items.append(pending)
+        self.stats.queue_depth += 1
+        self._wakeup.set()
+
+    def _next_ready(self, now: float) -> tuple[int | None, float | None]:
+        best_chat: int | None = None
+        best_at: float | None = None
+        for chat_id, queue in self._chats.items():
+            if queue.in_flight or not queue.items:
+                continue
+            ready_at = max(queue.blocked_until, queue.bucket.ready_at(now))
+            if best_at is None or ready_at < best_at:
+                best_chat, best_at = chat_id, ready_at
+        if best_at is None:
+            return None, None
+        return best_chat, max(best_at, self._global.ready_at(now))
+
+    def _log_stats(self) -> None:
+        logger.info(
+            "Sender: queue=%s in_flight=%s sent=%s failed=%s retry_after=%s "
+            "avg_latency=%.3fs max_latency=%.3fs",
+            self.stats.queue_depth,
+            self.stats.in_flight,
+            self.stats.sent,
+            self.stats.failed,
+            self.stats.retry_after,
+            self.stats.avg_latency,
+            self.stats.max_latency,
+        )
+
+    async def _run(self) -> None:
+        logged_at = time.monotonic()
+        logged_sent = self.stats.sent
+        while True:
+            now = time.monotonic()
+            if now - logged_at >= STATS_INTERVAL and self.stats.sent != logged_sent:
+                self._log_stats()
+                logged_at, logged_sent = now, self.stats.sent
+            chat_id, ready_at = self._next_ready(now)
+            saturated = self.stats.in_flight >= MAX_IN_FLIGHT
+            if chat_id is None or ready_at > now or saturated:
+                timeout = None if ready_at is None or saturated else max(ready_at - now, 0.001)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            queue = self._chats[chat_id]
+            queue.bucket.take(now)
+            self._global.take(now)
+            queue.in_flight = True
+            self.stats.in_flight += 1
+            task = asyncio.create_task(self._deliver(queue))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, queue: _ChatQueue) -> None:
+        pending = queue.items[0]
+        message = pending.message
+        started = time.monotonic()
+        try:
+            if pending.document is not None:
+                sent = await self.bot.send_document(
+                    chat_id=message.chat_id,
+                    document=pending.document,
+                    message_thread_id=message.message_thread_id,
+                    caption=message.text or None,
+                )
+            else:
+                sent = await self.bot.send_message(
+                    chat_id=message.chat_id,
+                    text=message.text,
+                    message_thread_id=message.message_thread_id,
+                )
+        except TelegramRetryAfter as exc:
+            self.stats.retry_after += 1
+            queue.blocked_until = time.monotonic() + exc.retry_after
+            logger.warning(
+                "Flood limit for chat %s, retrying in %ss", message.chat_id, exc.retry_after
+            )
+        except (TelegramNetworkError, TelegramServerError) as exc:
+            await self._backoff(queue, pending, exc)
+        except TelegramAPIError as exc:
+            logger.error("Send to chat %s rejected: %s", message.chat_id, exc)
+            await self._fail(queue, pending, exc)
+        except Exception as exc:
+            logger.exception("Unexpected error while sending to chat %s", message.chat_id)
+            await self._backoff(queue, pending, exc)
+        else:
+            latency = time.time() - message.created_at
+            self.stats.sent += 1
+            self.stats.last_latency = latency
+            self.stats.max_latency = max(self.stats.max_latency, latency)
+            self.stats.total_latency += latency
+            logger.debug(
+                "Sent to chat %s in %.3fs (queued %.3fs)",
+                message.chat_id,
+                time.monotonic() - started,
+                latency,
+            )
+            await self._finish(queue, pending)
+            if pending.future is not None and not pending.future.done():
+                pending.future.set_result(sent)
+        finally:
+            queue.in_flight = False
+            self.stats.in_flight -= 1
+            self._wakeup.set()
+
+    async def _backoff(self, queue: _ChatQueue, pending: _Pending, exc: Exception) -> None:
+        pending.attempts += 1
+        if pending.attempts >= MAX_ATTEMPTS:
+            logger.error(
+                "Send to chat %s failed %s times, giving up: %s",
+                pending.message.chat_id,
+                pending.attempts,
+                exc,
+            )
+            await self._fail(queue, pending, exc)
+            return
+        self.stats.retries += 1
+        backoff = min(MAX_BACKOFF, 2 ** pending.attempts)
+        queue.blocked_until = time.monotonic() + backoff
+        logger.warning(
+            "Send to chat %s failed (%s), retrying in %ss",
+            pending.message.chat_id,
+            exc,
+            backoff,
+        )
+
+    async def _fail(self, queue: _ChatQueue, pending: _Pending, exc: Exception) -> None:
+        self.stats.failed += 1
+        await self._finish(queue, pending)
+        if pending.future is not None and not pending.future.done():
+            pending.future.set_exception(exc)
+
+    async def _finish(self, queue: _ChatQueue, pending: _Pending) -> None:
+        queue.items.popleft()
+        self.stats.queue_depth -= 1
+        if pending.durable:
+            await delete_outbox(pending.message.id)
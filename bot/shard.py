@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import secrets
+import struct
+from dataclasses import dataclass, field, replace
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from aiohttp import web
+
+from bot.app import create_bot, start_runtime, stop_runtime
+from bot.config import Config, load_config, shard_of
+from bot.filtering import PASSED, filter_raw_update
+from bot.handlers import router
+from bot.metrics import UPDATES, start_metrics_server
+from bot.reload import WATCH_INTERVAL
+
+FRAME_HEADER = struct.Struct(">I")
+CHAT_KEYS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+POLL_LIMIT = 100
+POLL_TIMEOUT = 30
+RECONNECT_DELAY = 1.0
+MONITOR_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+def update_chat_id(update: dict[str, Any]) -> int | None:
+    for key in CHAT_KEYS:
+        event = update.get(key)
+        if event and "chat" in event:
+            return int(event["chat"]["id"])
+    callback = update.get("callback_query")
+    if callback and callback.get("message"):
+        return int(callback["message"]["chat"]["id"])
+    return None
+
+
+def update_shard(update: dict[str, Any], shards: int) -> int:
+    chat_id = update_chat_id(update)
+    return 0 if chat_id is None else shard_of(chat_id, shards)
+
+
+async def write_frame(writer: asyncio.StreamWriter, payload: dict[str, Any]) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    writer.write(FRAME_HEADER.pack(len(body)) + body)
+    await writer.drain()
+
+
+async def read_frame(reader: asyncio.StreamReader) -> dict[str, Any]:
+    header = await reader.readexactly(FRAME_HEADER.size)
+    (size,) = FRAME_HEADER.unpack(header)
+    return json.loads(await reader.readexactly(size))
+
+
+def _load_shard_config(shard: int) -> Config:
+    return load_config().for_shard(shard)
+
+
+async def run_worker(shard: int) -> None:
+    config = _load_shard_config(shard)
+    config.tag_index
+    runtime = await start_runtime(config, lambda: _load_shard_config(shard))
+    tasks: set[asyncio.Task[Any]] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                update = await read_frame(reader)
+                task = asyncio.create_task(runtime.dp.feed_raw_update(runtime.bot, update))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", config.shard_port + shard)
+    logger.info(
+        "Shard %s/%s serving %s topics on port %s",
+        shard,
+        config.shards,
+        len(config.chats),
+        config.shard_port + shard,
+    )
+    try:
+        await runtime.dp.emit_startup(bot=runtime.bot, **runtime.dp.workflow_data)
+        await server.serve_forever()
+    finally:
+        server.close()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await runtime.dp.emit_shutdown(bot=runtime.bot, **runtime.dp.workflow_data)
+        await stop_runtime(runtime)
+        await runtime.bot.session.close()
+
+
+def worker_process(shard: int) -> None:
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run_worker(shard))
+    except KeyboardInterrupt:
+        pass
+
+
+@dataclass
+class ShardLink:
+    shard: int
+    port: int
+    queue: asyncio.Queue[dict[str, Any]] = field(default_factory=asyncio.Queue)
+    process: multiprocessing.process.BaseProcess | None = None
+    forwarded: int = 0
+
+    async def pump(self) -> None:
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            update: dict[str, Any] | None = None
+            try:
+                while True:
+                    update = await self.queue.get()
+                    await write_frame(writer, update)
+                    self.forwarded += 1
+                    update = None
+            except (ConnectionError, OSError):
+                logger.warning("Lost connection to shard %s, reconnecting", self.shard)
+                if update is not None:
+                    self.queue.put_nowait(update)
+            finally:
+                writer.close()
+
+
+class Front:
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self.links = [
+            ShardLink(shard=shard, port=config.shard_port + shard)
+            for shard in range(config.shards)
+        ]
+        self._context = multiprocessing.get_context("spawn")
+
+    def start_workers(self) -> None:
+        for link in self.links:
+            self._spawn(link)
+
+    def _spawn(self, link: ShardLink) -> None:
+        link.process = self._context.Process(
+            target=worker_process, args=(link.shard,), name=f"shard-{link.shard}"
+        )
+        link.process.start()
+
+    def stop_workers(self) -> None:
+        for link in self.links:
+            if link.process is not None and link.process.is_alive():
+                link.process.terminate()
+        for link in self.links:
+            if link.process is not None:
+                link.process.join(timeout=10)
+
+    async def watch_settings(self) -> None:
+        mtime = _mtime(self.config)
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            current = _mtime(self.config)
+            if current == mtime:
+                continue
+            mtime = current
+            try:
+                config = load_config()
+            except Exception:
+                logger.exception("Settings reload failed, front keeps the previous filter")
+                continue
+            if config.shards != self.config.shards:
+                logger.warning("SHARDS changes require a restart")
+            self.config = replace(config, shards=self.config.shards)
+
+    async def monitor(self) -> None:
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            for link in self.links:
+                if link.process is not None and not link.process.is_alive():
+                    logger.error("Shard %s exited, restarting", link.shard)
+                    self._spawn(link)
+
+    def forward(self, update: dict[str, Any]) -> None:
+        result = filter_raw_update(self.config, update)
+        UPDATES.inc(result)
+        if result != PASSED:
+            return
+        self.links[update_shard(update, self.config.shards)].queue.put_nowait(update)
+
+    async def poll(self, bot: Bot) -> None:
+        allowed_updates = router.resolve_used_update_types()
+        await bot.delete_webhook(drop_pending_updates=False)
+        offset: int | None = None
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    limit=POLL_LIMIT,
+                    timeout=POLL_TIMEOUT,
+                    allowed_updates=allowed_updates,
+                )
+            except (TelegramNetworkError, TelegramServerError):
+                logger.exception("getUpdates failed, retrying")
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            for update in updates:
+                self.forward(
+                    update.model_dump(mode="json", exclude_none=True, by_alias=True)
+                )
+                offset = update.update_id + 1
+
+    def webhook_app(self) -> web.Application:
+        webhook = self.config.webhook
+        assert webhook is not None
+
+        async def handle(request: web.Request) -> web.Response:
+            secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not secrets.compare_digest(secret, webhook.secret):
+                return web.Response(body="Unauthorized", status=401)
+            self.forward(await request.json())
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post(webhook.path, handle)
+        return app
+
+
+def _mtime(config: Config) -> float | None:
+    try:
+        return config.settings_path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+async def run_front(config: Config) -> None:
+    front = Front(config)
+    front.start_workers()
+    bot = create_bot(config)
+    tasks = [asyncio.create_task(link.pump()) for link in front.links]
+    tasks.append(asyncio.create_task(front.monitor()))
+    tasks.append(asyncio.create_task(front.watch_settings()))
+    runner: web.AppRunner | None = None
+    metrics: web.AppRunner | None = None
+    try:
+        if config.metrics is not None:
+            metrics = await start_metrics_server(
+                config.metrics.host, config.metrics.port + config.shards
+            )
+        if config.webhook is not None:
+            webhook = config.webhook
+            if webhook.url:
+                await bot.set_webhook(
+                    url=webhook.url.rstrip("/") + webhook.path,
+                    secret_token=webhook.secret,
+                    allowed_updates=router.resolve_used_update_types(),
+                )
+            runner = web.AppRunner(front.webhook_app())
+            await runner.setup()
+            await web.TCPSite(runner, webhook.host, webhook.port).start()
+            await asyncio.Event().wait()
+        else:
+            await front.poll(bot)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        if metrics is not None:
+            await metrics.cleanup()
+        await bot.session.close()
+        front.stop_workers()
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+if TYPE_CHECKING:
+    from bot.storage import ReportUser
+
+TopicKey = tuple[int, int]
+ReportKey = tuple[int, int, str]
+
+
+class _Roster:
+    def __init__(self, user_ids: Sequence[int]) -> None:
+        self.user_ids = tuple(user_ids)
+        self.bits = {user_id: 1 << position for position, user_id in enumerate(self.user_ids)}
+        self.full_mask = (1 << len(self.user_ids)) - 1
+
+    def mask_of(self, user_ids: Iterable[int]) -> int:
+        mask = 0
+        for user_id in user_ids:
+            mask |= self.bits.get(user_id, 0)
+        return mask
+
+
+class ReportState:
+    def __init__(self) -> None:
+        self._days: dict[date, dict[ReportKey, dict[int, ReportUser]]] = {}
+        self._masks: dict[date, dict[ReportKey, int]] = {}
+        self._rosters: dict[TopicKey, _Roster] = {}
+        self._loading: set[date] = set()
+        self._versions: dict[tuple[date, int, int], int] = {}
+        self._clock = 0
+
+    def is_loaded(self, day: date) -> bool:
+        return day in self._days and day not in self._loading
+
+    def begin_load(self, day: date) -> None:
+        self._days.setdefault(day, {})
+        self._masks.setdefault(day, {})
+        self._loading.add(day)
+
+    def loaded_days(self) -> list[date]:
+        return sorted(self._days)
+
+    def load(
+        self, day: date, rows: Iterable[tuple[str, int, int, ReportUser]]
+    ) -> None:
+        reports = self._days.setdefault(day, {})
+        for deadline_key, chat_id, thread_id, user in rows:
+            users = reports.setdefault((chat_id, thread_id, deadline_key), {})
+            users.setdefault(user.user_id, user)
+        self._masks[day] = {
+            key: self._mask_for(key, users) for key, users in reports.items()
+        }
+        self._loading.discard(day)
+
+    def add(
+        self,
+        day: date,
+        deadline_key: str,
+        chat_id: int,
+        thread_id: int,
+        user: ReportUser,
+    ) -> None:
+        self.touch(day, chat_id, thread_id)
+        reports = self._days.get(day)
+        if reports is None:
+            return
+        key = (chat_id, thread_id, deadline_key)
+        reports.setdefault(key, {})[user.user_id] = user
+        roster = self._rosters.get((chat_id, thread_id))
+        if roster is not None:
+            masks = self._masks[day]
+            masks[key] = masks.get(key, 0) | roster.bits.get(user.user_id, 0)
+
+    def remove(
+        self, day: date, deadline_key: str, chat_id: int, thread_id: int, user_id: int
+    ) -> None:
+        self.touch(day, chat_id, thread_id)
+        reports = self._days.get(day)
+        if reports is None:
+            return
+        key = (chat_id, thread_id, deadline_key)
+        reports.get(key, {}).pop(user_id, None)
+        roster = self._rosters.get((chat_id, thread_id))
+        masks = self._masks[day]
+        if roster is not None and key in masks:
+            masks[key] &= ~roster.bits.get(user_id, 0)
+
+    def touch(self, day: date, chat_id: int, thread_id: int) -> None:
+        self._clock += 1
+        self._versions[(day, chat_id, thread_id)] = self._clock
+
+    def version(self, day: date, chat_id: int, thread_id: int) -> int:
+        return self._versions.get((day, chat_id, thread_id), 0)
+
+    def reporters(
+        self, day: date, deadline_key: str, chat_id: int, thread_id: int
+    ) -> dict[int, ReportUser] | None:
+        if not self.is_loaded(day):
+            return None
+        reports = self._days[day]
+        return dict(reports.get((chat_id, thread_id, deadline_key), {}))
+
+    def missing(
+        self,
+        day: date,
+        deadline_key: str,
+        chat_id: int,
+        thread_id: int,
+        required_ids: Sequence[int],
+    ) -> list[int] | None:
+        if not self.is_loaded(day):
+            return None
+        roster = self._roster(chat_id, thread_id, required_ids)
+        mask = self._masks[day].get((chat_id, thread_id, deadline_key), 0)
+        missing_mask = roster.full_mask & ~mask
+        return sorted(
+            user_id for user_id in roster.user_ids if roster.bits[user_id] & missing_mask
+        )
+
+    def drop_before(self, day: date) -> None:
+        for old_day in [loaded for loaded in self._days if loaded < day]:
+            del self._days[old_day]
+            del self._masks[old_day]
+            self._loading.discard(old_day)
+        for key in [key for key in self._versions if key[0] < day]:
+            del self._versions[key]
+
+    def clear(self) -> None:
+        self._days.clear()
+        self._masks.clear()
+        self._rosters.clear()
+        self._loading.clear()
+        self._versions.clear()
+
+    def _roster(self, chat_id: int, thread_id: int, required_ids: Sequence[int]) -> _Roster:
+        topic = (chat_id, thread_id)
+        roster = self._rosters.get(topic)
+        if roster is not None and (
+            roster.user_ids is required_ids or roster.user_ids == tuple(required_ids)
+        ):
+            return roster
+        roster = _Roster(required_ids)
+        self._rosters[topic] = roster
+        for day, reports in self._days.items():
+            masks = self._masks[day]
+            for key, users in reports.items():
+                if key[:2] == topic:
+                    masks[key] = roster.mask_of(users)
+        return roster
+
+    def _mask_for(self, key: ReportKey, users: dict[int, ReportUser]) -> int:
+        roster = self._rosters.get(key[:2])
+        if roster is None:
+            return 0
+        return roster.mask_of(users)
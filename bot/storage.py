@@ -1,85 +1,249 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import date
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
 from pathlib import Path
+from typing import Any, Iterable
 
 import aiosqlite
 
+from bot.metrics import STORAGE_BATCH_SIZE, STORAGE_COMMIT_SECONDS, timed_storage
+from bot.migrations import migrate
+from bot.state import ReportState
+
 DB_PATH = Path("data.db")
+BATCH_SIZE = 500
+BATCH_WINDOW = 0.05
+REPORT_MESSAGE_SQL = """
+INSERT INTO report_messages (
+    chat_id, message_id, deadline_key, report_date, user_id, report_thread_id
+) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT DO NOTHING
+"""
+IMPORT_REPORT_SQL = """
+INSERT INTO reports (
+    report_date, user_id, deadline_key, chat_id, report_thread_id, reported_at, message_id
+) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT DO NOTHING
+"""
 
+logger = logging.getLogger(__name__)
 
-async def init_db() -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS reports (
-                report_date TEXT NOT NULL,
-                user_id INTEGER NOT NULL,
-                deadline_key TEXT NOT NULL,
-                chat_id INTEGER NOT NULL,
-                report_thread_id INTEGER NOT NULL,
-                username TEXT,
-                full_name TEXT,
-                PRIMARY KEY (report_date, user_id, deadline_key, chat_id, report_thread_id)
-            )
-            """
-        )
-        await _ensure_schema(db)
-        await db.commit()
-
-
-async def _ensure_schema(db: aiosqlite.Connection) -> None:
-    cursor = await db.execute("PRAGMA table_info(reports)")
-    rows = await cursor.fetchall()
-    existing = {row[1] for row in rows}
-    pk_cols = [row[1] for row in rows if row[5]]
-    expected_pk = {"report_date", "user_id", "deadline_key", "chat_id", "report_thread_id"}
-    expected_cols = {
-        "report_date",
-        "user_id",
-        "deadline_key",
-        "chat_id",
-        "report_thread_id",
-        "username",
-        "full_name",
-    }
-    if expected_pk.issubset(set(pk_cols)) and expected_cols.issubset(existing):
+
+Statement = tuple[str, tuple[Any, ...]]
+
+
+@dataclass
+class _Write:
+    statements: list[Statement]
+    future: asyncio.Future[None] = field(repr=False)
+
+    @property
+    def group_key(self) -> object:
+        if len(self.statements) == 1:
+            return self.statements[0][0]
+        return id(self)
+
+
+@dataclass
+class StorageStats:
+    reads: int = 0
+    writes: int = 0
+    commits: int = 0
+
+
+class StorageEngine:
+    def __init__(
+        self,
+        path: Path,
+        batch_size: int = BATCH_SIZE,
+        batch_window: float = BATCH_WINDOW,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._db: aiosqlite.Connection | None = None
+        self._queue: asyncio.Queue[_Write] = asyncio.Queue()
+        self._task: asyncio.Task[None] | None = None
+        self._lock = asyncio.Lock()
+        self.stats = StorageStats()
+
+    @property
+    def db(self) -> aiosqlite.Connection:
+        if self._db is None:
+            raise RuntimeError("Storage engine is not started")
+        return self._db
+
+    async def start(self) -> None:
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            await self.flush()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def fetchall(
+        self, sql: str, params: Iterable[Any] = ()
+    ) -> list[tuple[Any, ...]]:
+        self.stats.reads += 1
+        return list(await self.db.execute_fetchall(sql, params))
+
+    def write(self, sql: str, params: tuple[Any, ...]) -> asyncio.Future[None]:
+        return self.write_many([(sql, params)])
+
+    def write_many(self, statements: list[Statement]) -> asyncio.Future[None]:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Write(statements, future))
+        return future
+
+    async def flush(self) -> None:
+        await self.write_many([])
+
+    async def write_counted(self, statements: list[Statement], counted: str) -> int:
+        await self.flush()
+        async with self._lock:
+            try:
+                changes = await self._execute(statements)
+                await self.db.commit()
+            except Exception:
+                await self.db.rollback()
+                raise
+            self.stats.writes += len(statements)
+            self.stats.commits += 1
+        return changes.get(counted, 0)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            async with self._lock:
+                await self._commit(batch)
+
+    async def _commit(self, batch: list[_Write]) -> None:
+        writes = [item for item in batch if item.statements]
+        started = time.perf_counter()
+        try:
+            for _, run in itertools.groupby(writes, key=lambda item: item.group_key):
+                items = list(run)
+                if len(items[0].statements) == 1:
+                    sql = items[0].statements[0][0]
+                    await self.db.executemany(sql, [item.statements[0][1] for item in items])
+                else:
+                    await self._execute(items[0].statements)
+            await self.db.commit()
+            self.stats.writes += sum(len(item.statements) for item in writes)
+            self.stats.commits += 1
+            if writes:
+                STORAGE_COMMIT_SECONDS.observe(time.perf_counter() - started)
+                STORAGE_BATCH_SIZE.observe(sum(len(item.statements) for item in writes))
+        except Exception:
+            logger.exception("Batch of %s writes failed, retrying one by one", len(writes))
+            await self.db.rollback()
+            await self._commit_each(writes)
+        else:
+            for item in writes:
+                _resolve(item.future)
+        for item in batch:
+            if not item.statements:
+                _resolve(item.future)
+
+    async def _execute(self, statements: list[Statement]) -> dict[str, int]:
+        changes: dict[str, int] = {}
+        for sql, run in itertools.groupby(statements, key=lambda statement: statement[0]):
+            rows = [params for _, params in run]
+            if len(rows) == 1:
+                cursor = await self.db.execute(sql, rows[0])
+            else:
+                cursor = await self.db.executemany(sql, rows)
+            changes[sql] = changes.get(sql, 0) + cursor.rowcount
+        return changes
+
+    async def _commit_each(self, writes: list[_Write]) -> None:
+        for item in writes:
+            try:
+                await self._execute(item.statements)
+                await self.db.commit()
+                self.stats.writes += len(item.statements)
+                self.stats.commits += 1
+            except Exception as exc:
+                await self.db.rollback()
+                if not item.future.done():
+                    item.future.set_exception(exc)
+            else:
+                _resolve(item.future)
+
+
+def _resolve(future: asyncio.Future[None]) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+_engine: StorageEngine | None = None
+state = ReportState()
+_users: dict[int, ReportUser] = {}
+
+
+def get_engine() -> StorageEngine:
+    if _engine is None:
+        raise RuntimeError("init_db() must be called first")
+    return _engine
+
+
+async def init_db(path: Path = DB_PATH) -> StorageEngine:
+    global _engine
+    if _engine is not None:
+        return _engine
+    engine = StorageEngine(path)
+    await engine.start()
+    db = engine.db
+    await migrate(db)
+    cursor = await db.execute("SELECT user_id, username, full_name FROM users")
+    for row in await cursor.fetchall():
+        _users[row[0]] = ReportUser(user_id=row[0], username=row[1], full_name=row[2])
+    _engine = engine
+    return engine
+
+
+async def close_db() -> None:
+    global _engine
+    if _engine is None:
         return
-    await _migrate_reports(db, existing)
+    await _engine.close()
+    _engine = None
+    state.clear()
+    _users.clear()
 
 
-async def _migrate_reports(db: aiosqlite.Connection, existing: set[str]) -> None:
-    await db.execute(
-        """
-        CREATE TABLE IF NOT EXISTS reports_new (
-            report_date TEXT NOT NULL,
-            user_id INTEGER NOT NULL,
-            deadline_key TEXT NOT NULL,
-            chat_id INTEGER NOT NULL,
-            report_thread_id INTEGER NOT NULL,
-            username TEXT,
-            full_name TEXT,
-            PRIMARY KEY (report_date, user_id, deadline_key, chat_id, report_thread_id)
-        )
-        """
-    )
-    deadline_expr = "deadline_key" if "deadline_key" in existing else "''"
-    chat_expr = "chat_id" if "chat_id" in existing else "0"
-    thread_expr = "report_thread_id" if "report_thread_id" in existing else "0"
-    username_expr = "username" if "username" in existing else "NULL"
-    full_name_expr = "full_name" if "full_name" in existing else "NULL"
-    await db.execute(
-        f"""
-        INSERT OR REPLACE INTO reports_new (
-            report_date, user_id, deadline_key, chat_id, report_thread_id, username, full_name
-        )
-        SELECT report_date, user_id, {deadline_expr}, {chat_expr}, {thread_expr}, {username_expr}, {full_name_expr}
-        FROM reports
-        """
-    )
-    await db.execute("DROP TABLE reports")
-    await db.execute("ALTER TABLE reports_new RENAME TO reports")
+async def flush() -> None:
+    await get_engine().flush()
+
 
 @dataclass(frozen=True)
 class ReportUser:
@@ -88,6 +252,7 @@ class ReportUser:
     full_name: str | None
 
 
+@timed_storage
 async def add_report(
     report_date: date,
     user_id: int,
@@ -96,13 +261,33 @@ async def add_report(
     report_thread_id: int,
     username: str | None,
     full_name: str | None,
+    reported_at: float | None = None,
+    message_id: int | None = None,
 ) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
+    engine = get_engine()
+    user = ReportUser(user_id=user_id, username=username, full_name=full_name)
+    pending = []
+    if _users.get(user_id) != user:
+        _users[user_id] = user
+        pending.append(
+            engine.write(
+                """
+                INSERT INTO users (user_id, username, full_name) VALUES (?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = excluded.username, full_name = excluded.full_name
+                WHERE username IS NOT excluded.username OR full_name IS NOT excluded.full_name
+                """,
+                (user_id, username, full_name),
+            )
+        )
+    pending.append(
+        engine.write(
             """
-            INSERT OR REPLACE INTO reports (
-                report_date, user_id, deadline_key, chat_id, report_thread_id, username, full_name
+            INSERT INTO reports (
+                report_date, user_id, deadline_key, chat_id, report_thread_id, reported_at,
+                message_id
             ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
             """,
             (
                 report_date.isoformat(),
@@ -110,27 +295,371 @@ async def add_report(
                 deadline_key,
                 chat_id,
                 report_thread_id,
-                username,
-                full_name,
+                reported_at,
+                message_id,
             ),
         )
-        await db.commit()
+    )
+    if message_id is not None:
+        pending.append(
+            engine.write(
+                REPORT_MESSAGE_SQL,
+                (
+                    chat_id,
+                    message_id,
+                    deadline_key,
+                    report_date.isoformat(),
+                    user_id,
+                    report_thread_id,
+                ),
+            )
+        )
+    try:
+        await asyncio.gather(*pending)
+    except Exception:
+        if _users.get(user_id) is user:
+            del _users[user_id]
+        raise
+    state.add(report_date, deadline_key, chat_id, report_thread_id, user)
 
 
-async def get_reporters(
-    report_date: date, deadline_key: str, chat_id: int, report_thread_id: int
-) -> dict[int, ReportUser]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
+@timed_storage
+async def remove_message_reports(
+    chat_id: int, message_id: int, deadline_keys: Iterable[str]
+) -> int:
+    keys = list(deadline_keys)
+    if not keys:
+        return 0
+    engine = get_engine()
+    await engine.flush()
+    placeholders = ", ".join("?" for _ in keys)
+    rows = await engine.fetchall(
+        f"""
+        SELECT report_date, user_id, deadline_key, report_thread_id
+        FROM report_messages
+        WHERE chat_id = ? AND message_id = ? AND deadline_key IN ({placeholders})
+        """,
+        (chat_id, message_id, *keys),
+    )
+    if not rows:
+        return 0
+    statements: list[Statement] = [
+        (
             """
-            SELECT user_id, username, full_name
+            DELETE FROM report_messages
+            WHERE chat_id = ? AND message_id = ? AND deadline_key = ?
+            """,
+            (chat_id, message_id, row[2]),
+        )
+        for row in rows
+    ]
+    statements.extend(
+        (
+            """
+            DELETE FROM reports
+            WHERE report_date = ? AND user_id = ? AND deadline_key = ? AND chat_id = ?
+                AND report_thread_id = ?
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM report_messages AS m
+                    WHERE m.chat_id = reports.chat_id
+                        AND m.report_thread_id = reports.report_thread_id
+                        AND m.report_date = reports.report_date
+                        AND m.deadline_key = reports.deadline_key
+                        AND m.user_id = reports.user_id
+                )
+            """,
+            (row[0], row[1], row[2], chat_id, row[3]),
+        )
+        for row in rows
+    )
+    await engine.write_many(statements)
+    removed = 0
+    for row in rows:
+        remaining = await engine.fetchall(
+            """
+            SELECT 1
             FROM reports
-            WHERE report_date = ? AND deadline_key = ? AND chat_id = ? AND report_thread_id = ?
+            WHERE report_date = ? AND user_id = ? AND deadline_key = ? AND chat_id = ?
+                AND report_thread_id = ?
             """,
-            (report_date.isoformat(), deadline_key, chat_id, report_thread_id),
+            (row[0], row[1], row[2], chat_id, row[3]),
+        )
+        if not remaining:
+            state.remove(date.fromisoformat(row[0]), row[2], chat_id, row[3], row[1])
+            removed += 1
+    return removed
+
+
+def _report_user(user_id: int, username: str | None, full_name: str | None) -> ReportUser:
+    if username is None and full_name is None:
+        return _users.get(user_id) or ReportUser(user_id=user_id, username=None, full_name=None)
+    return ReportUser(user_id=user_id, username=username, full_name=full_name)
+
+
+def known_user(user_id: int) -> ReportUser | None:
+    return _users.get(user_id)
+
+
+def topic_version(report_date: date, chat_id: int, report_thread_id: int) -> int:
+    return state.version(report_date, chat_id, report_thread_id)
+
+
+@dataclass(frozen=True)
+class ReportRow:
+    report_date: date
+    user_id: int
+    deadline_key: str
+    chat_id: int
+    report_thread_id: int
+    reported_at: float | None
+    message_id: int | None = None
+
+
+@timed_storage
+async def import_reports(reports: list[ReportRow], users: list[ReportUser]) -> int:
+    statements: list[Statement] = [
+        (
+            """
+            INSERT INTO users (user_id, username, full_name) VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO NOTHING
+            """,
+            (user.user_id, user.username, user.full_name),
+        )
+        for user in users
+    ]
+    statements.extend(
+        (
+            IMPORT_REPORT_SQL,
+            (
+                report.report_date.isoformat(),
+                report.user_id,
+                report.deadline_key,
+                report.chat_id,
+                report.report_thread_id,
+                report.reported_at,
+                report.message_id,
+            ),
+        )
+        for report in reports
+    )
+    statements.extend(
+        (
+            REPORT_MESSAGE_SQL,
+            (
+                report.chat_id,
+                report.message_id,
+                report.deadline_key,
+                report.report_date.isoformat(),
+                report.user_id,
+                report.report_thread_id,
+            ),
+        )
+        for report in reports
+        if report.message_id is not None
+    )
+    inserted = await get_engine().write_counted(statements, IMPORT_REPORT_SQL)
+    known = {user.user_id: user for user in users}
+    for report in reports:
+        user = _users.get(report.user_id) or known.get(report.user_id)
+        state.add(
+            report.report_date,
+            report.deadline_key,
+            report.chat_id,
+            report.report_thread_id,
+            user or ReportUser(user_id=report.user_id, username=None, full_name=None),
+        )
+    return inserted
+
+
+@timed_storage
+async def warm_up(report_date: date) -> None:
+    if state.is_loaded(report_date):
+        return
+    state.begin_load(report_date)
+    await flush()
+    rows = await get_engine().fetchall(
+        """
+        SELECT r.deadline_key, r.chat_id, r.report_thread_id, r.user_id, u.username, u.full_name
+        FROM reports AS r
+        LEFT JOIN users AS u ON u.user_id = r.user_id
+        WHERE r.report_date = ?
+        """,
+        (report_date.isoformat(),),
+    )
+    state.load(
+        report_date,
+        ((row[0], row[1], row[2], _report_user(row[3], row[4], row[5])) for row in rows),
+    )
+
+
+async def rollover(days: Iterable[date]) -> None:
+    days = sorted(days)
+    state.drop_before(days[0] - timedelta(days=1))
+    for day in days:
+        await warm_up(day)
+
+
+@timed_storage
+async def get_reporters(
+    report_date: date, deadline_key: str, chat_id: int, report_thread_id: int
+) -> dict[int, ReportUser]:
+    cached = state.reporters(report_date, deadline_key, chat_id, report_thread_id)
+    if cached is not None:
+        return cached
+    rows = await get_engine().fetchall(
+        """
+        SELECT r.user_id, u.username, u.full_name
+        FROM reports AS r
+        LEFT JOIN users AS u ON u.user_id = r.user_id
+        WHERE r.report_date = ?
+            AND r.deadline_key = ?
+            AND r.chat_id = ?
+            AND r.report_thread_id = ?
+        """,
+        (report_date.isoformat(), deadline_key, chat_id, report_thread_id),
+    )
+    return {row[0]: _report_user(row[0], row[1], row[2]) for row in rows}
+
+
+@timed_storage
+async def get_reporters_many(
+    report_date: date, keys: list[tuple[str, int, int]]
+) -> dict[tuple[str, int, int], dict[int, ReportUser]]:
+    result: dict[tuple[str, int, int], dict[int, ReportUser]] = {}
+    if state.is_loaded(report_date):
+        for deadline_key, chat_id, thread_id in keys:
+            result[(deadline_key, chat_id, thread_id)] = state.reporters(
+                report_date, deadline_key, chat_id, thread_id
+            ) or {}
+        return result
+    if not keys:
+        return result
+    for key in keys:
+        result[key] = {}
+    placeholders = ", ".join("(?, ?, ?)" for _ in keys)
+    params: list[object] = [value for key in keys for value in key]
+    params.append(report_date.isoformat())
+    rows = await get_engine().fetchall(
+        f"""
+        WITH wanted(deadline_key, chat_id, report_thread_id) AS (VALUES {placeholders})
+        SELECT r.deadline_key, r.chat_id, r.report_thread_id, r.user_id, u.username, u.full_name
+        FROM reports AS r
+        JOIN wanted AS w
+            ON r.deadline_key = w.deadline_key
+            AND r.chat_id = w.chat_id
+            AND r.report_thread_id = w.report_thread_id
+        LEFT JOIN users AS u ON u.user_id = r.user_id
+        WHERE r.report_date = ?
+        """,
+        params,
+    )
+    for row in rows:
+        result[(row[0], row[1], row[2])][row[3]] = _report_user(row[3], row[4], row[5])
+    return result
+
+
+def summary_log_statement(
+    report_date: date, deadline_key: str, chat_id: int, thread_id: int, sent_at: float
+) -> Statement:
+    return (
+        """
+        INSERT OR IGNORE INTO summary_log (
+            chat_id, report_thread_id, report_date, deadline_key, sent_at
+        ) VALUES (?, ?, ?, ?, ?)
+        """,
+        (chat_id, thread_id, report_date.isoformat(), deadline_key, sent_at),
+    )
+
+
+@timed_storage
+async def last_summary_days() -> dict[tuple[int, int], date]:
+    await flush()
+    rows = await get_engine().fetchall(
+        """
+        SELECT chat_id, report_thread_id, MAX(report_date)
+        FROM summary_log
+        GROUP BY chat_id, report_thread_id
+        """
+    )
+    return {(row[0], row[1]): date.fromisoformat(row[2]) for row in rows}
+
+
+@timed_storage
+async def logged_summaries(since: date) -> set[tuple[date, str, int, int]]:
+    rows = await get_engine().fetchall(
+        """
+        SELECT report_date, deadline_key, chat_id, report_thread_id
+        FROM summary_log
+        WHERE report_date >= ?
+        """,
+        (since.isoformat(),),
+    )
+    return {(date.fromisoformat(row[0]), row[1], row[2], row[3]) for row in rows}
+
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    id: str
+    chat_id: int
+    message_thread_id: int | None
+    text: str
+    created_at: float
+    tenant: str = ""
+
+
+def _outbox_statement(message: OutboxMessage) -> Statement:
+    return (
+        """
+        INSERT OR REPLACE INTO outbox (id, chat_id, message_thread_id, text, created_at, tenant)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (
+            message.id,
+            message.chat_id,
+            message.message_thread_id,
+            message.text,
+            message.created_at,
+            message.tenant,
+        ),
+    )
+
+
+@timed_storage
+async def add_outbox(message: OutboxMessage) -> None:
+    await get_engine().write(*_outbox_statement(message))
+
+
+@timed_storage
+async def add_outbox_many(messages: list[OutboxMessage], statements: list[Statement]) -> None:
+    await get_engine().write_many([_outbox_statement(message) for message in messages] + statements)
+
+
+@timed_storage
+async def delete_outbox(message_id: str) -> None:
+    await get_engine().write("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+
+@timed_storage
+async def load_outbox(tenant: str = "") -> list[OutboxMessage]:
+    await flush()
+    rows = await get_engine().fetchall(
+        """
+        SELECT id, chat_id, message_thread_id, text, created_at
+        FROM outbox
+        WHERE tenant = ?
+        ORDER BY created_at
+        """,
+        (tenant,),
+    )
+    return [
+        OutboxMessage(
+            id=row[0],
+            chat_id=row[1],
+            message_thread_id=row[2],
+            text=row[3],
+            created_at=row[4],
+            tenant=tenant,
         )
-        rows = await cursor.fetchall()
-    return {
-        row[0]: ReportUser(user_id=row[0], username=row[1], full_name=row[2])
         for row in rows
-    }
+    ]
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+from aiogram.types import MessageEntity
+
+if TYPE_CHECKING:
+    from bot.config import ChatConfig, Deadline
+
+HASHTAG_RE = re.compile(r"#\w+")
+
+
+def normalize_tag(tag: str) -> str:
+    return unicodedata.normalize("NFKC", tag).casefold()
+
+
+def extract_hashtags(
+    text: str, entities: Sequence[MessageEntity] | None = None
+) -> list[str]:
+    if entities is not None:
+        return [
+            normalize_tag(entity.extract_from(text))
+            for entity in entities
+            if entity.type == "hashtag"
+        ]
+    return [tag.casefold() for tag in HASHTAG_RE.findall(unicodedata.normalize("NFKC", text))]
+
+
+def _add_tag(index: dict[str, list[Deadline]], tag: str, deadline: Deadline) -> None:
+    bucket = index.setdefault(normalize_tag(tag), [])
+    if deadline not in bucket:
+        bucket.append(deadline)
+
+
+class TagIndex:
+    def __init__(self, deadlines: Sequence[Deadline], chats: Iterable[ChatConfig]) -> None:
+        self._order = {deadline.key: position for position, deadline in enumerate(deadlines)}
+        self._common: dict[str, list[Deadline]] = {}
+        for deadline in deadlines:
+            for tag in (deadline.tag, *deadline.aliases):
+                _add_tag(self._common, tag, deadline)
+        by_key = {deadline.key: deadline for deadline in deadlines}
+        self._topics: dict[tuple[int, int], dict[str, list[Deadline]]] = {}
+        for chat in chats:
+            if not chat.tag_aliases:
+                continue
+            topic_index = {tag: list(bucket) for tag, bucket in self._common.items()}
+            for deadline_key, aliases in chat.tag_aliases.items():
+                deadline = by_key.get(deadline_key)
+                if deadline is None:
+                    raise ValueError(f"Unknown deadline in tag_aliases: {deadline_key}")
+                for tag in aliases:
+                    _add_tag(topic_index, tag, deadline)
+            self._topics[(chat.chat_id, chat.report_thread_id)] = topic_index
+
+    def match(
+        self,
+        chat: ChatConfig,
+        text: str,
+        entities: Sequence[MessageEntity] | None = None,
+    ) -> list[Deadline]:
+        index = self._topics.get((chat.chat_id, chat.report_thread_id), self._common)
+        matched: dict[str, Deadline] = {}
+        for tag in extract_hashtags(text, entities):
+            for deadline in index.get(tag, ()):
+                matched.setdefault(deadline.key, deadline)
+        return sorted(matched.values(), key=lambda deadline: self._order[deadline.key])
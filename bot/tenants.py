@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject
+
+from bot.config import Config, LiveConfig, load_config
+from bot.filtering import TopicScope
+from bot.reload import ConfigReloader
+from bot.sender import Sender
+
+TENANT_NAME = re.compile(r"^[a-z0-9_]+$")
+
+
+@dataclass(frozen=True)
+class TenantSpec:
+    name: str
+    bot_token: str
+    settings_path: Path
+
+    def load(self) -> Config:
+        return load_config(self.settings_path, self.bot_token, self.name)
+
+
+@dataclass
+class Tenant:
+    live: LiveConfig
+    sender: Sender
+    reloader: ConfigReloader
+
+
+def load_tenants(path: Path) -> list[TenantSpec]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    entries = data["tenants"] if isinstance(data, dict) else data
+    specs: list[TenantSpec] = []
+    for entry in entries:
+        name = str(entry["name"])
+        if not TENANT_NAME.match(name):
+            raise ValueError(f"Tenant name {name!r} must match {TENANT_NAME.pattern}")
+        token = entry.get("bot_token") or os.getenv(entry.get("bot_token_env", ""))
+        if not token:
+            raise ValueError(f"Tenant {name!r} has no bot_token or bot_token_env")
+        settings_path = Path(entry["settings_path"])
+        if not settings_path.is_absolute():
+            settings_path = path.parent / settings_path
+        specs.append(TenantSpec(name, token, settings_path))
+    if not specs:
+        raise ValueError(f"No tenants in {path}")
+    return specs
+
+
+def check_tenants(configs: list[Config]) -> None:
+    names: set[str] = set()
+    tokens: set[str] = set()
+    owners: dict[tuple[int, int], str] = {}
+    for config in configs:
+        if config.tenant in names:
+            raise ValueError(f"Duplicate tenant {config.tenant!r}")
+        if config.bot_token in tokens:
+            raise ValueError(f"Tenant {config.tenant!r} reuses another tenant's bot token")
+        if config.webhook is not None or config.shards > 1:
+            raise ValueError("Multi-bot hosting supports polling without shards only")
+        names.add(config.tenant)
+        tokens.add(config.bot_token)
+        for topic in config.topics:
+            owner = owners.setdefault(topic, config.tenant)
+            if owner != config.tenant:
+                raise ValueError(
+                    f"Topic {topic} belongs to tenants {owner!r} and {config.tenant!r}"
+                )
+
+
+class TenantScope:
+    def __init__(self, tenants: dict[int, Tenant]) -> None:
+        self.tenants = tenants
+        self._configs: tuple[Config, ...] = ()
+        self._scope = TopicScope.of(())
+
+    def __call__(self) -> TopicScope:
+        configs = tuple(tenant.live.current for tenant in self.tenants.values())
+        if len(configs) != len(self._configs) or any(
+            config is not cached for config, cached in zip(configs, self._configs)
+        ):
+            self._configs = configs
+            self._scope = TopicScope.of(configs)
+        return self._scope
+
+
+class TenantMiddleware(BaseMiddleware):
+    def __init__(self, tenants: dict[int, Tenant]) -> None:
+        self.tenants = tenants
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        tenant = self.tenants.get(data["bot"].id)
+        if tenant is None:
+            return UNHANDLED
+        data["config"] = tenant.live.current
+        data["sender"] = tenant.sender
+        data["reloader"] = tenant.reloader
+        return await handler(event, data)
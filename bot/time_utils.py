@@ -1,11 +1,21 @@
 from __future__ import annotations
 
 from datetime import date, datetime
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
 
+@lru_cache(maxsize=None)
+def get_zone(timezone: str) -> ZoneInfo:
+    return ZoneInfo(timezone)
+
+
 def today_in_timezone(timezone: str) -> date:
-    return datetime.now(ZoneInfo(timezone)).date()
+    return datetime.now(get_zone(timezone)).date()
+
+
+def local_date(moment: datetime, timezone: str) -> date:
+    return moment.astimezone(get_zone(timezone)).date()
 
 
 def is_weekend(day: date) -> bool:
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from bot.config import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, webhook: WebhookConfig) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=webhook.secret,
+    ).register(app, path=webhook.path)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, webhook: WebhookConfig) -> None:
+    allowed_updates = dp.resolve_used_update_types()
+    if webhook.url:
+        await bot.set_webhook(
+            url=webhook.url.rstrip("/") + webhook.path,
+            secret_token=webhook.secret,
+            allowed_updates=allowed_updates,
+        )
+        logger.info("Webhook registered for %s", allowed_updates)
+    runner = web.AppRunner(build_webhook_app(dp, bot, webhook))
+    await runner.setup()
+    site = web.TCPSite(runner, webhook.host, webhook.port)
+    await site.start()
+    logger.info("Listening for updates on %s:%s%s", webhook.host, webhook.port, webhook.path)
+    try:
+        await dp.emit_startup(bot=bot, **dp.workflow_data)
+        await asyncio.Event().wait()
+    finally:
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        await runner.cleanup()
+        await bot.session.close()
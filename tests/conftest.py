@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import replace
+from datetime import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable
+
+import pytest
+
+from bot import storage
+from bot.config import ChatConfig, Config, Deadline, UserRef
+from bot.dedup import message_log
+from bot.rosters import seed_rosters
+
+CHAT_ID = -1001234567890
+THREAD_ID = 7
+USER_ID = 111
+
+ConfigFactory = Callable[..., Config]
+DbRunner = Callable[..., Any]
+
+
+@pytest.fixture
+def make_config(tmp_path: Path) -> ConfigFactory:
+    def make(chat_ids: Iterable[int] = (CHAT_ID,), **changes: Any) -> Config:
+        config = Config(
+            bot_token="123456:TEST",
+            timezone="Europe/Moscow",
+            deadlines=[Deadline("daily", "#Отчет", "Отчет", time(18, 0), time(18, 0))],
+            chats=[
+                ChatConfig(chat_id, THREAD_ID, [UserRef(USER_ID, "User")])
+                for chat_id in chat_ids
+            ],
+            db_path=tmp_path / "test.db",
+        )
+        return replace(config, **changes)
+
+    return make
+
+
+@pytest.fixture
+def config(make_config: ConfigFactory) -> Config:
+    return make_config()
+
+
+@pytest.fixture
+def run_db(config: Config) -> DbRunner:
+    def run(scenario: Callable[[], Awaitable[Any]], target: Config | None = None) -> Any:
+        target = target or config
+
+        async def main() -> Any:
+            message_log.clear()
+            await storage.init_db(target.db_path)
+            try:
+                await seed_rosters(target)
+                return await scenario()
+            finally:
+                await storage.close_db()
+                message_log.clear()
+
+        return asyncio.run(main())
+
+    return run
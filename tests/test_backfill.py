@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from bot.backfill import Backfill
+from bot.config import Config
+
+
+def message(message_id: int, user_id: int, day: int) -> dict:
+    return {
+        "id": message_id,
+        "type": "message",
+        "date": f"2024-03-{day:02d}T10:00:00",
+        "from": f"User {user_id}",
+        "from_id": f"user{user_id}",
+        "text": "done #Отчет",
+    }
+
+
+def test_flush_counts_only_new_reports(config: Config, run_db) -> None:
+    chat = config.chats[0]
+
+    async def scenario() -> list[int]:
+        inserted: list[int] = []
+        for messages in (
+            [message(1, 111, 4), message(2, 222, 4)],
+            [message(1, 111, 4), message(3, 111, 5), message(4, 333, 5)],
+        ):
+            backfill = Backfill(config, chat.chat_id, chat.report_thread_id)
+            for item in messages:
+                await backfill.feed(item)
+            await backfill.flush()
+            inserted.append(backfill.stats.inserted)
+        return inserted
+
+    assert run_db(scenario) == [2, 2]
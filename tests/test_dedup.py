@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from bot.dedup import MessageLog
+
+KEYS = frozenset({"daily"})
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_after_ttl() -> None:
+    clock = Clock()
+    log = MessageLog(ttl=60.0, clock=clock)
+    log.put(1, 1, 0, KEYS)
+    clock.now += 59.0
+    assert log.get(1, 1) is not None
+    clock.now += 1.0
+    assert log.get(1, 1) is None
+    assert len(log) == 0
+
+
+def test_put_sweeps_expired_entries() -> None:
+    clock = Clock()
+    log = MessageLog(ttl=60.0, clock=clock)
+    log.put(1, 1, 0, KEYS)
+    log.put(1, 2, 0, KEYS)
+    clock.now += 30.0
+    log.put(1, 3, 0, KEYS)
+    clock.now += 30.0
+    log.put(1, 4, 0, KEYS)
+    assert len(log) == 2
+    assert log.get(1, 3) is not None
+
+
+def test_size_bound_evicts_least_recently_written() -> None:
+    log = MessageLog(size=2, clock=Clock())
+    log.put(1, 1, 0, KEYS)
+    log.put(1, 2, 0, KEYS)
+    log.put(1, 1, 10, KEYS)
+    log.put(1, 3, 0, KEYS)
+    assert len(log) == 2
+    assert log.get(1, 2) is None
+    assert log.get(1, 1).edit_date == 10
+    assert log.get(1, 3) is not None
+
+
+def test_newer_edit_replaces_entry() -> None:
+    log = MessageLog(clock=Clock())
+    log.put(1, 1, 0, KEYS)
+    log.put(1, 1, 120, frozenset())
+    seen = log.get(1, 1)
+    assert seen.edit_date == 120
+    assert seen.deadline_keys == frozenset()
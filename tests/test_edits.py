@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import pytest
+from aiogram import types
+
+from bot import storage
+from bot.config import ChatConfig, Config
+from bot.dedup import message_log
+from bot.handlers import _ingest
+from bot.time_utils import local_date
+
+SENT = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def message(chat: ChatConfig, message_id: int, text: str, edited: int = 0) -> types.Message:
+    data = {
+        "message_id": message_id,
+        "date": int(SENT.timestamp()),
+        "chat": {"id": chat.chat_id, "type": "supergroup", "title": "Chat", "is_forum": True},
+        "from": {"id": chat.required_users[0].user_id, "is_bot": False, "first_name": "User"},
+        "message_thread_id": chat.report_thread_id,
+        "is_topic_message": True,
+        "text": text,
+    }
+    if edited:
+        data["edit_date"] = int(SENT.timestamp()) + edited
+    return types.Message.model_validate(data)
+
+
+@pytest.fixture
+def chat(config: Config) -> ChatConfig:
+    return config.chats[0]
+
+
+async def reporters(config: Config, chat: ChatConfig) -> set[int]:
+    await storage.flush()
+    day = local_date(SENT, config.timezone)
+    return set(await storage.get_reporters(day, "daily", chat.chat_id, chat.report_thread_id))
+
+
+async def restart(config: Config) -> None:
+    await storage.close_db()
+    message_log.clear()
+    await storage.init_db(config.db_path)
+
+
+def test_unseen_edit_adds_report(config: Config, chat: ChatConfig, run_db) -> None:
+    async def scenario() -> None:
+        await _ingest(message(chat, 1, "done #Отчет", edited=60), config)
+        assert await reporters(config, chat) == {chat.required_users[0].user_id}
+
+    run_db(scenario)
+
+
+def test_unseen_edit_removes_report(config: Config, chat: ChatConfig, run_db) -> None:
+    async def scenario() -> None:
+        await _ingest(message(chat, 1, "done #Отчет"), config)
+        await restart(config)
+        await _ingest(message(chat, 1, "done", edited=60), config)
+        assert await reporters(config, chat) == set()
+
+    run_db(scenario)
+
+
+def test_report_survives_while_another_message_is_tagged(
+    config: Config, chat: ChatConfig, run_db
+) -> None:
+    user_id = chat.required_users[0].user_id
+
+    async def scenario() -> None:
+        await _ingest(message(chat, 1, "first #Отчет"), config)
+        await _ingest(message(chat, 2, "second #Отчет"), config)
+        await _ingest(message(chat, 1, "first", edited=60), config)
+        assert await reporters(config, chat) == {user_id}
+        await restart(config)
+        assert await reporters(config, chat) == {user_id}
+        await _ingest(message(chat, 2, "second", edited=120), config)
+        assert await reporters(config, chat) == set()
+
+    run_db(scenario)
+
+
+def test_stale_edit_after_newer_one_is_ignored(config: Config, chat: ChatConfig, run_db) -> None:
+    async def scenario() -> None:
+        await _ingest(message(chat, 1, "done #Отчет"), config)
+        await _ingest(message(chat, 1, "done", edited=120), config)
+        await _ingest(message(chat, 1, "done #Отчет", edited=60), config)
+        assert await reporters(config, chat) == set()
+        assert message_log.get(chat.chat_id, 1).edit_date == int(SENT.timestamp()) + 120
+
+    run_db(scenario)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import gzip
+import sqlite3
+from datetime import date
+from pathlib import Path
+
+from aiogram import types
+from aiogram.filters import CommandObject
+
+from bot import storage
+from bot.config import Config, shard_of
+from bot.export import ExportFilter
+from bot.handlers import report_export
+
+ADMIN_ID = 999
+CHAT_IDS = [-1001000000000 - index for index in range(8)]
+DAY = date(2024, 3, 4)
+
+
+class DocumentSender:
+    def __init__(self) -> None:
+        self.exports: list[list[str]] = []
+
+    async def send_document(self, chat_id, document, message_thread_id=None, caption=""):
+        with gzip.open(Path(document.path), "rt", encoding="utf-8") as stream:
+            self.exports.append(stream.read().splitlines()[1:])
+
+    async def reply(self, message, text):
+        raise AssertionError(text)
+
+
+def direct_message(text: str) -> types.Message:
+    return types.Message.model_validate(
+        {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": ADMIN_ID, "type": "private", "first_name": "Admin"},
+            "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "Admin"},
+            "text": text,
+        }
+    )
+
+
+def test_direct_export_reads_every_shard(make_config, run_db) -> None:
+    config: Config = make_config(CHAT_IDS, shards=3, admin_ids=frozenset({ADMIN_ID}))
+    for shard in range(config.shards):
+        worker = config.for_shard(shard)
+
+        async def fill() -> None:
+            for chat in worker.chats:
+                await storage.add_report(
+                    DAY, 111, "daily", chat.chat_id, chat.report_thread_id, "u", "User"
+                )
+
+        run_db(fill, worker)
+    worker = config.for_shard(shard_of(ADMIN_ID, config.shards))
+    other = next(chat_id for chat_id in CHAT_IDS if chat_id not in worker.chat_ids)
+    sender = DocumentSender()
+
+    async def export() -> None:
+        for args in (f"{DAY} {DAY}", f"{DAY} {DAY} chat={other}"):
+            await report_export(
+                direct_message(f"/reportexport {args}"),
+                CommandObject(prefix="/", command="reportexport", args=args),
+                worker,
+                sender,
+            )
+
+    run_db(export, worker)
+    everything, single = sender.exports
+    assert len(everything) == len(CHAT_IDS)
+    assert [row.split(",")[1] for row in single] == [str(other)]
+
+
+def test_export_query_streams_without_sorting(config: Config, run_db) -> None:
+    async def create() -> None:
+        pass
+
+    run_db(create)
+    chat = config.chats[0]
+    filters = [
+        ExportFilter(DAY, DAY),
+        ExportFilter(DAY, DAY, chat.chat_id),
+        ExportFilter(DAY, DAY, chat.chat_id, chat.report_thread_id, "daily"),
+        ExportFilter(DAY, DAY, chat_ids=frozenset(CHAT_IDS)),
+    ]
+    with sqlite3.connect(config.db_path) as db:
+        for export_filter in filters:
+            where, params = export_filter.where()
+            plan = db.execute(
+                f"EXPLAIN QUERY PLAN SELECT r.user_id FROM reports AS r "
+                f"WHERE {where} ORDER BY {export_filter.order()}",
+                params,
+            ).fetchall()
+            assert not any("TEMP B-TREE" in row[3] for row in plan), plan
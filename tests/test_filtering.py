@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from aiogram import types
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+from bot.config import Config
+from bot.filtering import (
+    DROPPED_CHAT,
+    DROPPED_TOPIC,
+    PASSED,
+    TopicScope,
+    UpdateFilterMiddleware,
+    filter_raw_update,
+    filter_update,
+)
+from bot.metrics import UPDATES
+
+SENT = int(datetime.now(timezone.utc).timestamp())
+
+
+def raw_message(
+    chat_id: int, thread_id: int | None, text: str, chat_type: str = "supergroup"
+) -> dict[str, Any]:
+    message: dict[str, Any] = {
+        "message_id": 1,
+        "date": SENT,
+        "chat": {"id": chat_id, "type": chat_type},
+        "from": {"id": 111, "is_bot": False, "first_name": "User"},
+        "text": text,
+    }
+    if thread_id is not None:
+        message["message_thread_id"] = thread_id
+    return message
+
+
+def raw_update(message: dict[str, Any], kind: str = "message") -> dict[str, Any]:
+    if kind == "edited_message":
+        message = {**message, "edit_date": SENT + 60}
+    return {"update_id": 1, kind: message}
+
+
+def check(config: Config, update: dict[str, Any]) -> str:
+    result = filter_raw_update(config, update)
+    assert filter_update(config, types.Update.model_validate(update)) == result
+    return result
+
+
+@pytest.mark.parametrize("kind", ["message", "edited_message"])
+def test_configured_topic_passes(config: Config, kind: str) -> None:
+    chat = config.chats[0]
+    message = raw_message(chat.chat_id, chat.report_thread_id, "#Отчет")
+    assert check(config, raw_update(message, kind)) == PASSED
+
+
+@pytest.mark.parametrize("kind", ["message", "edited_message"])
+def test_other_chats_and_topics_are_dropped(config: Config, kind: str) -> None:
+    chat = config.chats[0]
+    other_chat = raw_message(-1005555555555, chat.report_thread_id, "#Отчет")
+    other_topic = raw_message(chat.chat_id, chat.report_thread_id + 1, "#Отчет")
+    general = raw_message(chat.chat_id, None, "#Отчет")
+    assert check(config, raw_update(other_chat, kind)) == DROPPED_CHAT
+    assert check(config, raw_update(other_topic, kind)) == DROPPED_TOPIC
+    assert check(config, raw_update(general, kind)) == DROPPED_TOPIC
+
+
+def test_commands_and_private_chats_pass(config: Config) -> None:
+    command = raw_message(-1005555555555, None, "/reportstatus")
+    caption = raw_message(-1005555555555, None, "/reportexport 2026-01-01 2026-01-31")
+    caption["caption"] = caption.pop("text")
+    caption["photo"] = [{"file_id": "a", "file_unique_id": "a", "width": 1, "height": 1}]
+    private = raw_message(111, None, "hello", chat_type="private")
+    for message in (command, caption, private):
+        assert check(config, raw_update(message)) == PASSED
+
+
+def test_non_message_updates_pass(config: Config) -> None:
+    bot = {"id": 1, "is_bot": True, "first_name": "Bot"}
+    update = {
+        "update_id": 1,
+        "my_chat_member": {
+            "chat": {"id": -1005555555555, "type": "supergroup"},
+            "from": {"id": 111, "is_bot": False, "first_name": "User"},
+            "date": SENT,
+            "old_chat_member": {"status": "left", "user": bot},
+            "new_chat_member": {"status": "member", "user": bot},
+        },
+    }
+    assert check(config, update) == PASSED
+
+
+def test_middleware_skips_handler_for_dropped_updates(config: Config) -> None:
+    chat = config.chats[0]
+    middleware = UpdateFilterMiddleware(lambda: TopicScope.of([config]))
+    handled: list[int] = []
+
+    async def handler(event: types.TelegramObject, data: dict[str, Any]) -> str:
+        handled.append(event.update_id)
+        return "handled"
+
+    async def feed(update_id: int, thread_id: int) -> Any:
+        update = raw_update(raw_message(chat.chat_id, thread_id, "#Отчет"), "edited_message")
+        update["update_id"] = update_id
+        return await middleware(handler, types.Update.model_validate(update), {})
+
+    dropped = UPDATES.value(DROPPED_TOPIC)
+    assert asyncio.run(feed(1, chat.report_thread_id)) == "handled"
+    assert asyncio.run(feed(2, chat.report_thread_id + 1)) is UNHANDLED
+    assert handled == [1]
+    assert UPDATES.value(DROPPED_TOPIC) == dropped + 1
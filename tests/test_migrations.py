@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import aiosqlite
+import pytest
+
+from bot import migrations
+from bot.migrations import SCHEMA_VERSION, migrate
+
+LEGACY_REPORTS = """
+CREATE TABLE reports (
+    report_date TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    full_name TEXT,
+    PRIMARY KEY (report_date, user_id)
+)
+"""
+REPORTS_NEW = """
+CREATE TABLE reports_new (
+    report_date TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    deadline_key TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    report_thread_id INTEGER NOT NULL,
+    reported_at REAL,
+    PRIMARY KEY (report_date, user_id, deadline_key, chat_id, report_thread_id)
+)
+"""
+ROWS = [
+    (f"2024-03-{day:02d}", user_id, f"user{user_id}", None)
+    for day in (4, 5)
+    for user_id in range(10)
+]
+
+
+def legacy_db(path: Path, moved: int = 0) -> None:
+    with sqlite3.connect(path) as db:
+        db.execute(LEGACY_REPORTS)
+        db.executemany("INSERT INTO reports VALUES (?, ?, ?, ?)", ROWS)
+        if moved:
+            db.execute(REPORTS_NEW)
+            db.executemany(
+                "INSERT INTO reports_new VALUES (?, ?, '', 0, 0, NULL)",
+                [row[:2] for row in ROWS[:moved]],
+            )
+            db.execute("DELETE FROM reports WHERE rowid <= ?", (moved,))
+    db.close()
+
+
+def run_migrate(path: Path) -> None:
+    async def main() -> None:
+        async with aiosqlite.connect(path) as db:
+            await migrate(db)
+
+    asyncio.run(main())
+
+
+def read(path: Path, sql: str) -> list[tuple]:
+    with sqlite3.connect(path) as db:
+        rows = db.execute(sql).fetchall()
+    db.close()
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(migrations, "COPY_CHUNK", 3)
+
+
+def test_legacy_reports_are_migrated(tmp_path: Path) -> None:
+    path = tmp_path / "legacy.db"
+    legacy_db(path)
+    run_migrate(path)
+    assert read(path, "PRAGMA user_version") == [(SCHEMA_VERSION,)]
+    migrated = read(
+        path, "SELECT report_date, user_id, deadline_key, chat_id FROM reports ORDER BY 1, 2"
+    )
+    assert migrated == [(day, user_id, "", 0) for day, user_id, _, _ in ROWS]
+    assert read(path, "SELECT COUNT(*) FROM users WHERE username IS NOT NULL") == [(10,)]
+    assert read(path, "SELECT name FROM sqlite_master WHERE name = 'reports_new'") == []
+
+
+def test_interrupted_copy_resumes(tmp_path: Path) -> None:
+    path = tmp_path / "half.db"
+    legacy_db(path, moved=7)
+    run_migrate(path)
+    assert read(path, "SELECT report_date, user_id FROM reports ORDER BY 1, 2") == [
+        row[:2] for row in ROWS
+    ]
+
+
+def test_newer_schema_is_refused(tmp_path: Path) -> None:
+    path = tmp_path / "newer.db"
+    with sqlite3.connect(path) as db:
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    db.close()
+    with pytest.raises(RuntimeError, match="newer than supported"):
+        run_migrate(path)
+    assert read(path, "PRAGMA user_version") == [(SCHEMA_VERSION + 1,)]
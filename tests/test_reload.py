@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from bot.config import Config, LiveConfig
+from bot.reload import ConfigReloader
+from bot.sender import Sender
+
+
+def test_watch_retries_after_failed_reload(make_config, run_db, tmp_path: Path) -> None:
+    settings = tmp_path / "settings.json"
+    settings.write_text("{}", encoding="utf-8")
+    config = make_config(settings_path=settings)
+    updated = make_config((config.chats[0].chat_id, -1005555555555), settings_path=settings)
+    attempts: list[Config] = []
+
+    def loader() -> Config:
+        attempts.append(updated)
+        if len(attempts) == 1:
+            raise ValueError("half-written settings")
+        return updated
+
+    async def scenario() -> LiveConfig:
+        live = LiveConfig(config)
+        reloader = ConfigReloader(live, AsyncIOScheduler(), Sender(None), loader)
+        os.utime(settings, (0, settings.stat().st_mtime + 10))
+        watcher = asyncio.create_task(reloader.watch(interval=0.01))
+        try:
+            for _ in range(100):
+                if live.current is updated:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            watcher.cancel()
+        await asyncio.sleep(0.05)
+        return live
+
+    live = run_db(scenario, config)
+    assert live.current is updated
+    assert len(attempts) == 2
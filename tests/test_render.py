@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import re
+from datetime import date
+
+from bot import storage
+from bot.config import Config, UserRef
+from bot.render import StatusCache, format_mentions, split_message
+from bot.rosters import add_to_roster, remove_from_roster, roster_version
+
+TAG = re.compile(r"<(/?)(\w+)[^>]*>")
+
+
+def balanced(chunk: str) -> bool:
+    stack: list[str] = []
+    for closing, name in TAG.findall(chunk):
+        if not closing:
+            stack.append(name)
+        elif not stack or stack.pop() != name:
+            return False
+    return not stack and chunk.count("<") == chunk.count(">")
+
+
+def test_short_text_is_kept_whole() -> None:
+    assert split_message("a\nb", limit=10) == ["a\nb"]
+
+
+def test_lines_are_kept_together() -> None:
+    assert split_message("aaaa\nbbbb\ncccc", limit=10) == ["aaaa\nbbbb", "cccc"]
+
+
+def test_overlong_line_is_hard_split() -> None:
+    chunks = split_message("x" * 5000)
+    assert [len(chunk) for chunk in chunks] == [4096, 904]
+
+
+def test_overlong_line_is_not_split_inside_tags() -> None:
+    users = [UserRef(user_id, f"User & {user_id}") for user_id in range(1000)]
+    text = format_mentions(users, per_line=len(users))
+    chunks = split_message(text, limit=500)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 and balanced(chunk) for chunk in chunks)
+    assert not any(re.search(r"&\w*$", chunk) for chunk in chunks)
+    assert ", ".join(chunks).replace(",,", ",") == text
+
+
+def test_overlong_line_is_not_split_inside_entities() -> None:
+    chunks = split_message("&amp;" * 30, limit=12)
+    assert all(chunk and set(chunk.split("&amp;")) == {""} for chunk in chunks)
+
+
+def test_status_cache_misses_after_version_or_config_change(config: Config) -> None:
+    cache = StatusCache()
+    day = date(2024, 3, 4)
+    cache.put(config, day, 1, 2, (1, 0), ["status"])
+    assert cache.get(config, day, 1, 2, (1, 0)) == ["status"]
+    assert cache.get(config, day, 1, 2, (2, 0)) is None
+    assert cache.get(config, day, 1, 2, (1, 1)) is None
+    reloaded = Config(config.bot_token, config.timezone, config.deadlines, config.chats)
+    assert cache.get(reloaded, day, 1, 2, (1, 0)) is None
+
+
+def test_status_cache_evicts_least_recently_used(config: Config) -> None:
+    cache = StatusCache(size=2)
+    day = date(2024, 3, 4)
+    cache.put(config, day, 1, 1, (0, 0), ["one"])
+    cache.put(config, day, 2, 2, (0, 0), ["two"])
+    assert cache.get(config, day, 1, 1, (0, 0)) == ["one"]
+    cache.put(config, day, 3, 3, (0, 0), ["three"])
+    assert cache.get(config, day, 2, 2, (0, 0)) is None
+    assert cache.get(config, day, 1, 1, (0, 0)) == ["one"]
+    assert cache.get(config, day, 3, 3, (0, 0)) == ["three"]
+
+
+def test_status_versions_change_with_reports_and_roster(config: Config, run_db) -> None:
+    chat = config.chats[0]
+    day = date(2024, 3, 4)
+    topic = (chat.chat_id, chat.report_thread_id)
+
+    def version() -> tuple[int, int]:
+        return storage.topic_version(day, *topic), roster_version(*topic)
+
+    async def scenario() -> list[tuple[int, int]]:
+        await storage.warm_up(day)
+        versions = [version()]
+        await storage.add_report(day, 111, "daily", *topic, "u", "User", message_id=5)
+        versions.append(version())
+        await storage.remove_message_reports(chat.chat_id, 5, frozenset({"daily"}))
+        versions.append(version())
+        await add_to_roster(*topic, [UserRef(222, "Other")])
+        versions.append(version())
+        await remove_from_roster(*topic, [222])
+        versions.append(version())
+        return versions
+
+    versions = run_db(scenario)
+    assert len(set(versions)) == len(versions)
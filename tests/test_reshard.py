@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date
+from pathlib import Path
+
+import aiosqlite
+import pytest
+
+from bot import storage
+from bot.config import shard_of
+from bot.reshard import check_shards, reshard, shard_paths
+
+CHAT_IDS = [-1001000000000 - index for index in range(8)]
+
+
+async def chat_ids(path: Path) -> set[int]:
+    async with aiosqlite.connect(path) as db:
+        cursor = await db.execute("SELECT chat_id FROM reports")
+        return {row[0] for row in await cursor.fetchall()}
+
+
+def test_changed_shard_count_is_refused_until_resharded(make_config, run_db) -> None:
+    single = make_config(CHAT_IDS)
+    sharded = make_config(CHAT_IDS, shards=3)
+
+    async def fill() -> None:
+        for chat in single.chats:
+            await storage.add_report(
+                date(2024, 3, 4), 111, "daily", chat.chat_id, chat.report_thread_id, "u", "User"
+            )
+
+    asyncio.run(check_shards(single))
+    run_db(fill, single)
+    with pytest.raises(RuntimeError, match="bot.reshard"):
+        asyncio.run(check_shards(sharded))
+    counts = asyncio.run(reshard(sharded))
+    assert sum(counts.values()) == len(CHAT_IDS)
+    asyncio.run(check_shards(sharded))
+    for shard, path in enumerate(shard_paths(sharded)):
+        assert asyncio.run(chat_ids(path)) == {
+            chat_id for chat_id in CHAT_IDS if shard_of(chat_id, 3) == shard
+        }
+    with pytest.raises(RuntimeError, match="bot.reshard"):
+        asyncio.run(check_shards(make_config(CHAT_IDS, shards=2)))
+    assert single.db_path.with_name(single.db_path.name + ".bak").exists()
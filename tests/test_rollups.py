@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, time, timedelta
+
+from bot import storage
+from bot.config import Config
+from bot.rollups import finalize_pending
+from bot.time_utils import get_zone, today_in_timezone
+
+
+def test_concurrent_finalize_counts_each_day_once(config: Config, run_db) -> None:
+    chat = config.chats[0]
+    user = chat.required_users[0]
+
+    async def scenario() -> tuple[list[int], list[tuple[int, int, int]]]:
+        today = today_in_timezone(config.timezone)
+        zone = get_zone(config.timezone)
+        for back in (3, 2):
+            day = today - timedelta(days=back)
+            await storage.add_report(
+                day,
+                user.user_id,
+                "daily",
+                chat.chat_id,
+                chat.report_thread_id,
+                "user",
+                "User",
+                reported_at=datetime.combine(day, time(9), tzinfo=zone).timestamp(),
+            )
+        finalized = await asyncio.gather(finalize_pending(config), finalize_pending(config))
+        await storage.flush()
+        totals = await storage.get_engine().fetchall(
+            "SELECT SUM(on_time), SUM(late), SUM(missed) FROM report_weekly", ()
+        )
+        return list(finalized), [tuple(row) for row in totals]
+
+    finalized, totals = run_db(scenario)
+    assert sorted(finalized) == [0, 3]
+    assert totals == [(2, 0, 1)]
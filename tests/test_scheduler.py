@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+from datetime import date, time
+from pathlib import Path
+
+import pytest
+
+from bot import storage
+from bot.config import Config, Deadline, UserRef, load_config
+from bot.scheduler import format_reminder, send_summaries
+from bot.sender import Sender
+from bot.storage import OutboxMessage
+
+
+def test_reminder_title_is_escaped_once() -> None:
+    deadline = Deadline("daily", "#Отчет", "Q&A", time(18, 0), time(18, 0))
+    text = format_reminder(deadline, time(18, 0), 30, [UserRef(111, "User")])
+    assert "<b>Q&amp;A</b>" in text
+
+
+def test_reminder_before_midnight_is_rejected(tmp_path: Path) -> None:
+    settings = {
+        "deadlines": [
+            {"key": "early", "tag": "#Утро", "weekday_time": "00:30", "reminders": [60]}
+        ],
+        "chats": [{"chat_id": -1001234567890, "report_thread_id": 7}],
+    }
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps(settings), encoding="utf-8")
+    with pytest.raises(ValueError, match="previous day"):
+        load_config(path, "123456:TEST")
+
+
+def test_summary_is_logged_with_its_outbox_rows(config: Config, run_db) -> None:
+    chat = config.chats[0]
+    day = date(2024, 3, 4)
+
+    async def scenario() -> tuple[list[OutboxMessage], set[tuple[date, str, int, int]]]:
+        await send_summaries(Sender(None), config, day, [("daily", chat)])
+        await storage.flush()
+        return await storage.load_outbox(), await storage.logged_summaries(day)
+
+    outbox, logged = run_db(scenario)
+    assert [message.chat_id for message in outbox] == [chat.chat_id]
+    assert logged == {(day, "daily", chat.chat_id, chat.report_thread_id)}
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from aiogram import types
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+
+from bot import sender as sender_module
+from bot import storage
+from bot.config import Config
+from bot.sender import MAX_ATTEMPTS, Sender
+
+
+class FailingBot:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def send_message(self, **kwargs):
+        self.calls += 1
+        raise TelegramNetworkError(None, "connection reset")
+
+
+class FloodedBot:
+    def __init__(self) -> None:
+        self.documents: list[dict] = []
+
+    async def send_document(self, **kwargs):
+        self.documents.append(kwargs)
+        if len(self.documents) == 1:
+            raise TelegramRetryAfter(None, "Too Many Requests", 0)
+        return "sent"
+
+
+def test_network_errors_give_up_after_max_attempts(
+    config: Config, run_db, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(sender_module, "MAX_BACKOFF", 0.0)
+    bot = FailingBot()
+    sender = Sender(bot, chat_rate=1000.0, chat_burst=1000.0)
+
+    async def scenario() -> None:
+        await sender.start()
+        try:
+            with pytest.raises(TelegramNetworkError):
+                await asyncio.wait_for(
+                    sender.send_message(config.chats[0].chat_id, "text", durable=True), 5
+                )
+            await storage.flush()
+            assert await storage.load_outbox() == []
+        finally:
+            await sender.close()
+
+    run_db(scenario)
+    assert bot.calls == MAX_ATTEMPTS
+    assert sender.stats.failed == 1
+    assert sender.stats.queue_depth == 0
+
+
+def test_document_is_retried_after_flood_limit(config: Config, run_db) -> None:
+    bot = FloodedBot()
+    sender = Sender(bot)
+    chat = config.chats[0]
+
+    async def scenario() -> types.Message | None:
+        await sender.start()
+        try:
+            document = types.BufferedInputFile(b"data", "reports.csv.gz")
+            return await asyncio.wait_for(
+                sender.send_document(chat.chat_id, document, chat.report_thread_id, "Строк: 1"),
+                5,
+            )
+        finally:
+            await sender.close()
+
+    assert run_db(scenario) == "sent"
+    assert sender.stats.retry_after == 1
+    assert [call["caption"] for call in bot.documents] == ["Строк: 1", "Строк: 1"]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from datetime import time
+
+from aiogram.types import MessageEntity
+
+from bot.config import ChatConfig, Config, Deadline
+from bot.tags import TagIndex, extract_hashtags
+
+MORNING = Deadline("morning", "#УтреннийОтчет", "Утро", time(10, 0), time(10, 0))
+EVENING = Deadline(
+    "evening", "#ВечернийОтчет", "Вечер", time(19, 0), time(19, 0), aliases=("#Итоги",)
+)
+
+
+def utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def hashtag(text: str, tag: str) -> MessageEntity:
+    offset = utf16_len(text[: text.index(tag)])
+    return MessageEntity(type="hashtag", offset=offset, length=utf16_len(tag))
+
+
+def index(config: Config) -> tuple[TagIndex, ChatConfig]:
+    deadlines = [MORNING, EVENING]
+    return TagIndex(deadlines, config.chats), config.chats[0]
+
+
+def keys(deadlines: list[Deadline]) -> list[str]:
+    return [deadline.key for deadline in deadlines]
+
+
+def test_longer_hashtag_does_not_match(config: Config) -> None:
+    tags, chat = index(config)
+    assert tags.match(chat, "готово #ВечернийОтчет2") == []
+    assert tags.match(chat, "готово #ВечернийОтчетЗавтра") == []
+
+
+def test_match_ignores_case_and_unicode_form(config: Config) -> None:
+    tags, chat = index(config)
+    assert keys(tags.match(chat, "#вечернийотчет")) == ["evening"]
+    assert keys(tags.match(chat, "#ВЕЧЕРНИЙОТЧЕТ и #утреннийОТЧЕТ")) == ["morning", "evening"]
+    assert keys(tags.match(chat, "#Вечернии\u0306Отчет")) == ["evening"]
+
+
+def test_deadline_and_topic_aliases(make_config) -> None:
+    config = make_config(chat_ids=(-1001, -1002))
+    aliased = replace(config.chats[0], tag_aliases={"morning": ("#Утро",)})
+    tags = TagIndex([MORNING, EVENING], [aliased, config.chats[1]])
+    assert keys(tags.match(aliased, "#итоги")) == ["evening"]
+    assert keys(tags.match(aliased, "#утро")) == ["morning"]
+    assert tags.match(config.chats[1], "#Утро") == []
+    assert keys(tags.match(config.chats[1], "#УтреннийОтчет")) == ["morning"]
+
+
+def test_entities_use_utf16_offsets(config: Config) -> None:
+    tags, chat = index(config)
+    text = "🔥🔥 сделал #ВечернийОтчет"
+    entities = [hashtag(text, "#ВечернийОтчет")]
+    assert extract_hashtags(text, entities) == ["#вечернийотчет"]
+    assert keys(tags.match(chat, text, entities)) == ["evening"]
+
+
+def test_entities_take_precedence_over_text(config: Config) -> None:
+    tags, chat = index(config)
+    text = "`#ВечернийОтчет` в коде"
+    assert tags.match(chat, text, []) == []
+    assert keys(tags.match(chat, text)) == ["evening"]
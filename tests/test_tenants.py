@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from datetime import datetime, timezone
+
+from aiogram import Bot, types
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+from bot import storage
+from bot.app import create_host
+from bot.config import ChatConfig, LiveConfig
+from bot.reload import ConfigReloader
+from bot.rosters import seed_rosters
+from bot.scheduler import plan_jobs, run_slot
+from bot.sender import Sender
+from bot.tenants import Tenant
+from bot.time_utils import local_date
+
+OTHER_CHAT_ID = -1009876543210
+SENT = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def update(update_id: int, chat: ChatConfig, text: str) -> types.Update:
+    return types.Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(SENT.timestamp()),
+                "chat": {
+                    "id": chat.chat_id,
+                    "type": "supergroup",
+                    "title": "Chat",
+                    "is_forum": True,
+                },
+                "from": {
+                    "id": chat.required_users[0].user_id,
+                    "is_bot": False,
+                    "first_name": "User",
+                },
+                "message_thread_id": chat.report_thread_id,
+                "is_topic_message": True,
+                "text": text,
+            },
+        }
+    )
+
+
+def test_tenant_bot_ignores_other_tenant_topics(make_config, run_db) -> None:
+    first = make_config(tenant="first", bot_token="111:FIRST")
+    second = make_config((OTHER_CHAT_ID,), tenant="second", bot_token="222:SECOND")
+    host = create_host(first)
+    bots = {config.tenant: Bot(config.bot_token) for config in (first, second)}
+    senders: dict[str, Sender] = {}
+    for config in (first, second):
+        bot = bots[config.tenant]
+        live = LiveConfig(config)
+        sender = senders[config.tenant] = Sender(bot, tenant=config.tenant)
+        reloader = ConfigReloader(live, host.scheduler, sender, lambda config=config: config)
+        host.tenants[bot.id] = Tenant(live, sender, reloader)
+    chat = second.chats[0]
+    day = local_date(SENT, second.timezone)
+
+    async def reporters() -> set[int]:
+        await storage.flush()
+        return set(
+            await storage.get_reporters(day, "daily", chat.chat_id, chat.report_thread_id)
+        )
+
+    async def scenario() -> dict[str, set[int]]:
+        await seed_rosters(second)
+        stranger = replace(chat, chat_id=-1005555555555)
+        assert await host.dp.feed_update(bots["first"], update(1, stranger, "x")) is UNHANDLED
+        await host.dp.feed_update(bots["first"], update(2, chat, "done #Отчет"))
+        assert await reporters() == set()
+        await host.dp.feed_update(bots["second"], update(3, chat, "done #Отчет"))
+        assert await reporters() == {chat.required_users[0].user_id}
+        for tenant in host.tenants.values():
+            for job in plan_jobs(tenant.sender, tenant.live).values():
+                if job.func is run_slot:
+                    await job.func(*job.args)
+        return {
+            tenant: {message.chat_id for message in await storage.load_outbox(tenant)}
+            for tenant in senders
+        }
+
+    assert run_db(scenario) == {
+        "first": {first.chats[0].chat_id},
+        "second": {chat.chat_id},
+    }